@@ -0,0 +1 @@
+"""Reproducible benchmarks for the grading tools on synthetic quiz data."""
@@ -0,0 +1,300 @@
+"""Time the tools' non-GUI logic on a synthetic quiz.
+
+    python -m bench [--students 400] [--criteria 40] [--json results.json]
+
+Everything runs in a temporary directory with Tk widgets and dialogs stubbed,
+so no display or scanner is needed.
+"""
+import argparse
+import importlib.util
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+import traceback
+
+from bench import stubs, synth
+from core.attendance import AttendanceStore
+from core.coversheet import identify, render_sheet
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+QUIZ = 1
+
+
+def load_tool(filename, name):
+    """Import one of the top-level scripts (some have dashes in their names)"""
+    spec = importlib.util.spec_from_file_location(name, os.path.join(REPO, filename))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def measure(func, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - start) * 1000)
+    return timings
+
+
+def bench_grade(repeat, edits):
+    grade = load_tool("grade.py", "bench_grade")
+    stubs.install(grade)
+    app = grade.QuizMarker(stubs.Widget())
+    app.quiz_entry.items = [str(QUIZ)]
+
+    results = {"grade.load": measure(app.load_quiz_data, repeat)}
+
+    rounds = iter(range(10 ** 9))
+
+    def edit_save():
+        # Marks differ every round so each edit really is saved
+        offset = next(rounds)
+        for n in range(edits):
+            app.student_list.selection_ = (n % app.student_list.size(),)
+            app.load_student_data(None)
+            for entry in app.criteria_entries.values():
+                entry.items = [str((n + offset) % 5)]
+            app.feedback_text.items = [f"Edited feedback {n + offset}"]
+            app.update_grading_data()
+
+    results["grade.edit_save"] = [t / edits for t in measure(edit_save, repeat)]
+
+    # Item analysis after one student's marks change, as the stats panel does
+    def analysis_update():
+        app.analysis.update(app.current_student, app.grading.marks(app.current_student, app.markscheme.columns))
+        app.analysis.results()
+
+    results["grade.analysis"] = measure(analysis_update, repeat)
+
+    # Moderation: a second marking of every student, one mark in ten different
+    second = app.grading.data.copy()
+    rng = random.Random(3)
+    for key in app.markscheme.columns:
+        changed = [rng.random() < 0.1 for _ in range(len(second))]
+        second.loc[changed, key] = second.loc[changed, key].fillna(0) + 1
+    second["grader"] = "second"
+    second.to_csv(app.paths.second_grading_csv, index=False)
+
+    def reconcile():
+        app.toggle_reconcile()  # Compare and list the disagreeing students
+        app.toggle_reconcile()  # Back to everyone
+
+    results["grade.reconcile"] = measure(reconcile, repeat)
+
+    # A heavily marked-up page: rebuilt when the page changes, rescaled on zoom
+    app.student_list.selection_ = (0,)
+    app.load_student_data(None)
+    layer = app.annotation_layer
+    rng = random.Random(2)
+    for n in range(200):
+        kind = ("tick", "cross", "circle", "pen", "mark")[n % 5]
+        x, y = rng.random(), rng.random()
+        if kind == "pen":
+            points = [v for step in range(40) for v in (x + step * 0.002, y + rng.random() * 0.01)]
+        elif kind == "circle":
+            points = [x, y, x + 0.1, y + 0.05]
+        else:
+            points = [x, y]
+        layer.annotations.add(layer.page, kind, points, app.criteria_order[n % len(app.criteria_order)].key)
+    layer.annotations.save()
+    results["grade.annotate_draw"] = measure(layer.draw, repeat)
+    layout = app.viewer.layout
+    zoomed = (layout[0], (layout[1][0] * 2, layout[1][1] * 2), layout[2])
+    results["grade.annotate_zoom"] = measure(lambda: layer.layout(layout, zoomed), repeat)
+    return results
+
+
+def bench_validate(repeat, edits):
+    validate = load_tool("validate-names.py", "bench_validate")
+    stubs.install(validate)
+    app = validate.ValidateNames(stubs.Widget())
+    app.quiz_entry.items = [str(QUIZ)]
+
+    results = {"validate.load": measure(app.load_quiz_data, repeat)}
+
+    def validate_some():
+        for n in range(edits):
+            app.student_list.selection_ = (n % len(app.student_data),)
+            app.validate_student()
+
+    results["validate.validate"] = [t / edits for t in measure(validate_some, repeat)]
+
+    # A scan arriving from scan.py: incremental watcher update vs. the old full refresh
+    counter = iter(range(10 ** 9))
+    attendance = AttendanceStore(app.paths.attendance)
+
+    def new_scan():
+        attendance.add(f"98{next(counter):06d}")
+        app.watcher.changed(app.paths.attendance)
+        app.apply_watch_events()
+
+    def full_refresh():
+        attendance.add(f"98{next(counter):06d}")
+        app.master = None  # The refresh used to re-read the master sheet every time
+        app.process_attendance()
+        app.refresh_student_data()
+
+    results["validate.new_scan"] = measure(new_scan, repeat)
+    results["validate.full_refresh"] = measure(full_refresh, repeat)
+    return results
+
+
+def bench_upload(repeat, edits):
+    upload = load_tool("upload.py", "bench_upload")
+    stubs.install(upload)
+    app = upload.CuteGradeTracker(stubs.Widget())
+    app.quiz_number = QUIZ
+
+    results = {"upload.load": measure(app.load_students, repeat)}
+
+    def mark_some():
+        items = app.tree.get_children()
+        for n in range(edits):
+            app.tree.selection_ = (items[n % len(items)],)
+            app.mark_as_uploaded()
+
+    results["upload.mark"] = [t / edits for t in measure(mark_some, repeat)]
+    return results
+
+
+def bench_scan(repeat, resolution):
+    page = synth.make_chart(random.Random(1), *resolution)
+    stubs.fake_wia_scan(lambda: page.copy())
+    scan = load_tool("scan.py", "bench_scan")
+    dialogs = stubs.install(scan)
+    app = scan.HighResScannerApp(stubs.Widget())
+    app.quiz_number = QUIZ
+    app.initialize_attendance_file()
+
+    results = {"scan.scan": measure(app.scan_image, repeat)}
+
+    def zoom_cycle():
+        for factor in [1.25] * 8 + [0.8] * 8:
+            app.adjust_zoom(factor)
+
+    results["scan.zoom_step"] = [t / 16 for t in measure(zoom_cycle, repeat)]
+
+    counter = iter(range(10 ** 9))
+
+    def save_one():
+        # Every save is the same page, so also confirm the duplicate warning
+        dialogs.answers.extend([f"99{next(counter):06d}", True])
+        app.save_image()
+        dialogs.answers.clear()
+
+    results["scan.save"] = measure(save_one, repeat)
+
+    # Reading a cover sheet's barcode at the scanner's resolution, as save_image does
+    cover = render_sheet(QUIZ, "20240001", "Student 1").convert("RGB").resize(resolution)
+    results["scan.identify_cover"] = measure(lambda: identify(cover, QUIZ), repeat)
+    return results
+
+
+PAGE_BYTES = {}  # Scan profile -> saved page sizes, filled by bench_scan_profiles
+
+
+def bench_scan_profiles(repeat):
+    """Scan and save at each scan setting on a fake 300 dpi colour USB scanner"""
+    from core.paths import QuizPaths
+    from core.scansettings import PROFILES
+
+    page = synth.make_chart(random.Random(2), 2480, 3508)
+    stubs.fake_wia_scan(lambda: page.copy(), transfer_rate=20e6)
+    scan = load_tool("scan.py", "bench_scan_profiles")
+    dialogs = stubs.install(scan)
+    app = scan.HighResScannerApp(stubs.Widget())
+    app.quiz_number = QUIZ
+    app.initialize_attendance_file()
+    paths = QuizPaths(QUIZ)
+    counter = iter(range(10 ** 9))
+
+    results = {}
+    settings = [(profile, False) for profile in PROFILES] + [("200 dpi gray", True)]
+    for profile, preview in settings:
+        label = f"preview + {profile}" if preview else profile
+        app.scan_settings = {"profile": profile, "preview": preview}
+        sizes = PAGE_BYTES[label] = []
+
+        def save_one():
+            student_id = f"97{next(counter):06d}"
+            dialogs.answers.extend([student_id, True])
+            app.save_image()
+            dialogs.answers.clear()
+            sizes.append(os.path.getsize(paths.chart(student_id)))
+
+        results[f"scan[{label}]"] = measure(app.scan_image, repeat)
+        results[f"save[{label}]"] = []
+        for _ in range(repeat):
+            app.scan_image()
+            results[f"save[{label}]"].extend(measure(save_one, 1))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the grading tools on synthetic data")
+    parser.add_argument("--students", type=int, default=200)
+    parser.add_argument("--criteria", type=int, default=20)
+    parser.add_argument("--feedback-words", type=int, default=30)
+    parser.add_argument("--resolution", default="1240x1754", help="chart size as WIDTHxHEIGHT")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--edits", type=int, default=20, help="edits per edit/validate/mark round")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--keep", help="generate into this directory and keep it")
+    parser.add_argument("--json", help="also write raw timings to this file")
+    args = parser.parse_args()
+
+    resolution = tuple(int(v) for v in args.resolution.lower().split("x"))
+    workdir = args.keep or tempfile.mkdtemp(prefix="quiz-bench-")
+    os.makedirs(workdir, exist_ok=True)
+
+    start = time.perf_counter()
+    synth.generate(
+        workdir, quiz=QUIZ, students=args.students, criteria=args.criteria,
+        feedback_words=args.feedback_words, resolution=resolution, seed=args.seed
+    )
+    print(f"Generated {args.students} students x {args.criteria} criteria in "
+          f"{time.perf_counter() - start:.1f}s at {workdir}")
+
+    sys.path.insert(0, REPO)
+    os.chdir(workdir)
+    os.environ.setdefault("QUIZ_TELEMETRY", "0")
+
+    results = {}
+    for name, run in (
+        ("grade", lambda: bench_grade(args.repeat, args.edits)),
+        ("validate", lambda: bench_validate(args.repeat, args.edits)),
+        ("upload", lambda: bench_upload(args.repeat, args.edits)),
+        ("scan", lambda: bench_scan(args.repeat, resolution)),
+        ("scan profiles", lambda: bench_scan_profiles(args.repeat)),
+    ):
+        try:
+            results.update(run())
+        except Exception:
+            print(f"{name}: failed")
+            traceback.print_exc()
+
+    print(f"\n{'benchmark':<22} {'median ms':>10} {'min ms':>10} {'max ms':>10}")
+    for name, timings in results.items():
+        if name.startswith(("scan[", "save[")):
+            continue
+        print(f"{name:<22} {statistics.median(timings):>10.2f} {min(timings):>10.2f} {max(timings):>10.2f}")
+
+    if PAGE_BYTES:
+        print(f"\n{'scan setting':<34} {'scan ms':>9} {'save ms':>9} {'KB/page':>9}")
+        for label, sizes in PAGE_BYTES.items():
+            scan_ms = statistics.median(results[f"scan[{label}]"])
+            save_ms = statistics.median(results[f"save[{label}]"])
+            print(f"{label:<34} {scan_ms:>9.1f} {save_ms:>9.1f} {statistics.median(sizes) / 1024:>9.0f}")
+
+    if args.json:
+        with open(os.path.join(REPO, args.json) if not os.path.isabs(args.json) else args.json, "w") as f:
+            json.dump({"args": vars(args), "results": results, "page_bytes": PAGE_BYTES}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
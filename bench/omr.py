@@ -0,0 +1,121 @@
+"""Timing and accuracy check for core.omr on synthetic bubble sheets.
+
+    python -m bench.omr [--students 500] [--questions 20] [--workers N]
+
+Draws one bubble-grid page per student. Most answers are filled in cleanly.
+A few are left blank, double-marked or only faintly ticked, and those must be
+flagged. The run then goes through the same path as `python -m core omr`:
+read, decide, write to grading.csv. It reports the time taken and any
+answers marked wrongly without a flag.
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+from PIL import Image, ImageDraw
+
+from bench.synth import make_markscheme
+from core.grading import GradingStore
+from core.markscheme import Markscheme
+from core.omr import apply_marks, auto_mark, load_specs, read_sheets
+from core.paths import QuizPaths
+
+OPTIONS = "ABCD"
+BOX = (0.15, 0.25, 0.55, 0.85)
+
+
+def make_sheet(rng, answers, width, height):
+    """A page with a questions x options bubble grid; returns it and what was meant"""
+    img = Image.new("L", (width, height), 255)
+    draw = ImageDraw.Draw(img)
+    left, top = BOX[0] * width, BOX[1] * height
+    cell_w = (BOX[2] - BOX[0]) * width / len(OPTIONS)
+    cell_h = (BOX[3] - BOX[1]) * height / len(answers)
+    radius = min(cell_w, cell_h) * 0.3
+    truth = []
+    for row in range(len(answers)):
+        roll = rng.random()
+        choice = rng.randrange(len(OPTIONS))
+        kind = "blank" if roll < 0.01 else "double" if roll < 0.02 else "faint" if roll < 0.03 else "clean"
+        truth.append((OPTIONS[choice], kind))
+        for column in range(len(OPTIONS)):
+            # Scans are never perfectly aligned
+            x = left + (column + 0.5) * cell_w + rng.uniform(-2, 2)
+            y = top + (row + 0.5) * cell_h + rng.uniform(-2, 2)
+            bubble = (x - radius, y - radius, x + radius, y + radius)
+            fill = None
+            if kind != "blank" and column == choice:
+                fill = 170 if kind == "faint" else rng.randrange(0, 60)
+            elif kind == "double" and column == (choice + 1) % len(OPTIONS):
+                fill = rng.randrange(0, 60)
+            draw.ellipse(bubble, outline=0, fill=fill, width=2)
+    return img, truth
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--students", type=int, default=500)
+    parser.add_argument("--questions", type=int, default=20)
+    parser.add_argument("--workers", type=int)
+    parser.add_argument("--resolution", default="1240x1754", help="page size as WIDTHxHEIGHT")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    width, height = (int(n) for n in args.resolution.split("x"))
+
+    rng = random.Random(args.seed)
+    paths = QuizPaths(1, base_dir=os.path.join(tempfile.mkdtemp(prefix="omr-bench-"), "their data"))
+    paths.ensure(charts=True)
+    markscheme = Markscheme(make_markscheme(args.questions, sections=1, max_mark=1))
+    with open(paths.markscheme, "w") as f:
+        f.write("\n".join(markscheme.lines) + "\n")
+    key = "".join(rng.choice(OPTIONS) for _ in range(args.questions))
+    with open(paths.omr, "w") as f:
+        json.dump({"Q1": {"box": list(BOX), "options": OPTIONS, "answers": key}}, f)
+
+    print(f"Drawing {args.students} sheets...")
+    truths = {}
+    sheets = []
+    for n in range(args.students):
+        student_id = str(20240000 + n)
+        img, truths[student_id] = make_sheet(rng, key, width, height)
+        img.save(paths.chart(student_id), format="PNG", compress_level=1)
+        sheets.append((student_id, [paths.chart(student_id)]))
+
+    started = time.perf_counter()
+    specs = load_specs(paths.omr)
+    fills = read_sheets(sheets, specs, workers=args.workers)
+    read_time = time.perf_counter() - started
+    results = auto_mark(fills, specs, markscheme)
+    grading = GradingStore.open(paths.grading_csv, markscheme, [student_id for student_id, _ in sheets])
+    apply_marks(grading, markscheme, results)
+    grading.save()
+    elapsed = time.perf_counter() - started
+
+    wrong = missed_flags = false_flags = 0
+    for student_id, (marks, flagged) in results.items():
+        for criterion, (answer, kind) in zip(markscheme.criteria, truths[student_id]):
+            is_flagged = criterion.key in flagged
+            if kind == "clean":
+                false_flags += is_flagged
+                expected = criterion.max_mark if answer == key[markscheme.criteria.index(criterion)] else 0
+                wrong += not is_flagged and marks[criterion.key] != expected
+            else:
+                missed_flags += not is_flagged
+
+    answers = args.students * args.questions
+    print(f"{args.students} students x {args.questions} questions in {elapsed:.2f}s "
+          f"(reading {read_time:.2f}s, {1000 * elapsed / args.students:.1f} ms/student)")
+    print(f"wrong unflagged marks: {wrong}/{answers}")
+    print(f"unclear answers not flagged: {missed_flags}")
+    print(f"clean answers flagged: {false_flags}")
+    ok = wrong == 0 and missed_flags == 0 and elapsed < 60
+    print("OK" if ok else "FAILED")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+"""Concurrent-writer stress test for core.csvfile.
+
+    python -m bench.stress [--writers 6] [--rounds 40] [--rows 200]
+
+Several processes update the same students CSV at once, the way
+validate-names.py, grade.py and upload.py do during a busy session. Each
+writer owns one column and sets one cell per round, and some writers also
+append rows. A reader checks that every version of the file it sees parses
+completely. At the end every writer's last value in every row it touched must
+be on disk: a lost update or a torn file fails the run.
+"""
+import argparse
+import multiprocessing
+import os
+import random
+import sys
+import tempfile
+import time
+
+
+def writer(path, number, rounds, rows, seed):
+    from core.csvfile import CsvFile
+
+    rng = random.Random(seed + number)
+    column = f"w{number}"
+    csv_file = CsvFile(path)
+    expected = {}
+    for n in range(rounds):
+        data = csv_file.read()
+        if column not in data.columns:
+            data[column] = None
+        data[column] = data[column].astype(object)
+        row = rng.randrange(rows)
+        data.loc[data['id'] == row, column] = f"{number}:{n}"
+        expected[row] = f"{number}:{n}"
+        if number % 2 == 0 and n % 10 == 0:
+            # Even writers also add students, like validate-names.py picking up scans
+            new_id = 100000 * (number + 1) + n
+            data.loc[len(data)] = {**{c: None for c in data.columns}, 'id': new_id, 'name': f"new {new_id}"}
+            expected[('added', new_id)] = True
+        csv_file.write(data)
+        time.sleep(rng.random() * 0.005)
+    return number, expected
+
+
+def reader(path, stop, results):
+    import pandas as pd
+
+    reads = torn = 0
+    while not stop.is_set():
+        try:
+            frame = pd.read_csv(path)
+            if 'id' not in frame.columns or frame['id'].isna().any():
+                torn += 1
+        except Exception:
+            torn += 1
+        reads += 1
+    results.put((reads, torn))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--writers", type=int, default=6)
+    parser.add_argument("--rounds", type=int, default=40)
+    parser.add_argument("--rows", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    import pandas as pd
+
+    workdir = tempfile.mkdtemp(prefix="csv-stress-")
+    path = os.path.join(workdir, "quiz-1 students.csv")
+    pd.DataFrame({
+        'id': range(args.rows),
+        'name': [f"Student {n}" for n in range(args.rows)],
+        'validated': False,
+    }).to_csv(path, index=False)
+
+    stop = multiprocessing.Event()
+    reads = multiprocessing.Queue()
+    watcher = multiprocessing.Process(target=reader, args=(path, stop, reads))
+    watcher.start()
+
+    started = time.perf_counter()
+    with multiprocessing.Pool(args.writers) as pool:
+        outcomes = pool.starmap(writer, [
+            (path, number, args.rounds, args.rows, args.seed) for number in range(args.writers)
+        ])
+    elapsed = time.perf_counter() - started
+    stop.set()
+    read_count, torn = reads.get()
+    watcher.join()
+
+    final = pd.read_csv(path)
+    by_id = final.set_index(final['id'].astype(int))
+    lost = 0
+    for number, expected in outcomes:
+        for row, value in expected.items():
+            if isinstance(row, tuple):
+                lost += row[1] not in by_id.index
+            elif str(by_id.at[row, f"w{number}"]) != value:
+                lost += 1
+
+    writes = args.writers * args.rounds
+    print(f"{writes} writes from {args.writers} processes in {elapsed:.2f}s "
+          f"({writes / elapsed:.0f} writes/s)")
+    print(f"reader: {read_count} reads, {torn} torn")
+    print(f"lost updates: {lost}")
+    ok = lost == 0 and torn == 0
+    print("OK" if ok else "FAILED")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
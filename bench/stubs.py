@@ -0,0 +1,183 @@
+"""Headless stand-ins for the Tk widgets and dialogs the tools use.
+
+Only what the benchmarks exercise is modelled: text-holding widgets keep their
+contents, list widgets keep their rows and selection, everything else accepts
+any call and returns another stub.
+"""
+import sys
+import time
+import tkinter
+import types
+
+
+class Widget:
+    def __init__(self, *args, **kwargs):
+        self.items = []
+        self.selection_ = ()
+        self.options = dict(kwargs)
+
+    def __getattr__(self, name):
+        if name == "winfo_children":
+            return lambda: []
+        if name in ("canvasx", "canvasy"):
+            return lambda value, *a: value
+        if name.startswith("winfo_"):
+            return lambda *a, **k: False if name == "winfo_ismapped" else 800
+        return lambda *a, **k: Widget()
+
+    def __call__(self, *args, **kwargs):
+        return Widget()
+
+    # Entry / Text / Listbox contents
+    def get(self, *args):
+        return "".join(str(item) for item in self.items)
+
+    def insert(self, index, *values, **kwargs):
+        if index in (0, 1.0, "1.0", "insert linestart"):
+            self.items[0:0] = list(values)
+        else:
+            self.items.extend(values)
+        return f"I{len(self.items)}"
+
+    def delete(self, *args):
+        self.items = []
+
+    def size(self):
+        return len(self.items)
+
+    def curselection(self):
+        return self.selection_
+
+    def config(self, *args, **kwargs):
+        self.options.update(kwargs)
+
+    configure = config
+
+    def cget(self, key):
+        return self.options.get(key)
+
+
+class Treeview(Widget):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.rows = {}
+
+    def insert(self, parent, index, values=(), **kwargs):
+        item = f"I{len(self.rows)}"
+        self.rows[item] = {"values": list(values), "tags": kwargs.get("tags")}
+        return item
+
+    def get_children(self, *args):
+        return list(self.rows)
+
+    def delete(self, *items):
+        for item in items:
+            self.rows.pop(item, None)
+
+    def item(self, item, **kwargs):
+        if kwargs:
+            self.rows[item].update(kwargs)
+        return self.rows[item]
+
+    def selection(self):
+        return list(self.selection_)
+
+
+def stub_module(real, **overrides):
+    """A module whose classes are stub widgets but whose constants are real"""
+
+    class Namespace:
+        def __getattr__(self, name):
+            value = getattr(real, name, None)
+            if isinstance(value, (str, int, float)):
+                return value
+            return Widget
+
+    namespace = Namespace()
+    vars(namespace).update(overrides)
+    return namespace
+
+
+class Dialogs:
+    """messagebox/simpledialog replacement that answers from a queue"""
+
+    def __init__(self):
+        self.answers = []
+        self.shown = []
+
+    def __getattr__(self, name):
+        def dialog(*args, **kwargs):
+            self.shown.append((name, args))
+            if name.startswith("ask"):
+                return self.answers.pop(0) if self.answers else None
+            return None
+        return dialog
+
+
+class PhotoImage:
+    def __init__(self, image=None, **kwargs):
+        self.image = image
+
+    def width(self):
+        return self.image.width if self.image else 0
+
+    def height(self):
+        return self.image.height if self.image else 0
+
+
+def fake_wia_scan(image_factory, transfer_rate=None):
+    """Install a fake `wia_scan` module whose scanner returns `image_factory()`
+
+    `image_factory()` is the page at the device's highest resolution. A
+    `scan_profile` asking for less is scaled down on the "device", and with a
+    `transfer_rate` (bytes per second) each scan takes as long as sending
+    its pixels over the cable would.
+    """
+    from core.scansettings import A4_INCHES
+
+    scaled = {}  # The device's own scaling isn't what's being timed
+
+    def scan_side(device=None, scan_profile=None, **kwargs):
+        image = image_factory()
+        if scan_profile:
+            key = (scan_profile["dpi"], scan_profile.get("mode"))
+            if key not in scaled:
+                width = round(A4_INCHES[0] * scan_profile["dpi"])
+                if width < image.width:
+                    image = image.resize((width, round(image.height * width / image.width)))
+                if scan_profile.get("mode") != image.mode:
+                    image = image.convert(scan_profile["mode"])
+                scaled[key] = image
+            image = scaled[key].copy()
+        if transfer_rate:
+            time.sleep(len(image.getbands()) * image.width * image.height / transfer_rate)
+        return image
+
+    module = types.ModuleType("wia_scan")
+    module.get_device_manager = lambda: object()
+    module.connect_device = lambda manager, device_id: object()
+    module.scan_side = scan_side
+    module.__all__ = ["get_device_manager", "connect_device", "scan_side"]
+    sys.modules["wia_scan"] = module
+    return module
+
+
+def install(module):
+    """Swap the Tk pieces a tool module imported for headless stubs"""
+    dialogs = Dialogs()
+    if hasattr(module, "tk"):
+        module.tk = stub_module(tkinter)
+    if hasattr(module, "ttk"):
+        module.ttk = stub_module(tkinter, Treeview=Treeview)
+    if hasattr(module, "font"):
+        module.font = stub_module(tkinter, families=lambda: ())
+    for name in ("messagebox", "simpledialog", "filedialog"):
+        if hasattr(module, name):
+            setattr(module, name, dialogs)
+    # Shared widget modules the tool imported need the same treatment
+    for shared in ("viewer",):
+        if shared in sys.modules and sys.modules[shared] is not module:
+            install(sys.modules[shared])
+    if hasattr(module, "ImageTk"):
+        module.ImageTk = types.SimpleNamespace(PhotoImage=PhotoImage)
+    return dialogs
@@ -0,0 +1,112 @@
+"""Generate synthetic `their data/quiz N` trees for benchmarking."""
+import os
+import random
+
+import pandas as pd
+from PIL import Image, ImageDraw
+
+WORDS = (
+    "flowchart decision loop terminator arrow label missing correct start end input "
+    "output process condition branch variable counter total average print read"
+).split()
+
+
+def sentence(rng, length):
+    return " ".join(rng.choice(WORDS) for _ in range(length)).capitalize() + "."
+
+
+def make_markscheme(criteria, sections=4, max_mark=5):
+    """Split `criteria` criteria over `sections` sections, marking the last one as bonus"""
+    per_section = max(1, criteria // sections)
+    lines = []
+    made = 0
+    section = 0
+    while made < criteria:
+        section += 1
+        count = min(per_section, criteria - made)
+        pairs = []
+        for n in range(count):
+            made += 1
+            name = f"criterion {made}" + ("*" if made == criteria else "")
+            pairs.append(f"{max_mark},{name}")
+        lines.append(f"Q{section}:" + ";".join(pairs))
+    return lines
+
+
+def make_chart(rng, width, height):
+    """A white page with some dark strokes, roughly like a scanned flowchart"""
+    img = Image.new("RGB", (width, height), "white")
+    draw = ImageDraw.Draw(img)
+    for _ in range(40):
+        x, y = rng.randrange(width), rng.randrange(height)
+        w, h = rng.randrange(width // 20, width // 5), rng.randrange(height // 40, height // 10)
+        draw.rectangle((x, y, x + w, y + h), outline="black", width=max(1, width // 400))
+        draw.line((x + w // 2, y + h, x + w // 2, y + h + h), fill="black", width=max(1, width // 400))
+    return img
+
+
+def generate(root, quiz=1, students=200, criteria=20, feedback_words=30,
+             resolution=(1240, 1754), graded=0.5, seed=0, charts=True):
+    """Create a synthetic quiz tree under `root` and return the student ids"""
+    rng = random.Random(seed)
+    quiz_dir = os.path.join(root, "their data", f"quiz {quiz}")
+    feedback_dir = os.path.join(quiz_dir, "feedback")
+    charts_dir = os.path.join(quiz_dir, "charts")
+    sheets_dir = os.path.join(root, "sheets")
+    for directory in (feedback_dir, charts_dir, sheets_dir):
+        os.makedirs(directory, exist_ok=True)
+
+    ids = [str(20240000 + n) for n in range(students)]
+    names = [f"Student {n}" for n in range(students)]
+
+    # Master roster in the layout validate-names.py reads
+    roster = pd.DataFrame({"number": [float(i) for i in ids], "name": names})
+    try:
+        roster.to_excel(os.path.join(sheets_dir, "students.xlsx"), sheet_name="quizzes", index=False)
+    except ImportError:
+        pass  # openpyxl missing, validation benchmarks will report the error
+
+    with open(os.path.join(feedback_dir, f"quiz-{quiz} attendance.txt"), "w", encoding="utf-8") as f:
+        f.write("\n".join(ids) + "\n")
+
+    markscheme = make_markscheme(criteria)
+    with open(os.path.join(feedback_dir, f"quiz-{quiz} markscheme.txt"), "w") as f:
+        f.write("\n".join(markscheme) + "\n")
+
+    columns = []
+    for line in markscheme:
+        section, criteria_str = line.split(":", 1)
+        for pair in criteria_str.split(";"):
+            columns.append(f"{section}_{pair.split(',')[1].rstrip('*')}")
+
+    grading_rows = []
+    student_rows = []
+    for student_id, name in zip(ids, names):
+        is_graded = rng.random() < graded
+        row = {"student_id": int(student_id)}
+        total = 0
+        for column in columns:
+            mark = rng.randint(0, 5) if is_graded else None
+            row[column] = mark
+            total += mark or 0
+        row["feedback"] = sentence(rng, feedback_words) if is_graded else None
+        row["graded"] = is_graded
+        row["overall_grade"] = None
+        grading_rows.append(row)
+        student_rows.append({
+            "id": int(student_id), "name": name, "grade": total, "validated": True,
+            "bonus": 0, "total": total, "uploaded": False
+        })
+
+    pd.DataFrame(student_rows).to_csv(os.path.join(feedback_dir, f"quiz-{quiz} students.csv"), index=False)
+    pd.DataFrame(grading_rows, columns=["student_id"] + columns + ["feedback", "graded", "overall_grade"]).to_csv(
+        os.path.join(feedback_dir, f"quiz-{quiz} grading.csv"), index=False
+    )
+
+    if charts:
+        # Charts are mostly identical pages, so render a few and reuse them
+        pages = [make_chart(rng, *resolution) for _ in range(min(students, 8))]
+        for n, student_id in enumerate(ids):
+            pages[n % len(pages)].save(os.path.join(charts_dir, f"quiz-{quiz} {student_id}.png"), format="PNG")
+
+    return ids
@@ -0,0 +1 @@
+"""Shared, GUI-free helpers used by the quiz grading scripts."""
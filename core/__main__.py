@@ -0,0 +1,520 @@
+"""Command-line entry points that run without Tk: `python -m core <command>`."""
+import argparse
+import csv
+import os
+
+from core.attendance import AttendanceStore
+from core.paths import QuizPaths
+
+
+def read_rows(path):
+    if not os.path.exists(path):
+        return []
+    with open(path, newline="", encoding="utf-8") as f:
+        return list(csv.DictReader(f))
+
+
+def truthy(value):
+    return str(value).strip().lower() in ("true", "1", "1.0")
+
+
+def status(args):
+    """Print how far a quiz has got through scanning, validation, grading and upload"""
+    paths = QuizPaths(args.quiz)
+    scanned = len(AttendanceStore(paths.attendance))
+    charts = len([name for name in os.listdir(paths.charts_dir) if name.endswith(".png")]) \
+        if os.path.isdir(paths.charts_dir) else 0
+    students = read_rows(paths.students_csv)
+    grading = read_rows(paths.grading_csv)
+
+    print(f"Quiz {args.quiz}")
+    print(f"  scanned:   {scanned} ({charts} page images)")
+    print(f"  validated: {sum(truthy(row.get('validated')) for row in students)}/{len(students)}")
+    print(f"  graded:    {sum(truthy(row.get('graded')) for row in grading)}/{len(grading)}")
+    print(f"  uploaded:  {sum(truthy(row.get('uploaded')) for row in students)}/{len(students)}")
+
+
+def preprocess(args):
+    """Deskew, crop and convert every chart of a quiz in a process pool"""
+    from core.preprocess import process_many
+
+    paths = QuizPaths(args.quiz)
+    charts = sorted(
+        os.path.join(paths.charts_dir, name)
+        for name in os.listdir(paths.charts_dir) if name.endswith(".png")
+    ) if os.path.isdir(paths.charts_dir) else []
+    if not charts:
+        print(f"No charts found in {paths.charts_dir}")
+        return
+
+    backup_dir = None if args.no_backup else paths.raw_charts_dir
+    total_before = total_after = 0
+    for done, (path, before, after) in enumerate(process_many(
+        charts, workers=args.workers, backup_dir=backup_dir, mode=args.mode,
+        deskew=not args.no_deskew, crop=not args.no_crop
+    ), start=1):
+        if after is None:
+            print(f"  failed: {path} ({before})")
+            continue
+        total_before += before
+        total_after += after
+        print(f"  [{done}/{len(charts)}] {os.path.basename(path)}: {before // 1024} KB -> {after // 1024} KB")
+
+    if total_after:
+        print(f"Total {total_before // 1024} KB -> {total_after // 1024} KB "
+              f"({total_before / total_after:.1f}x smaller)")
+
+
+def hashes(args):
+    """Re-hash every chart of a quiz and report blank pages and near-duplicates"""
+    from concurrent.futures import ProcessPoolExecutor
+
+    from core.phash import DUPLICATE_DISTANCE, HashIndex, hash_file
+
+    paths = QuizPaths(args.quiz)
+    charts = sorted(
+        os.path.join(paths.charts_dir, name)
+        for name in os.listdir(paths.charts_dir) if name.endswith(".png")
+    ) if os.path.isdir(paths.charts_dir) else []
+    if not charts:
+        print(f"No charts found in {paths.charts_dir}")
+        return
+
+    # Hash what was scanned, as scan.py and ingest do, not the cleaned-up page
+    sources = []
+    for path in charts:
+        raw_path = os.path.join(paths.raw_charts_dir, os.path.basename(path))
+        sources.append(raw_path if os.path.exists(raw_path) else path)
+
+    index = HashIndex(paths, load=False)
+    blank = []
+    with ProcessPoolExecutor(max_workers=args.workers) as pool:
+        for path, (_, value, is_blank) in zip(charts, pool.map(hash_file, sources, chunksize=8)):
+            index.add(os.path.basename(path), value, save=False)
+            if is_blank:
+                blank.append(os.path.basename(path))
+    index.save()
+
+    radius = args.distance if args.distance is not None else DUPLICATE_DISTANCE
+    seen = set()
+    groups = []
+    for name, value in sorted(index.hashes.items()):
+        if name in seen:
+            continue
+        group = [match for _, match in index.duplicates(value, radius)]
+        if len(group) > 1:
+            seen.update(group)
+            groups.append(group)
+
+    print(f"Hashed {len(charts)} pages into {index.path}")
+    print(f"Blank pages: {len(blank)}")
+    for name in blank:
+        print(f"  {name}")
+    print(f"Possible duplicates: {len(groups)}")
+    for group in groups:
+        print(f"  {', '.join(group)}")
+
+
+def pagestore(args):
+    """Build the memory-mapped page store that grade.py and validate-names.py read from"""
+    from core.pagestore import PageStore
+
+    paths = QuizPaths(args.quiz)
+    charts = sorted(
+        os.path.join(paths.charts_dir, name)
+        for name in os.listdir(paths.charts_dir) if name.endswith(".png")
+    ) if os.path.isdir(paths.charts_dir) else []
+    if not charts:
+        print(f"No charts found in {paths.charts_dir}")
+        return
+
+    for done, path in enumerate(PageStore.build(paths, charts, width=args.width, workers=args.workers), start=1):
+        if done % 25 == 0 or done == len(charts):
+            print(f"  [{done}/{len(charts)}] {os.path.basename(path)}")
+    store = PageStore.open(paths)
+    size = os.path.getsize(store.path)
+    print(f"Stored {len(store.pages)} pages at {store.width}x{store.height} in {store.path} "
+          f"({size / 2 ** 20:.0f} MB)")
+
+
+def merge(args):
+    """Merge scanning stations' spools into the shared quiz directory, once or continuously"""
+    import time
+
+    from core.merge import StationMerger, find_stations
+
+    stations = find_stations(args.quiz)
+    if not stations:
+        print(f"No station spools for quiz {args.quiz} (start scan.py with QUIZ_STATION=<name>)")
+        if not args.watch:
+            return
+
+    merger = StationMerger(QuizPaths(args.quiz), stations)
+    if stations:
+        print(f"Merging stations {', '.join(stations)} into {merger.paths.quiz_dir}")
+    while True:
+        # A station that starts scanning after the merge has started is picked up on the next pass
+        added = merger.add_stations(find_stations(args.quiz))
+        if added:
+            print(f"  {time.strftime('%H:%M:%S')} merging new station {', '.join(added)}")
+        new_ids, pages, copies, duplicates = merger.merge_once()
+        if new_ids or pages or duplicates:
+            print(f"  {time.strftime('%H:%M:%S')} +{new_ids} students, +{pages} pages"
+                  + (f" ({copies} copied)" if copies else "")
+                  + (f", {duplicates} duplicate pages skipped" if duplicates else ""))
+        if not args.watch:
+            break
+        try:
+            time.sleep(args.interval)
+        except KeyboardInterrupt:
+            break
+
+
+def ingest(args):
+    """File scans dropped into a quiz's inbox folder, once or continuously"""
+    import time
+
+    from core.ingest import Ingester
+
+    ingester = Ingester(QuizPaths(args.quiz), inbox=args.inbox, workers=args.workers)
+    os.makedirs(ingester.inbox, exist_ok=True)
+    print(f"Ingesting {ingester.inbox} into {ingester.paths.charts_dir}")
+    while True:
+        done, pages, duplicates, set_aside = ingester.ingest_once()
+        if done or set_aside:
+            print(f"  {time.strftime('%H:%M:%S')} {done} files, +{pages} pages"
+                  + (f", {duplicates} duplicate pages skipped" if duplicates else "")
+                  + (f", {set_aside} files set aside" if set_aside else ""))
+        if not args.watch:
+            break
+        try:
+            time.sleep(args.interval)
+        except KeyboardInterrupt:
+            break
+
+
+def export(args):
+    """Render a feedback PDF for each graded student, skipping ones already up to date"""
+    import time
+
+    from core.export import Exporter, build_jobs
+    from core.markscheme import Markscheme
+    from core.pages import PageIndex
+
+    paths = QuizPaths(args.quiz)
+    markscheme = Markscheme.load(paths.markscheme)
+    grading_rows = {row['student_id']: row for row in read_rows(paths.grading_csv)}
+    names = {row['id']: row.get('name') or "" for row in read_rows(paths.students_csv)}
+    student_ids = [student_id for student_id, row in grading_rows.items()
+                   if args.all or truthy(row.get('graded'))]
+
+    exporter = Exporter(paths)
+    jobs = build_jobs(paths, markscheme, grading_rows, names, PageIndex(paths), student_ids)
+    stale = exporter.stale(jobs, force=args.force)
+    print(f"{len(stale)} of {len(jobs)} feedback documents to render into {paths.export_dir}")
+    started = time.perf_counter()
+    for done, (student_id, error) in enumerate(exporter.run(stale, workers=args.workers), start=1):
+        if error is not None:
+            print(f"  failed: {student_id} ({error})")
+        elif done % 50 == 0 or done == len(stale):
+            print(f"  [{done}/{len(stale)}] {time.perf_counter() - started:.1f}s")
+
+
+def crops(args):
+    """Cut every saved region out of every student's scan for question-by-question marking"""
+    from core.crops import crop_jobs, crop_many
+    from core.pages import PageIndex
+    from core.regions import load_regions
+
+    paths = QuizPaths(args.quiz)
+    regions = load_regions(paths.regions)
+    if args.region:
+        regions = {name: box for name, box in regions.items() if name in args.region}
+    if not regions:
+        print(f"No regions saved in {paths.regions}")
+        return
+
+    page_index = PageIndex(paths)
+    # Every scanned student, plus any with pages but no attendance line
+    student_ids = list(dict.fromkeys(list(AttendanceStore(paths.attendance)) + list(page_index.manifest)))
+    jobs = crop_jobs(paths, page_index, regions, student_ids)
+    print(f"{len(jobs)} crops to make for {', '.join(regions)}")
+    for done, (destination, error) in enumerate(crop_many(jobs, workers=args.workers), start=1):
+        if error is not None:
+            print(f"  failed: {destination} ({error})")
+        elif done % 50 == 0 or done == len(jobs):
+            print(f"  [{done}/{len(jobs)}]")
+
+
+def omr(args):
+    """Read the multiple-choice bubble grids of every scan and propose marks"""
+    import time
+
+    from core.grading import GradingStore
+    from core.markscheme import Markscheme
+    from core.omr import apply_marks, auto_mark, load_specs, read_sheets
+    from core.pages import PageIndex
+
+    paths = QuizPaths(args.quiz)
+    specs = load_specs(paths.omr)
+    if not specs:
+        print(f"No bubble grids described in {paths.omr}")
+        return
+    markscheme = Markscheme.load(paths.markscheme)
+
+    page_index = PageIndex(paths)
+    student_ids = list(dict.fromkeys(list(AttendanceStore(paths.attendance)) + list(page_index.manifest)))
+    sheets = [(student_id, page_index.pages(student_id)) for student_id in student_ids]
+    sheets = [(student_id, pages) for student_id, pages in sheets if pages]
+
+    started = time.perf_counter()
+    fills = read_sheets(sheets, specs, workers=args.workers)
+    results = auto_mark(fills, specs, markscheme, args.min_fill, args.min_margin)
+    grading = GradingStore.open(paths.grading_csv, markscheme, [student_id for student_id, _ in sheets])
+    updated, flagged = apply_marks(grading, markscheme, results, overwrite=args.overwrite)
+    grading.save()
+    print(f"{len(sheets)} students read in {time.perf_counter() - started:.1f}s: "
+          f"{updated} updated, {flagged} answers flagged for review")
+
+
+def analysis(args):
+    """Item analysis of criteria for one or more quizzes (a whole semester with --all)"""
+    import json
+    import time
+
+    from core.analysis import concerns, find_quizzes, quiz_report, sparkline
+    from core.paths import BASE_DIR
+
+    quizzes = find_quizzes(BASE_DIR) if args.all else args.quiz
+    if not quizzes:
+        print("No quizzes given (list quiz numbers or use --all)")
+        return
+
+    started = time.perf_counter()
+    reports = {}
+    for quiz in quizzes:
+        paths = QuizPaths(quiz)
+        if not os.path.exists(paths.grading_csv) or not os.path.exists(paths.markscheme):
+            print(f"Quiz {quiz}: no grading data")
+            continue
+        results = reports[str(quiz)] = quiz_report(paths)
+        totals = results["totals"]
+        mean = "-" if totals["mean"] is None else f"{totals['mean']:.1f}/{totals['max']:g}"
+        print(f"Quiz {quiz}: {results['complete']} of {results['students']} students fully marked, "
+              f"mean {mean}  {sparkline(totals['histogram'])}")
+        alphas = [f"{name} {section['alpha']:.2f}" for name, section in results["sections"].items()
+                  if section["alpha"] is not None]
+        if alphas:
+            print(f"  alpha: {' | '.join(alphas)}")
+        if args.verbose:
+            print(f"  {'criterion':<30} {'facility':>8} {'discrim':>8} {'r(item-rest)':>12}  marks")
+            for key, item in results["criteria"].items():
+                values = [item[name] for name in ("facility", "discrimination", "point_biserial")]
+                print(f"  {key[:30]:<30} " + " ".join(
+                    f"{'-' if value is None else f'{value:.2f}':>{width}}"
+                    for value, width in zip(values, (8, 8, 12))) + f"  {sparkline(item['histogram'])}")
+        for key, reason in concerns(results):
+            print(f"  {key}: {reason}")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(reports, f, indent=1)
+    print(f"{len(reports)} quizzes analysed in {time.perf_counter() - started:.2f}s")
+
+
+def compare(args):
+    """Compare first and second marking of a quiz: agreement, differences and grader bias"""
+    from core.doublemark import compare, read_layer
+    from core.markscheme import Markscheme
+
+    paths = QuizPaths(args.quiz)
+    second = read_layer(paths.second_grading_csv)
+    if not second:
+        print(f"No second marking in {paths.second_grading_csv}")
+        return
+    markscheme = Markscheme.load(paths.markscheme)
+    report = compare(read_layer(paths.first_grading_csv), second, markscheme, tolerance=args.tolerance)
+
+    def number(value, spec):
+        return "-" if value is None or value != value else format(value, spec)
+
+    print(f"Quiz {args.quiz}: {report['students']} students marked by both, "
+          f"{len(report['disagreements'])} with differing marks")
+    print(f"  {'criterion':<30} {'pairs':>6} {'agree':>7} {'mean |d|':>9} {'bias':>7}")
+    for key, item in report["criteria"].items():
+        if item["pairs"]:
+            print(f"  {key[:30]:<30} {item['pairs']:>6} {number(item['agreement'], '.0%'):>7} "
+                  f"{number(item['mad'], '.2f'):>9} {number(item['bias'], '+.2f'):>7}")
+    print("  Grader bias (share of the maximum, against the other marker):")
+    for name, item in report["graders"].items():
+        print(f"    {name:<28} {number(item['bias'], '+.1%'):>7} over {item['marks']} marks")
+    if args.list:
+        for student_id, differences in report["disagreements"].items():
+            print(f"  {student_id}: " + ", ".join(
+                f"{key} {first:g}/{second:g}" for key, (first, second) in differences.items()))
+
+
+def drift(args):
+    """Report grader drift over the marking session and draw a stratified re-mark sample"""
+    import time
+
+    from core.drift import DriftMonitor, EditLog, stratified_sample, write_sample
+    from core.markscheme import Markscheme
+
+    paths = QuizPaths(args.quiz)
+    markscheme = Markscheme.load(paths.markscheme)
+    monitor = DriftMonitor(markscheme, window=args.window, threshold=args.threshold)
+    entries = EditLog(paths.edit_log).read_new()
+    monitor.feed(entries)
+    graders = sorted({grader for grader, _ in monitor.series})
+    print(f"Quiz {args.quiz}: {len(entries)} saves by {len(graders)} graders in {paths.edit_log}")
+
+    for grader in graders:
+        groups = sorted(group for group in monitor.series if group[0] == grader)
+        marks = sum(len(monitor.series[group][1]) for group in groups)
+        flagged = []
+        for group in groups:
+            times, z = monitor.history(group)
+            if not len(z):
+                continue
+            peak = abs(z).argmax()
+            if abs(z[peak]) >= args.threshold:
+                flagged.append((abs(z[peak]), group[1], z[peak], times[peak], z[-1]))
+        print(f"  {grader}: {marks} marks, {len(flagged)} of {len(groups)} criteria drifted")
+        for _, key, peak_z, peak_time, last_z in sorted(flagged, reverse=True):
+            print(f"    {key}: {peak_z:+.1f} SE at {time.strftime('%H:%M', time.localtime(peak_time))}, "
+                  f"now {last_z:+.1f}")
+
+    if args.sample:
+        sample = stratified_sample(read_rows(paths.first_grading_csv), markscheme, monitor, args.sample,
+                                   seed=args.seed)
+        write_sample(paths.moderation, sample)
+        strata = {}
+        for _, stratum in sample:
+            strata[stratum] = strata.get(stratum, 0) + 1
+        print(f"{len(sample)} scripts to re-mark from {len(strata)} groups written to {paths.moderation}")
+        for (band, grader, phase), count in sorted(strata.items()):
+            print(f"  {band:<7} {grader:<16} {phase:<8} {count}")
+
+
+def covers(args):
+    """Render a barcoded cover sheet for every student on the master sheet"""
+    import time
+
+    from core.coversheet import roster_entries, write_pdf
+    from core.paths import MASTER_SHEET
+
+    paths = QuizPaths(args.quiz).ensure()
+    output = args.output or paths.feedback_file("covers.pdf")
+    entries = roster_entries(args.master or MASTER_SHEET)
+    started = time.perf_counter()
+    pages = write_pdf(output, args.quiz, entries, workers=args.workers)
+    print(f"{pages} cover sheets written to {output} in {time.perf_counter() - started:.1f}s")
+
+
+def main():
+    parser = argparse.ArgumentParser(prog="python -m core", description=__doc__)
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    status_parser = commands.add_parser("status", help="summarise a quiz's progress")
+    status_parser.add_argument("quiz", type=int)
+    status_parser.set_defaults(func=status)
+
+    preprocess_parser = commands.add_parser("preprocess", help="deskew, crop and shrink a quiz's charts")
+    preprocess_parser.add_argument("quiz", type=int)
+    preprocess_parser.add_argument("--mode", choices=["gray", "bilevel", "color"], default="gray")
+    preprocess_parser.add_argument("--workers", type=int, help="worker processes (default: all cores)")
+    preprocess_parser.add_argument("--no-deskew", action="store_true")
+    preprocess_parser.add_argument("--no-crop", action="store_true")
+    preprocess_parser.add_argument("--no-backup", action="store_true",
+                                   help="don't keep the originals in charts/raw")
+    preprocess_parser.set_defaults(func=preprocess)
+
+    hashes_parser = commands.add_parser("hashes", help="find blank and duplicated pages in a quiz")
+    hashes_parser.add_argument("quiz", type=int)
+    hashes_parser.add_argument("--workers", type=int, help="worker processes (default: all cores)")
+    hashes_parser.add_argument("--distance", type=int,
+                               help="max differing bits (of 256) to count as a duplicate")
+    hashes_parser.set_defaults(func=hashes)
+
+    store_parser = commands.add_parser("pagestore", help="build the fast page store for a quiz")
+    store_parser.add_argument("quiz", type=int)
+    store_parser.add_argument("--width", type=int, default=1240,
+                              help="stored page width in pixels (default: 150 dpi A4)")
+    store_parser.add_argument("--workers", type=int, help="worker processes (default: all cores)")
+    store_parser.set_defaults(func=pagestore)
+
+    merge_parser = commands.add_parser("merge", help="merge scanning stations into the shared quiz")
+    merge_parser.add_argument("quiz", type=int)
+    merge_parser.add_argument("--watch", action="store_true", help="keep merging as stations scan")
+    merge_parser.add_argument("--interval", type=float, default=2.0, help="seconds between passes")
+    merge_parser.set_defaults(func=merge)
+
+    ingest_parser = commands.add_parser("ingest", help="file scans dropped into a quiz's inbox folder")
+    ingest_parser.add_argument("quiz", type=int)
+    ingest_parser.add_argument("--inbox", help="folder to watch (default: their data/quiz N/inbox)")
+    ingest_parser.add_argument("--watch", action="store_true", help="keep ingesting as files arrive")
+    ingest_parser.add_argument("--interval", type=float, default=2.0, help="seconds between passes")
+    ingest_parser.add_argument("--workers", type=int, help="worker processes (default: all cores)")
+    ingest_parser.set_defaults(func=ingest)
+
+    export_parser = commands.add_parser("export", help="render per-student feedback PDFs")
+    export_parser.add_argument("quiz", type=int)
+    export_parser.add_argument("--all", action="store_true", help="include students not yet confirmed graded")
+    export_parser.add_argument("--force", action="store_true", help="re-render documents already up to date")
+    export_parser.add_argument("--workers", type=int, help="worker processes (default: all cores)")
+    export_parser.set_defaults(func=export)
+
+    crops_parser = commands.add_parser("crops", help="pre-crop question regions for marking by question")
+    crops_parser.add_argument("quiz", type=int)
+    crops_parser.add_argument("--region", action="append", help="only this region (repeatable)")
+    crops_parser.add_argument("--workers", type=int, help="worker processes (default: all cores)")
+    crops_parser.set_defaults(func=crops)
+
+    omr_parser = commands.add_parser("omr", help="auto-mark multiple-choice bubble grids")
+    omr_parser.add_argument("quiz", type=int)
+    omr_parser.add_argument("--workers", type=int, help="worker processes (default: all cores)")
+    omr_parser.add_argument("--overwrite", action="store_true", help="replace marks already entered")
+    omr_parser.add_argument("--min-fill", type=float, default=0.25,
+                            help="darkness (0-1) for a bubble to count as filled")
+    omr_parser.add_argument("--min-margin", type=float, default=0.15,
+                            help="lead over the next darkest bubble below which an answer is flagged")
+    omr_parser.set_defaults(func=omr)
+
+    analysis_parser = commands.add_parser("analysis", help="item analysis of markscheme criteria")
+    analysis_parser.add_argument("quiz", type=int, nargs="*")
+    analysis_parser.add_argument("--all", action="store_true", help="every quiz with grading data")
+    analysis_parser.add_argument("--verbose", "-v", action="store_true", help="list every criterion")
+    analysis_parser.add_argument("--json", help="also write the full results to this file")
+    analysis_parser.set_defaults(func=analysis)
+
+    compare_parser = commands.add_parser("compare", help="compare first and second marking of a quiz")
+    compare_parser.add_argument("quiz", type=int)
+    compare_parser.add_argument("--tolerance", type=float, default=0,
+                                help="largest difference still counted as agreeing")
+    compare_parser.add_argument("--list", action="store_true", help="list every student with differing marks")
+    compare_parser.set_defaults(func=compare)
+
+    drift_parser = commands.add_parser("drift", help="grader drift report and re-mark sample")
+    drift_parser.add_argument("quiz", type=int)
+    drift_parser.add_argument("--window", type=int, default=15, help="recent marks compared with earlier ones")
+    drift_parser.add_argument("--threshold", type=float, default=4.0,
+                              help="standard errors of difference that count as drift")
+    drift_parser.add_argument("--sample", type=int,
+                              help="draw this many scripts for second marking into feedback/quiz-N moderation.txt")
+    drift_parser.add_argument("--seed", type=int, default=0)
+    drift_parser.set_defaults(func=drift)
+
+    covers_parser = commands.add_parser("covers", help="print barcoded cover sheets for a quiz")
+    covers_parser.add_argument("quiz", type=int)
+    covers_parser.add_argument("--output", help="PDF to write (default: feedback/quiz-N covers.pdf)")
+    covers_parser.add_argument("--master", help="roster spreadsheet (default: sheets/students.xlsx)")
+    covers_parser.add_argument("--workers", type=int, help="worker processes (default: all cores)")
+    covers_parser.set_defaults(func=covers)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
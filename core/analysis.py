@@ -0,0 +1,272 @@
+"""Item analysis of a quiz's criteria: how hard each one was and how well it
+separated stronger students from weaker ones.
+
+For every criterion:
+
+    facility        mean mark as a fraction of the maximum (1 = everyone full marks)
+    discrimination  facility in the top 27% of students by total minus the bottom 27%
+    point_biserial  correlation of the criterion with the rest of the total
+                    (item-rest, so the criterion isn't correlated with itself)
+    histogram       number of students on each whole mark, 0 to the maximum
+
+Per section, Cronbach's alpha says how consistently its criteria measure
+the same thing. Totals get a histogram in 10% bands. Facility counts every
+entered mark. The total-based figures only use students with every regular
+criterion marked, so half-marked scripts don't look like weak students.
+Bonus criteria are analysed but left out of totals and alpha.
+
+Everything is computed on a students x criteria array in a few NumPy passes.
+`ItemAnalysis` keeps that array and updates one row as a grader edits it.
+`quiz_report` caches a quiz's results in `feedback/quiz-N analysis.json`
+until its grading CSV or markscheme changes, so a report over a whole
+semester only reads the quizzes that have changed.
+"""
+import csv
+import json
+import os
+
+GROUP_FRACTION = 0.27  # Share of students in each of the upper and lower groups
+TOTAL_BANDS = 10
+
+
+def parse_mark(value):
+    try:
+        return float(value) if value not in (None, "") else float("nan")
+    except (TypeError, ValueError):
+        return float("nan")
+
+
+def score_matrix(rows, keys):
+    """(student ids, students x criteria float array, NaN where unmarked) from CSV rows"""
+    import numpy as np
+
+    ids = [row["student_id"] for row in rows]
+    scores = np.array([[parse_mark(row.get(key)) for key in keys] for row in rows], dtype=np.float64)
+    return ids, scores.reshape(len(rows), len(keys))
+
+
+def column_correlation(x, y):
+    """Pearson correlation of each column of `x` with the same column of `y`"""
+    import numpy as np
+
+    x = x - x.mean(axis=0)
+    y = y - y.mean(axis=0)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return (x * y).sum(axis=0) / np.sqrt((x * x).sum(axis=0) * (y * y).sum(axis=0))
+
+
+def histograms(scores, max_marks):
+    """Counts of students on each whole mark, per criterion"""
+    import numpy as np
+
+    counts = []
+    for column, max_mark in zip(scores.T, max_marks):
+        values = column[~np.isnan(column)]
+        top = max(0, int(np.ceil(max_mark)))
+        counts.append(np.bincount(np.clip(np.round(values), 0, top).astype(np.int64), minlength=top + 1))
+    return counts
+
+
+def analyse(scores, markscheme):
+    """Item analysis of a students x criteria array in markscheme criteria order"""
+    import numpy as np
+
+    criteria = markscheme.criteria
+    max_marks = np.array([c.max_mark for c in criteria], dtype=np.float64)
+    regular = np.array([not c.bonus and c.max_mark > 0 for c in criteria], dtype=bool)
+    marked = ~np.isnan(scores)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        facility = np.nansum(scores, axis=0) / marked.sum(axis=0) / max_marks
+
+    # Total-based statistics on scripts with every regular criterion marked
+    complete = scores[marked[:, regular].all(axis=1)] if regular.any() else scores[:0]
+    complete = np.nan_to_num(complete)
+    totals = complete[:, regular].sum(axis=1)
+    discrimination = np.full(len(criteria), np.nan)
+    point_biserial = np.full(len(criteria), np.nan)
+    if len(complete) >= 4:
+        order = np.argsort(totals, kind="stable")
+        group = max(1, int(round(GROUP_FRACTION * len(complete))))
+        lower, upper = complete[order[:group]], complete[order[-group:]]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            discrimination = (upper.mean(axis=0) - lower.mean(axis=0)) / max_marks
+        rest = totals[:, None] - np.where(regular, complete, 0)
+        point_biserial = column_correlation(complete, rest)
+
+    sections = {}
+    for name, section_criteria in markscheme.sections:
+        columns = np.array([n for n, c in enumerate(criteria) if c.section == name and regular[n]], dtype=np.int64)
+        alpha = np.nan
+        if len(columns) >= 2 and len(complete) >= 2:
+            items = complete[:, columns]
+            total_variance = items.sum(axis=1).var(ddof=1)
+            if total_variance > 0:
+                k = len(columns)
+                alpha = k / (k - 1) * (1 - items.var(axis=0, ddof=1).sum() / total_variance)
+        sections[name] = {"alpha": alpha, "criteria": len(columns)}
+
+    total_max = max_marks[regular].sum()
+    bands = np.zeros(TOTAL_BANDS, dtype=np.int64)
+    if len(totals) and total_max > 0:
+        bands = np.bincount(np.minimum((totals / total_max * TOTAL_BANDS).astype(np.int64), TOTAL_BANDS - 1),
+                            minlength=TOTAL_BANDS)
+
+    return clean({
+        "students": int(marked.any(axis=1).sum()),
+        "complete": len(complete),
+        "criteria": {
+            c.key: {
+                "section": c.section,
+                "bonus": c.bonus,
+                "marked": int(marked[:, n].sum()),
+                "facility": facility[n],
+                "discrimination": discrimination[n],
+                "point_biserial": point_biserial[n],
+                "histogram": counts.tolist(),
+            }
+            for n, (c, counts) in enumerate(zip(criteria, histograms(scores, max_marks)))
+        },
+        "sections": sections,
+        "totals": {
+            "max": total_max,
+            "mean": totals.mean() if len(totals) else np.nan,
+            "sd": totals.std(ddof=1) if len(totals) > 1 else np.nan,
+            "histogram": bands.tolist(),
+        },
+    })
+
+
+def clean(value):
+    """Plain JSON values: floats rounded, NaN as None"""
+    if isinstance(value, dict):
+        return {key: clean(v) for key, v in value.items()}
+    if isinstance(value, list):
+        return [clean(v) for v in value]
+    if isinstance(value, (bool, str)) or value is None:
+        return value
+    value = float(value)
+    if value != value:
+        return None
+    return int(value) if value.is_integer() and abs(value) < 2 ** 53 else round(value, 4)
+
+
+class ItemAnalysis:
+    """Live item analysis for the grading UI, one row updated per edit"""
+
+    def __init__(self, markscheme, ids, scores):
+        self.markscheme = markscheme
+        self.keys = markscheme.columns
+        self.ids = list(ids)
+        self.index = {student_id: n for n, student_id in enumerate(self.ids)}
+        self.scores = scores
+        self.cached = None
+
+    @classmethod
+    def from_store(cls, markscheme, grading):
+        import numpy as np
+        import pandas as pd
+
+        data = grading.data
+        keys = markscheme.columns
+        scores = np.full((len(data), len(keys)), np.nan)
+        for n, key in enumerate(keys):
+            if key in data.columns:
+                scores[:, n] = pd.to_numeric(data[key], errors="coerce").to_numpy(dtype=np.float64)
+        return cls(markscheme, data["student_id"].tolist(), scores)
+
+    def update(self, student_id, marks):
+        """Take a student's new marks (criterion key -> mark or None)"""
+        import numpy as np
+
+        row = self.index.get(student_id)
+        if row is None:
+            row = self.index[student_id] = len(self.ids)
+            self.ids.append(student_id)
+            self.scores = np.vstack([self.scores, np.full((1, len(self.keys)), np.nan)])
+        for n, key in enumerate(self.keys):
+            if key in marks:
+                self.scores[row, n] = parse_mark(marks[key])
+        self.cached = None
+
+    def results(self):
+        if self.cached is None:
+            self.cached = analyse(self.scores, self.markscheme)
+        return self.cached
+
+
+def report_path(paths):
+    return paths.feedback_file("analysis.json")
+
+
+def source_signature(paths):
+    signature = []
+    for path in (paths.grading_csv, paths.markscheme):
+        stat = os.stat(path)
+        signature.append([stat.st_mtime_ns, stat.st_size])
+    return signature
+
+
+def quiz_report(paths, rows=None):
+    """A quiz's analysis, from its cache file when the grading CSV hasn't changed"""
+    from core.markscheme import Markscheme
+
+    signature = source_signature(paths)
+    cache_path = report_path(paths)
+    try:
+        with open(cache_path, encoding="utf-8") as f:
+            cached = json.load(f)
+        if cached.get("signature") == signature:
+            return cached["results"]
+    except (OSError, ValueError):
+        pass
+
+    if rows is None:
+        with open(paths.grading_csv, newline="", encoding="utf-8") as f:
+            rows = list(csv.DictReader(f))
+    markscheme = Markscheme.load(paths.markscheme)
+    _, scores = score_matrix(rows, markscheme.columns)
+    results = analyse(scores, markscheme)
+
+    tmp_path = cache_path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump({"signature": signature, "results": results}, f)
+    os.replace(tmp_path, cache_path)
+    return results
+
+
+def find_quizzes(base_dir):
+    """Quiz numbers with a grading CSV and markscheme under `base_dir`"""
+    from core.paths import QuizPaths
+
+    numbers = []
+    for name in os.listdir(base_dir) if os.path.isdir(base_dir) else []:
+        if name.startswith("quiz ") and name[5:].isdigit():
+            paths = QuizPaths(name[5:], base_dir)
+            if os.path.exists(paths.grading_csv) and os.path.exists(paths.markscheme):
+                numbers.append(int(name[5:]))
+    return sorted(numbers)
+
+
+def concerns(results, low=0.2, high=0.9, min_discrimination=0.2):
+    """(criterion key, reason) for criteria worth a second look"""
+    found = []
+    for key, item in results["criteria"].items():
+        if item["bonus"] or not item["marked"]:
+            continue
+        if item["facility"] is not None and item["facility"] < low:
+            found.append((key, f"very hard (facility {item['facility']:.2f})"))
+        elif item["facility"] is not None and item["facility"] > high:
+            found.append((key, f"very easy (facility {item['facility']:.2f})"))
+        if item["discrimination"] is not None and item["discrimination"] < min_discrimination:
+            found.append((key, f"weak discrimination ({item['discrimination']:.2f})"))
+    return found
+
+
+def sparkline(counts):
+    """Histogram as a row of block characters, for the stats panel and terminal"""
+    blocks = " ▁▂▃▄▅▆▇█"
+    top = max(counts) if counts else 0
+    if not top:
+        return ""
+    return "".join(blocks[0 if not count else max(1, round(count / top * 8))] for count in counts)
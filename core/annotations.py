@@ -0,0 +1,139 @@
+"""Grader annotations on a student's pages, kept beside the scan as vectors.
+
+Ticks, crosses, circles, pen strokes and criterion marks drawn in `grade.py`
+are stored in `charts/annotations/quiz-N <id>.json`, or `quiz-N <id> second.json`
+for a second marker, who must not see or change the first marker's. The
+scan itself is never touched. Points are page fractions scaled to integers
+(0-10000), so a student's annotations are a few KB and fit a page at any
+zoom or resolution.
+The canvas draws them as vector items over the page, and `flatten` burns
+them into the page only when a feedback document is exported.
+
+Each item is `[kind, criterion key or "", [x, y, ...]]`:
+
+    pen     a freehand stroke through the points
+    tick    a tick stamp centred on (x, y)
+    cross   a cross stamp at (x, y)
+    circle  a circle through the two corners of its bounding box
+    mark    the criterion's mark ("2/3") written at (x, y)
+"""
+import json
+import os
+
+SCALE = 10000  # Stored coordinates are page fractions times this
+KINDS = ("pen", "tick", "cross", "circle", "mark")
+STAMP_SIZE = 0.04  # Tick and cross size as a fraction of the page width
+INK = "#D32F2F"
+
+
+def sidecar_path(paths, student_id):
+    """A student's annotations in the grading layer `paths` was made for"""
+    layer = " second" if paths.second_marker else ""
+    return os.path.join(paths.charts_dir, "annotations", f"quiz-{paths.quiz_number} {student_id}{layer}.json")
+
+
+def mark_label(mark, max_mark):
+    """Text of a mark item: "2/3", or "-/3" before the criterion is marked"""
+    return f"{'-' if mark is None else f'{mark:g}'}/{max_mark:g}"
+
+
+def stamp_lines(kind, x, y, size):
+    """Polylines for a stamp centred on (x, y), in the same units as the arguments"""
+    half = size / 2
+    if kind == "tick":
+        return [[x - half, y, x - half / 3, y + half * 0.8, x + half, y - half * 0.8]]
+    if kind == "cross":
+        return [[x - half, y - half, x + half, y + half], [x - half, y + half, x + half, y - half]]
+    return []
+
+
+class Annotations:
+    """One student's annotations, per page number (1-based)"""
+
+    def __init__(self, path):
+        self.path = path
+        self.pages = {}  # page -> [item]
+        self.history = []  # (page, item) in the order they were added, for undo
+
+    @classmethod
+    def load(cls, path):
+        annotations = cls(path)
+        try:
+            with open(path, encoding="utf-8") as f:
+                stored = json.load(f)
+        except (OSError, ValueError):
+            stored = {}
+        for page, items in stored.get("pages", {}).items():
+            annotations.pages[int(page)] = [item for item in items if item and item[0] in KINDS]
+        return annotations
+
+    def save(self):
+        pages = {str(page): items for page, items in sorted(self.pages.items()) if items}
+        if not pages and not os.path.exists(self.path):
+            return
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"pages": pages}, f, separators=(",", ":"))
+        os.replace(tmp_path, self.path)
+
+    def items(self, page):
+        return self.pages.get(page, [])
+
+    def add(self, page, kind, points, criterion=""):
+        """Add an item with points given as page fractions; returns the stored item"""
+        item = [kind, criterion or "", [max(0, min(SCALE, round(v * SCALE))) for v in points]]
+        self.pages.setdefault(page, []).append(item)
+        self.history.append((page, item))
+        return item
+
+    def remove(self, page, item):
+        items = self.pages.get(page, [])
+        if any(existing is item for existing in items):
+            items[:] = [existing for existing in items if existing is not item]
+            self.history = [(p, i) for p, i in self.history if i is not item]
+
+    def undo(self):
+        """Remove the last item added this session; returns its page, or None"""
+        if not self.history:
+            return None
+        page, item = self.history[-1]
+        self.remove(page, item)
+        return page
+
+    def __bool__(self):
+        return any(self.pages.values())
+
+
+def flatten(image, items, mark_texts=None):
+    """Copy of a page with annotations drawn on it at the page's own resolution"""
+    from PIL import ImageDraw, ImageFont
+
+    if not items:
+        return image
+    image = image.convert("RGB")
+    draw = ImageDraw.Draw(image)
+    width, height = image.size
+    line_width = max(2, width // 400)
+    font = ImageFont.load_default(size=max(12, width // 30))
+    mark_texts = mark_texts or {}
+
+    def scaled(values):
+        return [v * (width if n % 2 == 0 else height) / SCALE for n, v in enumerate(values)]
+
+    for kind, criterion, points in items:
+        points = scaled(points)
+        if kind == "pen" and len(points) >= 4:
+            draw.line(points, fill=INK, width=line_width, joint="curve")
+        elif kind in ("tick", "cross") and len(points) >= 2:
+            for line in stamp_lines(kind, points[0], points[1], STAMP_SIZE * width):
+                draw.line(line, fill=INK, width=line_width * 2, joint="curve")
+        elif kind == "circle" and len(points) >= 4:
+            box = (min(points[0], points[2]), min(points[1], points[3]),
+                   max(points[0], points[2]), max(points[1], points[3]))
+            draw.ellipse(box, outline=INK, width=line_width)
+        elif kind == "mark" and len(points) >= 2:
+            text = mark_texts.get(criterion, "")
+            if text:
+                draw.text((points[0], points[1]), text, fill=INK, font=font, anchor="mm")
+    return image
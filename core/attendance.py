@@ -0,0 +1,106 @@
+"""The attendance list: every student ID scanned for a quiz.
+
+The file stays one ID per line so it can be read by eye, but all access goes
+through `AttendanceStore`. Appends happen under a lock file, so scanning
+stations can share the file over a network folder. Renames rewrite the
+file atomically. Readers load the file on first use and after that read only
+the bytes appended since their last look.
+"""
+import os
+
+from core.filelock import FileLock
+
+
+class AttendanceStore:
+    def __init__(self, path):
+        self.path = path
+        self.ids = {}  # Insertion-ordered set of IDs
+        self.offset = None  # Bytes of the file already read, None until first use
+        self.file_id = None  # Changes when the file is replaced by a rename
+        self.lock = FileLock(path)
+
+    def ensure(self):
+        """Create an empty attendance file if there isn't one"""
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        if not os.path.exists(self.path):
+            open(self.path, "a", encoding="utf-8").close()
+        return self
+
+    def refresh(self):
+        """Read lines appended since the last refresh and return the new IDs"""
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            self.ids, self.offset, self.file_id = {}, 0, None
+            return []
+
+        file_id = (stat.st_dev, stat.st_ino)
+        known = {}  # After a rewrite, IDs already seen aren't reported again
+        if self.offset is None or file_id != self.file_id or stat.st_size < self.offset:
+            known = self.ids
+            self.ids, self.offset, self.file_id = {}, 0, file_id
+        if stat.st_size == self.offset:
+            return []
+
+        with open(self.path, "rb") as f:
+            f.seek(self.offset)
+            data = f.read()
+        # A line still being written by another station is picked up next time
+        end = data.rfind(b"\n") + 1
+        self.offset += end
+
+        added = []
+        for line in data[:end].decode("utf-8").splitlines():
+            student_id = line.strip()
+            if student_id and student_id not in self.ids:
+                self.ids[student_id] = None
+                if student_id not in known:
+                    added.append(student_id)
+        return added
+
+    def __contains__(self, student_id):
+        self.refresh()
+        return str(student_id) in self.ids
+
+    def __len__(self):
+        self.refresh()
+        return len(self.ids)
+
+    def __iter__(self):
+        self.refresh()
+        return iter(list(self.ids))
+
+    def add(self, student_id):
+        """Record a student as scanned; False if another scan already did"""
+        student_id = str(student_id).strip()
+        with self.lock:
+            self.refresh()
+            if student_id in self.ids:
+                return False
+            with open(self.path, "ab") as f:
+                # Finish off a line left half-written by a crashed station
+                prefix = b"\n" if f.tell() > self.offset else b""
+                f.write(prefix + f"{student_id}\n".encode("utf-8"))
+                f.flush()
+                os.fsync(f.fileno())
+            self.refresh()
+        return True
+
+    def rename(self, old_id, new_id):
+        """Replace an ID in place; False if the old ID was never recorded"""
+        old_id, new_id = str(old_id).strip(), str(new_id).strip()
+        with self.lock:
+            self.refresh()
+            if old_id not in self.ids:
+                return False
+            ids = [new_id if student_id == old_id else student_id for student_id in self.ids]
+            ids = list(dict.fromkeys(ids))
+            tmp_path = self.path + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                f.write("".join(f"{student_id}\n" for student_id in ids))
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.path)
+            self.offset = None
+            self.refresh()
+        return True
@@ -0,0 +1,105 @@
+import csv
+import glob
+import os
+import heapq
+import re
+from collections import Counter
+
+
+def normalise(text):
+    """Collapse whitespace and case so near-identical comments dedupe together"""
+    return re.sub(r"\s+", " ", str(text)).strip().lower()
+
+
+def trigrams(text):
+    # Pad so that the start of every word produces its own gram (" ab")
+    padded = f" {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class CommentBank:
+    """Deduplicated feedback comments with a trigram index for fast completion"""
+
+    def __init__(self):
+        self.comments = []       # comment id -> original text
+        self.normalised = []     # comment id -> normalised text
+        self.counts = []         # comment id -> how often it was used
+        self.keys = {}           # normalised text -> comment id
+        self.index = {}          # trigram -> set of comment ids
+
+    def __len__(self):
+        return len(self.comments)
+
+    def add(self, text, count=1):
+        """Add a comment (or bump its usage count) and index it incrementally"""
+        if not isinstance(text, str):
+            return None
+        text = text.strip()
+        key = normalise(text)
+        if not key:
+            return None
+
+        comment_id = self.keys.get(key)
+        if comment_id is not None:
+            self.counts[comment_id] += count
+            return comment_id
+
+        comment_id = len(self.comments)
+        self.comments.append(text)
+        self.normalised.append(key)
+        self.counts.append(count)
+        self.keys[key] = comment_id
+        for gram in trigrams(key):
+            self.index.setdefault(gram, set()).add(comment_id)
+        return comment_id
+
+    def add_feedback(self, feedback):
+        """Add every non-empty line of a feedback box as a separate comment"""
+        if not isinstance(feedback, str):
+            return
+        for line in feedback.splitlines():
+            self.add(line)
+
+    def search(self, query, limit=5):
+        """Return up to `limit` comments ranked by trigram overlap, then usage"""
+        key = normalise(query)
+        if len(key) < 2:
+            return []
+
+        query_grams = trigrams(key)
+        # Only the leading space pads the query, a trailing one would demand a word end
+        query_grams.discard(f"{key[-2:]} ")
+        hits = Counter()
+        for gram in query_grams:
+            postings = self.index.get(gram)
+            if postings:
+                hits.update(postings)
+
+        # Ignore weak matches that only share a gram or two with the query
+        needed = len(query_grams)
+        candidates = [(comment_id, hit) for comment_id, hit in hits.items() if hit * 2 >= needed]
+        ranked = heapq.nsmallest(
+            limit,
+            candidates,
+            key=lambda item: (
+                -item[1],
+                not self.normalised[item[0]].startswith(key),
+                -self.counts[item[0]],
+                len(self.normalised[item[0]])
+            )
+        )
+        return [self.comments[comment_id] for comment_id, _ in ranked]
+
+    @classmethod
+    def from_quizzes(cls, base_dir="their data"):
+        """Build a bank from the feedback column of every quiz's grading CSV"""
+        bank = cls()
+        pattern = os.path.join(base_dir, "quiz *", "feedback", "quiz-* grading.csv")
+        for grading_path in sorted(glob.glob(pattern)):
+            try:
+                with open(grading_path, newline="", encoding="utf-8") as f:
+                    for row in csv.DictReader(f):
+                        bank.add_feedback(row.get("feedback"))
+            except (OSError, csv.Error, UnicodeDecodeError):
+                continue
+        return bank
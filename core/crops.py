@@ -0,0 +1,126 @@
+"""Pre-cropped answer regions for marking one question across the cohort.
+
+Each saved region of a quiz (see `core.regions`) is cut out of every
+student's scan into `charts/crops/<region>/quiz-N <id>.png`. A crop is
+redone when its page or the regions file is newer than it. Cropping runs
+in a process pool so a whole cohort is ready in a few seconds.
+"""
+import os
+import re
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+
+
+def crop_dir(paths, region):
+    return os.path.join(paths.charts_dir, "crops", re.sub(r"[^\w.-]+", "_", region))
+
+
+def crop_path(paths, region, student_id):
+    return os.path.join(crop_dir(paths, region), f"quiz-{paths.quiz_number} {student_id}.png")
+
+
+def pixel_box(size, box):
+    width, height = size
+    left, top, right, bottom = box[:4]
+    return (
+        max(0, int(left * width)), max(0, int(top * height)),
+        min(width, int(round(right * width))), min(height, int(round(bottom * height))),
+    )
+
+
+def is_fresh(crop, source, regions_path):
+    try:
+        crop_mtime = os.path.getmtime(crop)
+    except OSError:
+        return False
+    newest = os.path.getmtime(source)
+    if os.path.exists(regions_path):
+        newest = max(newest, os.path.getmtime(regions_path))
+    return crop_mtime >= newest
+
+
+def crop_file(source, box, destination):
+    """Cut a region out of a page and save it (fast PNG, written atomically)
+
+    The pool and grade.py can crop the same page at once, so each write goes
+    through its own temporary file.
+    """
+    from PIL import Image
+
+    os.makedirs(os.path.dirname(destination), exist_ok=True)
+    with Image.open(source) as img:
+        region = img.crop(pixel_box(img.size, box))
+    fd, tmp_path = tempfile.mkstemp(suffix=".tmp", dir=os.path.dirname(destination))
+    try:
+        with os.fdopen(fd, "wb") as f:
+            region.save(f, format="PNG", compress_level=1)
+        os.replace(tmp_path, destination)
+    except OSError:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        # Fine if the other writer has just put an up-to-date crop in place
+        try:
+            fresh = os.path.getmtime(destination) >= os.path.getmtime(source)
+        except OSError:
+            fresh = False
+        if not fresh:
+            raise
+    return destination
+
+
+def crop_jobs(paths, page_index, regions, student_ids):
+    """(source page, box, crop path) for every crop that is missing or stale"""
+    jobs = []
+    for name, box in regions.items():
+        for student_id in student_ids:
+            pages = page_index.pages(student_id)
+            page = box[4] if len(box) == 5 else 1
+            if len(pages) < page:
+                continue
+            destination = crop_path(paths, name, student_id)
+            if not is_fresh(destination, pages[page - 1], paths.regions):
+                jobs.append((pages[page - 1], box, destination))
+    return jobs
+
+
+def crop_many(jobs, workers=None):
+    """Run crop jobs in a process pool, yielding (crop path, error or None) as each finishes"""
+    if not jobs:
+        return
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [(destination, pool.submit(crop_file, source, box, destination))
+                   for source, box, destination in jobs]
+        for destination, future in futures:
+            error = future.exception()
+            yield destination, error
+
+
+class LiveCropper:
+    """Background cropping for grade.py's question mode"""
+
+    def __init__(self, workers=2):
+        self.workers = workers
+        self.pool = None
+        self.futures = {}  # crop path -> future, until it's done
+
+    def submit(self, jobs):
+        if self.pool is None:
+            self.pool = ProcessPoolExecutor(max_workers=self.workers)
+        futures = {destination: self.pool.submit(crop_file, source, box, destination)
+                   for source, box, destination in jobs}
+        self.futures = {d: f for d, f in self.futures.items() if not f.done()}
+        self.futures.update(futures)
+        return futures
+
+    def claim(self, destination):
+        """The pool's future for a crop it has started, or None once a queued one is taken back"""
+        future = self.futures.pop(destination, None)
+        if future is None or future.cancel():
+            return None
+        return future
+
+    def shutdown(self):
+        if self.pool is not None:
+            self.pool.shutdown(wait=False, cancel_futures=True)
+            self.pool = None
+        self.futures = {}
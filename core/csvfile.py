@@ -0,0 +1,146 @@
+"""Safe shared writes for the per-quiz CSV files.
+
+Several tools (and several graders) write `students.csv` and `grading.csv`
+at the same time. `CsvFile` makes that safe:
+
+* writes go to a temp file that is fsynced and renamed over the original,
+  so a crash never leaves a half-written CSV;
+* writers hold an advisory lock file (`core.filelock`) while writing;
+* each read remembers the file's version stamp and a copy of what was read.
+  If the file has changed on disk by the time of the write, only the cells
+  this writer changed are applied on top of the current file. Other writers'
+  cells, rows and columns are kept.
+"""
+import os
+
+from core.filelock import FileLock
+
+
+def version(path):
+    """Stamp that changes whenever the file is rewritten, or None if there is no file"""
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return stat.st_mtime_ns, stat.st_size, stat.st_ino
+
+
+def atomic_write(path, frame):
+    """Write a DataFrame as CSV via temp file + fsync + rename"""
+    directory = os.path.dirname(path) or "."
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", newline="", encoding="utf-8") as f:
+        frame.to_csv(f, index=False)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+    try:
+        # Make the rename itself durable (not possible on Windows)
+        fd = os.open(directory, os.O_RDONLY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+    except OSError:
+        pass
+
+
+def same(a, b):
+    """Element-wise equality that treats two missing values as equal"""
+    return (a == b) | (a.isna() & b.isna())
+
+
+def merge(disk, base, ours, key):
+    """Apply the cells changed between `base` and `ours` on top of `disk`
+
+    Rows keep `ours` order. Rows and columns only on disk (added by another
+    writer) are kept. Rows we removed stay removed. Where both sides changed
+    a cell, ours wins.
+    """
+    import pandas as pd
+
+    keys = {name: frame[key].astype(str) for name, frame in (("disk", disk), ("base", base), ("ours", ours))}
+    if any(index.duplicated().any() for index in keys.values()):
+        return ours  # Can't line rows up; keep the old last-writer-wins behaviour
+
+    disk = disk.set_axis(keys["disk"], axis=0)
+    base = base.set_axis(keys["base"], axis=0)
+    result = ours.set_axis(keys["ours"], axis=0)
+
+    # Cells we didn't touch take the value now on disk
+    common = result.index.intersection(base.index).intersection(disk.index)
+    for column in result.columns:
+        if column not in disk.columns:
+            continue
+        if column in base.columns:
+            untouched = common[same(result.loc[common, column], base.loc[common, column]).to_numpy()]
+        else:
+            untouched = common[:0]
+        changed = untouched[~same(result.loc[untouched, column], disk.loc[untouched, column]).to_numpy()]
+        if len(changed):
+            if result[column].dtype != disk[column].dtype:
+                result[column] = result[column].astype(object)
+                result.loc[changed, column] = disk.loc[changed, column]
+                result[column] = result[column].infer_objects()
+            else:
+                result.loc[changed, column] = disk.loc[changed, column]
+
+    # Columns another writer added
+    for column in disk.columns:
+        if column not in result.columns:
+            result[column] = disk[column].reindex(result.index)
+
+    # Rows another writer added (not ones we deleted)
+    added = disk.index.difference(result.index).difference(base.index)
+    if len(added):
+        result = pd.concat([result, disk.loc[disk.index.isin(added)]])
+
+    return result.reset_index(drop=True)
+
+
+class CsvFile:
+    def __init__(self, path, key="id", **read_options):
+        self.path = path
+        self.key = key
+        self.read_options = read_options
+        self.base = None  # Frame as last read or written, for working out our changes
+        self.version = None
+        self.merged = False  # Whether the last write had to merge in someone else's changes
+        self.lock = FileLock(path)
+
+    def _read(self):
+        import pandas as pd
+
+        # Files are only ever replaced whole, so retry if one lands mid-read
+        while True:
+            before = version(self.path)
+            frame = pd.read_csv(self.path, **self.read_options)
+            if version(self.path) == before:
+                return frame, before
+
+    def read(self):
+        frame, self.version = self._read()
+        self.base = frame.copy()
+        return frame
+
+    def changed(self):
+        """True if another writer has replaced the file since we last read or wrote it"""
+        return version(self.path) != self.version
+
+    def write(self, frame):
+        """Save `frame`, merged with any changes made on disk since it was read
+
+        Returns the frame actually written, which callers should carry on from.
+        """
+        with self.lock:
+            self.merged = False
+            if self.base is not None and self.key in frame.columns and self.changed() \
+                    and os.path.exists(self.path):
+                disk, _ = self._read()
+                if self.key in disk.columns:
+                    frame = merge(disk, self.base, frame, self.key)
+                    self.merged = True
+            atomic_write(self.path, frame)
+            self.version = version(self.path)
+        self.base = frame.copy()
+        return frame
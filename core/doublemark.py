@@ -0,0 +1,88 @@
+"""Double marking: a second marker's grading layer and how it compares.
+
+For moderation a second grader marks (a sample of) a quiz independently with
+`QUIZ_SECOND_MARKER=1 python grade.py`. Their marks go to
+`feedback/quiz-N grading second.csv`, in the same layout as `grading.csv`,
+and the roster is not touched. `compare` lines the two layers up as
+students x criteria arrays and, in one pass over every student marked in
+both, works out:
+
+    per criterion  how often the two marks agree (within `tolerance`), the
+                   mean absolute difference and the mean first-minus-second
+                   difference (bias)
+    per grader     how far each grader's marks sit above (+) or below (-) the
+                   other layer's, as a fraction of the criterion maximum,
+                   using the `grader` recorded on each row
+    per student    which students have at least one disagreeing criterion
+
+`grade.py`'s Reconcile view lists just those students with the second marks
+beside the first, and `python -m core compare N` prints the same report.
+"""
+import csv
+import os
+
+from core.analysis import score_matrix
+
+
+def read_layer(path):
+    """A grading layer's rows keyed by student ID (as text), or {} if there is none"""
+    if not os.path.exists(path):
+        return {}
+    with open(path, newline="", encoding="utf-8") as f:
+        return {row["student_id"]: row for row in csv.DictReader(f)}
+
+
+def compare(first, second, markscheme, tolerance=0):
+    """Compare two grading layers (student id -> CSV row) criterion by criterion"""
+    import numpy as np
+
+    keys = markscheme.columns
+    max_marks = np.array([c.max_mark for c in markscheme.criteria], dtype=np.float64)
+    max_marks[max_marks <= 0] = 1
+    common = [student_id for student_id in first if student_id in second]
+    _, a = score_matrix([first[student_id] for student_id in common], keys)
+    _, b = score_matrix([second[student_id] for student_id in common], keys)
+
+    # Only cells both markers filled in are compared
+    both = ~np.isnan(a) & ~np.isnan(b)
+    rows = both.any(axis=1)
+    common = [student_id for student_id, keep in zip(common, rows) if keep]
+    a, b, both = a[rows], b[rows], both[rows]
+    difference = np.where(both, a - b, 0.0)
+    disagree = both & (np.abs(difference) > tolerance)
+    pairs = both.sum(axis=0)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        agreement = 1 - disagree.sum(axis=0) / pairs
+        mad = np.abs(difference).sum(axis=0) / pairs
+        bias = difference.sum(axis=0) / pairs
+
+    criteria = {
+        key: {"pairs": int(pairs[n]), "agreement": agreement[n], "mad": mad[n], "bias": bias[n]}
+        for n, key in enumerate(keys)
+    }
+
+    # Each grader's lean against the other layer, weighting every criterion by its maximum
+    relative = np.where(both, difference / max_marks, 0.0)
+    row_sum, row_count = relative.sum(axis=1), both.sum(axis=1)
+    first_graders = [first[student_id].get("grader") or "first marker" for student_id in common]
+    second_graders = [second[student_id].get("grader") or "second marker" for student_id in common]
+    names, codes = np.unique(np.array(first_graders + second_graders, dtype=object).astype(str),
+                             return_inverse=True)
+    sums = np.bincount(codes, weights=np.concatenate([row_sum, -row_sum]), minlength=len(names))
+    counts = np.bincount(codes, weights=np.concatenate([row_count, row_count]), minlength=len(names))
+    graders = {
+        str(name): {"marks": int(counts[n]), "bias": sums[n] / counts[n] if counts[n] else None}
+        for n, name in enumerate(names)
+    }
+
+    disagreements = {
+        student_id: {keys[n]: (a[row, n], b[row, n]) for n in np.flatnonzero(disagree[row])}
+        for row, student_id in enumerate(common) if disagree[row].any()
+    }
+    return {
+        "students": len(common),
+        "criteria": criteria,
+        "graders": graders,
+        "disagreements": disagreements,
+    }
@@ -0,0 +1,265 @@
+"""Grader drift over a marking session, and stratified samples for re-marking.
+
+Every save in `grade.py` appends a line to `feedback/quiz-N edits.jsonl`
+with the time, the grader (`QUIZ_GRADER` or the login name), the grading
+layer and the marks that changed. Appends are made under a lock, so several
+graders can share the log, and readers only read what was appended since
+their last look.
+
+`DriftMonitor` turns the log into one series per grader and criterion: each
+student's mark as a fraction of the maximum, in the order the grader marked
+them (a corrected mark replaces the original in place). A grader has
+drifted on a criterion when the mean of their last `window` marks sits
+`threshold` standard errors or more from the mean of all their earlier ones.
+Only the series touched by new log lines are recomputed, so `grade.py` can
+check after every save. `history` gives the same statistic at every point
+of a series, for the batch report.
+
+`stratified_sample` picks scripts to re-mark, spread across score bands,
+graders and the early, middle and late part of each grader's session. It
+allocates in proportion to the size of each group and takes at least one
+from every group when the sample is big enough.
+"""
+import json
+import math
+import os
+import random
+import time
+
+from core.filelock import FileLock
+from core.telemetry import GRADER
+
+WINDOW = 15  # Recent marks compared against everything the grader marked before them
+THRESHOLD = 4.0  # Standard errors of difference that count as drift; lower flags chance runs
+BANDS = (0.4, 0.6, 0.8)  # Score band edges, as a fraction of the total
+BAND_NAMES = ("<40%", "40-60%", "60-80%", "80%+")
+PHASES = ("early", "middle", "late")
+
+
+class EditLog:
+    """Append-only JSON lines log of grading saves"""
+
+    def __init__(self, path):
+        self.path = path
+        self.offset = 0  # Bytes already read
+        self.file_id = None
+        self.lock = FileLock(path)
+
+    def append(self, student_id, marks, layer="first", grader=GRADER):
+        """Record the marks (criterion key -> mark or None) one save changed"""
+        entry = {"ts": round(time.time(), 3), "grader": grader, "layer": layer,
+                 "student": str(student_id), "marks": marks}
+        line = json.dumps(entry, default=float) + "\n"
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        with self.lock:
+            with open(self.path, "ab") as f:
+                f.write(line.encode("utf-8"))
+                f.flush()
+                os.fsync(f.fileno())
+
+    def read_new(self):
+        """Entries appended since the last call (all of them on the first)"""
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return []
+        if (stat.st_dev, stat.st_ino) != self.file_id or stat.st_size < self.offset:
+            self.file_id, self.offset = (stat.st_dev, stat.st_ino), 0
+        if stat.st_size == self.offset:
+            return []
+        with open(self.path, "rb") as f:
+            f.seek(self.offset)
+            data = f.read()
+        # A line still being written is picked up next time
+        end = data.rfind(b"\n") + 1
+        self.offset += end
+        entries = []
+        for line in data[:end].decode("utf-8").splitlines():
+            try:
+                entries.append(json.loads(line))
+            except ValueError:
+                continue
+        return entries
+
+
+def drift_statistic(values, window=WINDOW):
+    """(z, shift) of the last `window` values against all earlier ones, or None if too few"""
+    import numpy as np
+
+    values = values[~np.isnan(values)]
+    if len(values) < 2 * window:
+        return None
+    recent, earlier = values[-window:], values[:-window]
+    shift = recent.mean() - earlier.mean()
+    sd = values.std(ddof=1)
+    if sd == 0:
+        return 0.0, float(shift)
+    return float(shift / (sd * math.sqrt(1 / window + 1 / len(earlier)))), float(shift)
+
+
+class DriftMonitor:
+    def __init__(self, markscheme, window=WINDOW, threshold=THRESHOLD):
+        self.max_marks = {c.key: c.max_mark for c in markscheme.criteria if c.max_mark > 0}
+        self.window = window
+        self.threshold = threshold
+        self.series = {}  # (grader, key) -> (times, values as fractions of the maximum)
+        self.slots = {}  # (layer, student, key) -> ((grader, key), index into the series)
+        self.scripts = {}  # (layer, student) -> (first edit time, grader)
+        self.current = {}  # (grader, key) -> (z, shift) after the latest marks
+
+    def feed(self, entries):
+        """Take new log entries; returns {(grader, key): (z, shift)} for series now drifting"""
+        import numpy as np
+
+        touched = set()
+        for entry in entries:
+            layer, student = entry.get("layer", "first"), entry.get("student")
+            grader, ts = entry.get("grader") or "?", entry.get("ts", 0)
+            self.scripts.setdefault((layer, student), (ts, grader))
+            for key, mark in (entry.get("marks") or {}).items():
+                max_mark = self.max_marks.get(key)
+                if max_mark is None:
+                    continue
+                value = float("nan") if mark is None else float(mark) / max_mark
+                slot = self.slots.get((layer, student, key))
+                if slot is None:
+                    if mark is None:
+                        continue
+                    group = (grader, key)
+                    times, values = self.series.setdefault(group, ([], []))
+                    times.append(ts)
+                    values.append(value)
+                    self.slots[(layer, student, key)] = (group, len(values) - 1)
+                else:
+                    group, index = slot
+                    self.series[group][1][index] = value
+                touched.add(group)
+
+        drifting = {}
+        for group in touched:
+            result = drift_statistic(np.array(self.series[group][1]), self.window)
+            if result is None:
+                self.current.pop(group, None)
+                continue
+            self.current[group] = result
+            if abs(result[0]) >= self.threshold:
+                drifting[group] = result
+        return drifting
+
+    def drifting(self, grader=None):
+        """Series currently past the threshold, optionally for one grader"""
+        return {group: result for group, result in self.current.items()
+                if abs(result[0]) >= self.threshold and (grader is None or group[0] == grader)}
+
+    def history(self, group):
+        """(times, z) at every point of a series with enough marks before it
+
+        Uses running sums, so a whole session's series is one vectorised pass.
+        """
+        import numpy as np
+
+        times, values = self.series[group]
+        times, values = np.array(times), np.array(values)
+        keep = ~np.isnan(values)
+        times, values = times[keep], values[keep]
+        w = self.window
+        if len(values) < 2 * w:
+            return times[:0], values[:0]
+        sums = np.concatenate([[0.0], np.cumsum(values)])
+        squares = np.concatenate([[0.0], np.cumsum(values ** 2)])
+        ends = np.arange(2 * w, len(values) + 1)  # Points 0..end-1 are known at each step
+        recent = (sums[ends] - sums[ends - w]) / w
+        earlier = sums[ends - w] / (ends - w)
+        variance = (squares[ends] - sums[ends] ** 2 / ends) / (ends - 1)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            z = (recent - earlier) / np.sqrt(np.maximum(variance, 0) * (1 / w + 1 / (ends - w)))
+        return times[ends - 1], np.nan_to_num(z)
+
+
+def stratified_sample(rows, markscheme, monitor, size, seed=0, layer="first"):
+    """[(student id, (band, grader, phase))] of up to `size` graded scripts to re-mark
+
+    `rows` are grading CSV rows; grader and marking time come from the edit
+    log (via `monitor`), falling back on the row's `grader` column.
+    """
+    import numpy as np
+
+    from core.analysis import score_matrix
+
+    graded = [row for row in rows if str(row.get("graded")).strip().lower() in ("true", "1", "1.0")]
+    if not graded or size <= 0:
+        return []
+    ids, scores = score_matrix(graded, markscheme.columns)
+    regular = np.array([not c.bonus and c.max_mark > 0 for c in markscheme.criteria], dtype=bool)
+    max_marks = np.array([c.max_mark for c in markscheme.criteria], dtype=np.float64)
+    marked = ~np.isnan(scores) & regular
+    with np.errstate(divide="ignore", invalid="ignore"):
+        fractions = np.nan_to_num(np.where(marked, scores, 0).sum(axis=1) / (marked * max_marks).sum(axis=1))
+    bands = np.digitize(fractions, BANDS)
+
+    # Session phase: thirds of each grader's scripts in the order they were first marked
+    graders, times = [], []
+    for student_id, row in zip(ids, graded):
+        ts, grader = monitor.scripts.get((layer, student_id), (None, row.get("grader") or "?"))
+        graders.append(grader)
+        times.append(ts)
+    phases = ["unknown"] * len(ids)
+    for grader in set(graders):
+        members = [n for n, g in enumerate(graders) if g == grader and times[n] is not None]
+        members.sort(key=lambda n: times[n])
+        for rank, n in enumerate(members):
+            phases[n] = PHASES[min(len(PHASES) - 1, rank * len(PHASES) // len(members))]
+
+    strata = {}
+    for n, student_id in enumerate(ids):
+        strata.setdefault((BAND_NAMES[bands[n]], graders[n], phases[n]), []).append(student_id)
+
+    # Proportional allocation (largest remainder), at least one per stratum when there's room
+    size = min(size, len(ids))
+    names = sorted(strata)
+    if size >= len(names):
+        quotas = {name: 1 for name in names}
+        spare = size - len(names)
+        shares = {name: spare * (len(strata[name]) - 1) / max(1, len(ids) - len(names)) for name in names}
+    else:
+        quotas = {name: 0 for name in names}
+        spare = size
+        shares = {name: size * len(strata[name]) / len(ids) for name in names}
+    for name in names:
+        quotas[name] += min(int(shares[name]), len(strata[name]) - quotas[name])
+    rng = random.Random(seed)
+    leftover = size - sum(quotas.values())
+    by_remainder = sorted(names, key=lambda name: (shares[name] - int(shares[name]), rng.random()), reverse=True)
+    while leftover > 0:
+        progressed = False
+        for name in by_remainder:
+            if leftover and quotas[name] < len(strata[name]):
+                quotas[name] += 1
+                leftover -= 1
+                progressed = True
+        if not progressed:
+            break
+
+    sample = []
+    for name in names:
+        for student_id in rng.sample(strata[name], quotas[name]):
+            sample.append((student_id, name))
+    return sample
+
+
+def read_sample(path):
+    """Student IDs listed in a moderation sample file, or None if there isn't one"""
+    try:
+        with open(path, encoding="utf-8") as f:
+            return [line.split()[0] for line in f if line.strip() and not line.startswith("#")]
+    except OSError:
+        return None
+
+
+def write_sample(path, sample):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write("# student id, score band, grader, session phase\n")
+        for student_id, (band, grader, phase) in sample:
+            f.write(f"{student_id}\t{band}\t{grader}\t{phase}\n")
+    os.replace(tmp_path, path)
@@ -0,0 +1,213 @@
+"""Per-student feedback documents: `python -m core export N`.
+
+Each student gets `feedback/out/quiz-N <id>.pdf`. A summary page lists the
+marks for every criterion, the overall grade and the written feedback. The
+student's chart pages follow. Documents are rendered in a process pool
+with a bounded number of students in flight, and each worker writes its own
+PDF, so memory stays flat however big the cohort. `feedback/out/export.json`
+keeps a signature of what went into each document (grading row, name,
+markscheme, page files, annotations). A re-export only renders students
+whose signature has changed. Annotations drawn in `grade.py` are burnt into
+the chart pages here, in the workers; the scans themselves stay clean.
+"""
+import hashlib
+import json
+import os
+import textwrap
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+from core.annotations import Annotations, flatten, mark_label, sidecar_path
+from core.markscheme import grade_text
+from core.pagestore import open_page
+
+LAYOUT_VERSION = 1  # Bump when the document layout changes, to re-render everything
+PAGE_SIZE = (1240, 1754)  # A4 at 150 dpi
+DPI = 150
+MARGIN = 90
+
+
+def document_path(paths, student_id):
+    return os.path.join(paths.export_dir, f"quiz-{paths.quiz_number} {student_id}.pdf")
+
+
+def signature(row, name, markscheme_text, pages, annotations=None):
+    """Hash of everything that goes into a student's document"""
+    digest = hashlib.sha1()
+    digest.update(json.dumps([LAYOUT_VERSION, row, name, markscheme_text], sort_keys=True, default=str).encode())
+    for page in pages + ([annotations] if annotations and os.path.exists(annotations) else []):
+        stat = os.stat(page)
+        digest.update(f"{os.path.basename(page)}:{stat.st_mtime_ns}:{stat.st_size}".encode())
+    return digest.hexdigest()
+
+
+def summary_page(job):
+    """The first page: marks by criterion, grade and feedback"""
+    from PIL import Image, ImageDraw, ImageFont
+
+    page = Image.new("L", PAGE_SIZE, 255)
+    draw = ImageDraw.Draw(page)
+    title = ImageFont.load_default(size=48)
+    heading = ImageFont.load_default(size=32)
+    body = ImageFont.load_default(size=26)
+    width = PAGE_SIZE[0] - 2 * MARGIN
+
+    y = MARGIN
+    draw.text((MARGIN, y), f"Quiz {job['quiz']} feedback", fill=0, font=title)
+    y += 75
+    draw.text((MARGIN, y), f"{job['name']} ({job['student_id']})", fill=0, font=heading)
+    y += 70
+
+    section = None
+    for criterion_section, name, mark, max_mark, bonus in job["criteria"]:
+        if criterion_section != section:
+            section = criterion_section
+            y += 10
+            draw.text((MARGIN, y), section, fill=0, font=heading)
+            y += 45
+        mark_text = "-" if mark is None else f"{mark:g}"
+        draw.text((MARGIN + 30, y), name + (" (bonus)" if bonus else ""), fill=0, font=body)
+        draw.text((MARGIN + width, y), f"{mark_text} / {max_mark:g}", fill=0, font=body, anchor="ra")
+        y += 36
+        if y > PAGE_SIZE[1] - 400:
+            draw.text((MARGIN + 30, y), "...", fill=0, font=body)
+            y += 36
+            break
+
+    y += 20
+    draw.line((MARGIN, y, MARGIN + width, y), fill=0, width=2)
+    y += 20
+    draw.text((MARGIN, y), f"Overall: {job['grade'] or '-'}", fill=0, font=heading)
+    y += 65
+
+    if job["feedback"]:
+        draw.text((MARGIN, y), "Feedback", fill=0, font=heading)
+        y += 45
+        for paragraph in str(job["feedback"]).splitlines():
+            for line in textwrap.wrap(paragraph, width=80) or [""]:
+                if y > PAGE_SIZE[1] - MARGIN:
+                    break
+                draw.text((MARGIN, y), line, fill=0, font=body)
+                y += 34
+    return page
+
+
+def chart_page(path, items=None, mark_texts=None):
+    """A chart fitted to the document's page size, with its annotations drawn on"""
+    from PIL import Image
+
+    image = open_page(path)
+    if image.mode not in ("L", "RGB"):
+        image = image.convert("L")
+    factor = image.width // PAGE_SIZE[0]
+    if factor > 1:
+        image = image.reduce(factor)
+    if image.width > PAGE_SIZE[0] or image.height > PAGE_SIZE[1]:
+        image.thumbnail(PAGE_SIZE, Image.Resampling.LANCZOS)
+    return flatten(image, items, mark_texts)
+
+
+def render_document(job):
+    """Write one student's PDF (atomically) and return its path"""
+    annotations = Annotations.load(job["annotations"])
+    pages = [summary_page(job)] + [
+        chart_page(path, annotations.items(number), job["mark_texts"])
+        for number, path in enumerate(job["pages"], start=1)
+    ]
+    tmp_path = job["output"] + ".tmp"
+    pages[0].save(tmp_path, format="PDF", save_all=True, append_images=pages[1:], resolution=DPI)
+    os.replace(tmp_path, job["output"])
+    return job["output"]
+
+
+def build_jobs(paths, markscheme, grading_rows, names, page_index, student_ids):
+    """(student id, signature, job) for each student to export"""
+    with open(paths.markscheme, encoding="utf-8") as f:
+        markscheme_text = f.read()
+    jobs = []
+    for student_id in student_ids:
+        row = grading_rows.get(student_id)
+        if row is None:
+            continue
+        pages = page_index.pages(student_id)
+        name = names.get(student_id, "")
+        criteria = []
+        for criterion in markscheme.criteria:
+            mark = row.get(criterion.key)
+            try:
+                mark = float(mark) if mark not in (None, "") else None
+            except ValueError:
+                mark = None
+            criteria.append((criterion.section, criterion.name, mark, criterion.max_mark, criterion.bonus))
+        marks = {criterion.key: mark for criterion, (_, _, mark, _, _) in zip(markscheme.criteria, criteria)}
+        annotations = sidecar_path(paths, student_id)
+        job = {
+            "quiz": paths.quiz_number,
+            "student_id": student_id,
+            "name": name,
+            "criteria": criteria,
+            "grade": row.get("overall_grade") or grade_text(*markscheme.totals(marks)),
+            "feedback": row.get("feedback") or "",
+            "pages": pages,
+            "annotations": annotations,
+            "mark_texts": {c.key: mark_label(marks[c.key], c.max_mark) for c in markscheme.criteria},
+            "output": document_path(paths, student_id),
+        }
+        jobs.append((student_id, signature(row, name, markscheme_text, pages, annotations), job))
+    return jobs
+
+
+class Exporter:
+    def __init__(self, paths):
+        self.paths = paths
+        self.state_path = os.path.join(paths.export_dir, "export.json")
+        self.state = self.load_state()  # student id -> signature of the exported document
+
+    def load_state(self):
+        try:
+            with open(self.state_path, encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def save_state(self):
+        tmp_path = self.state_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.state, f, indent=1)
+        os.replace(tmp_path, self.state_path)
+
+    def stale(self, jobs, force=False):
+        """Jobs whose document is missing or out of date"""
+        return [(student_id, sig, job) for student_id, sig, job in jobs
+                if force or self.state.get(student_id) != sig or not os.path.exists(job["output"])]
+
+    def run(self, jobs, workers=None, in_flight=None):
+        """Render jobs, yielding (student id, error or None) as each finishes
+
+        At most `in_flight` students (default twice the workers) are queued
+        at once, so a large cohort never piles rendered pages up in memory.
+        """
+        os.makedirs(self.paths.export_dir, exist_ok=True)
+        workers = workers or os.cpu_count() or 1
+        limit = in_flight or 2 * workers
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            pending = {}
+            queue = iter(jobs)
+            finished = 0
+            while True:
+                for student_id, sig, job in queue:
+                    pending[pool.submit(render_document, job)] = (student_id, sig)
+                    if len(pending) >= limit:
+                        break
+                if not pending:
+                    break
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    student_id, sig = pending.pop(future)
+                    error = future.exception()
+                    if error is None:
+                        self.state[student_id] = sig
+                    finished += 1
+                    if finished % 50 == 0:
+                        self.save_state()  # An interrupted export keeps what it finished
+                    yield student_id, error
+        self.save_state()
@@ -0,0 +1,56 @@
+"""A lock file that several processes (or scanning stations sharing a folder) can respect."""
+import os
+import time
+
+
+class LockTimeout(Exception):
+    pass
+
+
+class FileLock:
+    """Exclusive lock held by creating `<path>.lock`
+
+    Creation with O_EXCL is atomic on local disks and SMB shares. A lock left
+    behind by a crashed process is broken once it is older than `stale`
+    seconds.
+    """
+
+    def __init__(self, path, timeout=10.0, stale=30.0, poll=0.05):
+        self.lock_path = path + ".lock"
+        self.timeout = timeout
+        self.stale = stale
+        self.poll = poll
+        self.fd = None
+
+    def acquire(self):
+        deadline = time.monotonic() + self.timeout
+        while True:
+            try:
+                self.fd = os.open(self.lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+                os.write(self.fd, f"{os.getpid()}\n".encode())
+                return self
+            except FileExistsError:
+                try:
+                    if time.time() - os.path.getmtime(self.lock_path) > self.stale:
+                        os.remove(self.lock_path)
+                        continue
+                except OSError:
+                    continue  # Released between the two calls
+            if time.monotonic() > deadline:
+                raise LockTimeout(f"Timed out waiting for {self.lock_path}")
+            time.sleep(self.poll)
+
+    def release(self):
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+            try:
+                os.remove(self.lock_path)
+            except OSError:
+                pass
+
+    def __enter__(self):
+        return self.acquire()
+
+    def __exit__(self, *exc):
+        self.release()
@@ -0,0 +1,122 @@
+"""Per-quiz grading table (`quiz-N grading.csv`) with indexed student lookup."""
+import os
+
+from core.csvfile import CsvFile
+
+META_COLUMNS = ['student_id', 'feedback', 'graded', 'overall_grade', 'review', 'grader']
+
+
+class GradingStore:
+    def __init__(self, path, data, csv_file=None):
+        self.path = path
+        self.data = data
+        self.file = csv_file or CsvFile(path, key='student_id')
+        self.reindex()
+
+    @classmethod
+    def open(cls, path, markscheme, student_ids):
+        """Load the grading CSV, or create one with a row per student"""
+        import pandas as pd
+
+        if os.path.exists(path):
+            # Text columns may be entirely empty, keep them as text rather than float
+            csv_file = CsvFile(path, key='student_id', dtype={
+                'feedback': object, 'overall_grade': object, 'review': object, 'grader': object
+            })
+            store = cls(path, csv_file.read(), csv_file)
+            # Students validated since the file was created get a row too
+            if store.add_students(student_ids):
+                store.save()
+            return store
+
+        columns = ['student_id'] + markscheme.columns + ['feedback', 'graded', 'overall_grade']
+        data = pd.DataFrame(columns=columns)
+        new_rows = [{'student_id': student_id, 'graded': False} for student_id in student_ids]
+        if new_rows:
+            data = pd.concat([data, pd.DataFrame(new_rows)], ignore_index=True)
+        data = data.astype({'feedback': object, 'overall_grade': object})
+
+        store = cls(path, data)
+        store.save()
+        return store
+
+    def reindex(self):
+        self.rows = {student_id: idx for idx, student_id in zip(self.data.index, self.data['student_id'])}
+
+    def add_students(self, student_ids):
+        """Add an ungraded row for each student not yet in the table, returning the IDs added"""
+        import pandas as pd
+
+        new_ids = [student_id for student_id in student_ids if student_id not in self.rows]
+        if new_ids:
+            new_rows = pd.DataFrame([{'student_id': student_id, 'graded': False} for student_id in new_ids])
+            self.data = pd.concat([self.data, new_rows], ignore_index=True)
+            self.reindex()
+        return new_ids
+
+    def __contains__(self, student_id):
+        return student_id in self.rows
+
+    def __len__(self):
+        return len(self.data)
+
+    def get(self, student_id, column):
+        """Value for one student, with missing values returned as None"""
+        import pandas as pd
+
+        idx = self.rows.get(student_id)
+        if idx is None or column not in self.data.columns:
+            return None
+        value = self.data.at[idx, column]
+        return None if pd.isna(value) else value
+
+    def set(self, student_id, column, value):
+        """Store a value, returning True only if it actually changed"""
+        idx = self.rows.get(student_id)
+        if idx is None:
+            return False
+        if self.get(student_id, column) == value:
+            return False
+        if column not in self.data.columns:
+            self.data[column] = None
+        if isinstance(value, str) and self.data[column].dtype != object:
+            self.data[column] = self.data[column].astype(object)
+        self.data.at[idx, column] = value
+        return True
+
+    def marks(self, student_id, keys):
+        return {key: self.get(student_id, key) for key in keys}
+
+    def is_graded(self, student_id):
+        return self.get(student_id, 'graded') == True
+
+    def graded_ids(self):
+        return set(self.data.loc[self.data['graded'] == True, 'student_id'])
+
+    def save(self):
+        """Save, keeping any rows or marks other graders have saved meanwhile"""
+        self.data = self.file.write(self.data)
+        if self.file.merged:
+            self.reindex()
+
+    def summary(self, bonus_keys):
+        """Graded count plus avg/max/min over regular and bonus criteria columns"""
+        import pandas as pd
+
+        graded_count = int((self.data['graded'] == True).sum())
+        numeric_cols = [col for col in self.data.columns
+                        if col not in META_COLUMNS and pd.api.types.is_numeric_dtype(self.data[col])]
+
+        groups = {}
+        for label, cols in (
+            ("Regular", [col for col in numeric_cols if col not in bonus_keys]),
+            ("Bonus", [col for col in numeric_cols if col in bonus_keys]),
+        ):
+            if cols and len(self.data) > 0:
+                values = self.data[cols]
+                groups[label] = (
+                    values.mean().mean().round(1),
+                    values.max().max().round(1),
+                    values.min().min().round(1),
+                )
+        return graded_count, len(self.data), groups
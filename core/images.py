@@ -0,0 +1,143 @@
+"""Loading, fitting and saving chart images, with a small decode cache."""
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+
+
+def fit_size(width, height, max_width, max_height, upscale=False):
+    """Largest size with the image's aspect ratio that fits in the box"""
+    scale = min(max_width / width, max_height / height)
+    if not upscale:
+        scale = min(scale, 1.0)
+    return max(1, int(width * scale)), max(1, int(height * scale))
+
+
+def save_chart(image, path, text=None):
+    """Save a scanned page in the archive format used for charts, with optional PNG text chunks"""
+    from PIL.PngImagePlugin import PngInfo
+
+    pnginfo = None
+    if text:
+        pnginfo = PngInfo()
+        for key, value in text.items():
+            pnginfo.add_text(key, value)
+    image.save(path, format="PNG", compress_level=9, dpi=image.info.get("dpi", (300, 300)), pnginfo=pnginfo)
+
+
+def replace_chart(image, path):
+    """save_chart through a temporary file swapped into place
+
+    Readers never see half a page, and a hard link to the old file (a merged
+    station page) keeps the old page instead of being rewritten under it.
+    """
+    fd, tmp_path = tempfile.mkstemp(suffix=".tmp", dir=os.path.dirname(path) or ".")
+    os.close(fd)
+    try:
+        save_chart(image, tmp_path)
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+class ChartCache:
+    """LRU cache of display-sized charts, invalidated when the file changes"""
+
+    def __init__(self, max_items=64, max_pages=4):
+        self.max_items = max_items
+        self.max_pages = max_pages
+        self.items = OrderedDict()
+        self.pages = OrderedDict()  # Full resolution tiled pages for zooming
+        self.lock = threading.Lock()
+        self.loading = {}  # path -> Event for pages being decoded in the background
+        self.store = None  # Optional PageStore consulted before decoding PNGs
+
+    def _remember(self, key, image):
+        self.items[key] = image
+        self.items.move_to_end(key)
+        while len(self.items) > self.max_items:
+            self.items.popitem(last=False)
+
+    def display(self, path, max_width, max_height):
+        """Decoded chart fitted to the box, or None if there is no chart"""
+        from PIL import Image
+
+        try:
+            mtime = os.path.getmtime(path)
+        except OSError:
+            return None
+
+        key = (path, mtime, max_width, max_height)
+        image = self.items.get(key)
+        if image is not None:
+            self.items.move_to_end(key)
+            return image
+
+        with Image.open(path) as img:
+            # Let the decoder drop resolution early for large downscales
+            size = fit_size(img.width, img.height, max_width, max_height)
+            img.draft(img.mode, size)
+            image = img.resize(size, Image.Resampling.LANCZOS)
+
+        self._remember(key, image)
+        return image
+
+    def tiled(self, path):
+        """Full resolution page as a TiledImage, decoded once while it stays cached"""
+        # Wait for a background prefetch of this page rather than decoding it twice
+        pending = self.loading.get(path)
+        if pending is not None:
+            pending.wait()
+        return self.load_tiled(path)
+
+    def load_tiled(self, path):
+        from PIL import Image
+        from core.tiles import TiledImage
+
+        try:
+            mtime = os.path.getmtime(path)
+        except OSError:
+            return None
+
+        key = (path, mtime)
+        with self.lock:
+            page = self.pages.get(key)
+            if page is not None:
+                self.pages.move_to_end(key)
+                return page
+
+        img = self.store.image(path) if self.store is not None else None
+        if img is None:
+            img = Image.open(path)
+            img.load()
+        page = TiledImage(img)
+
+        with self.lock:
+            self.pages[key] = page
+            while len(self.pages) > self.max_pages:
+                self.pages.popitem(last=False)
+        return page
+
+    def prefetch(self, path):
+        """Decode a page in a background thread so showing it later is instant"""
+        if path in self.loading or not os.path.exists(path):
+            return
+        done = threading.Event()
+        self.loading[path] = done
+
+        def load():
+            try:
+                self.load_tiled(path)
+            except Exception:
+                pass
+            finally:
+                self.loading.pop(path, None)
+                done.set()
+
+        threading.Thread(target=load, daemon=True).start()
+
+    def forget(self, path):
+        for cache in (self.items, self.pages):
+            for key in [key for key in cache if key[0] == path]:
+                del cache[key]
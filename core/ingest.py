@@ -0,0 +1,312 @@
+"""Hot-folder ingest for scans made on copiers and other devices.
+
+Files dropped into `their data/quiz N/inbox` (PDF, JPEG, PNG or TIFF) are
+split into pages, turned upright from their EXIF orientation and saved as
+charts. Each page is filed under the student named by its cover sheet
+barcode (`core.coversheet`). Pages after a cover sheet in the same file
+belong to that student; the cover sheet itself is not filed, so page
+numbers match scans identified by a typed ID. A file with no cover sheet
+can be named after the student instead (`20240017.pdf`, `20240017 p2.jpg`)
+if that ID is on the master sheet, the students CSV or the attendance list,
+so copier names like `20261019_1430.pdf` aren't taken for students.
+
+Files are read in a process pool. Each finished file moves to `inbox/done`.
+Files that can't be read or identified move to `inbox/failed` or
+`inbox/unidentified`. A file still being written is left alone until its
+size stops changing and it decodes cleanly. Filing is keyed on content
+hashes (`charts/ingested.json`), so a file dropped twice, or an ingest
+restarted after a crash, never files a page twice.
+"""
+import hashlib
+import json
+import os
+import re
+import shutil
+import time
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+
+from core.attendance import AttendanceStore
+from core.roster import id_key, load_master, read_students
+from core.images import save_chart
+from core.merge import SETTLE_SECONDS, file_digest
+from core.pages import PageIndex
+from core.pagestore import PageStore
+from core.phash import HashIndex
+
+EXTENSIONS = (".pdf", ".jpg", ".jpeg", ".png", ".tif", ".tiff")
+MAX_ATTEMPTS = 3  # Unreadable files settled this many passes running are given up on
+STALE_SECONDS = 60  # A file still cut short this long after its last write never will be finished
+
+
+class IncompleteFile(Exception):
+    """The file is truncated, most likely because it is still being written"""
+
+
+def pdf_images(data):
+    """Page images embedded in a scanned PDF, in file order
+
+    Copiers and scanners write one JPEG (or Flate-compressed bitmap) per page.
+    PyMuPDF is used when installed and renders any PDF; without it only
+    those embedded scan images are read.
+    """
+    from PIL import Image
+
+    if b"%%EOF" not in data[-1024:]:
+        raise IncompleteFile("PDF has no end marker")
+    try:
+        import fitz
+    except ImportError:
+        fitz = None
+    if fitz is not None:
+        images = []
+        with fitz.open(stream=data, filetype="pdf") as document:
+            for page in document:
+                pixmap = page.get_pixmap(dpi=300)
+                images.append(Image.frombytes("RGB", (pixmap.width, pixmap.height), pixmap.samples))
+        return images
+
+    import io
+
+    images = []
+    for match in re.finditer(rb"<<((?:[^<>]|<<(?:[^<>]|<<[^<>]*>>)*>>)*)>>\s*stream\r?\n", data):
+        info = match.group(1)
+        if not re.search(rb"/Subtype\s*/Image", info):
+            continue
+        start = match.end()
+        end = data.find(b"endstream", start)
+        if end < 0:
+            raise IncompleteFile("PDF stream is cut short")
+        stream = data[start:end].rstrip(b"\r\n")
+        if b"/DCTDecode" in info or b"/JPXDecode" in info:
+            image = Image.open(io.BytesIO(stream))
+            image.load()
+        elif b"/FlateDecode" in info:
+            width = int(re.search(rb"/Width\s+(\d+)", info).group(1))
+            height = int(re.search(rb"/Height\s+(\d+)", info).group(1))
+            bits = int(re.search(rb"/BitsPerComponent\s+(\d+)", info).group(1))
+            mode = "RGB" if b"/DeviceRGB" in info else "1" if bits == 1 else "L"
+            image = Image.frombytes(mode, (width, height), zlib.decompress(stream))
+        else:
+            raise ValueError("PDF page uses an image encoding that needs PyMuPDF (pip install pymupdf)")
+        images.append(image)
+    if not images:
+        raise ValueError("No scanned pages found in PDF (install PyMuPDF to read other PDFs)")
+    return images
+
+
+def file_images(path):
+    """Upright page images of an inbox file"""
+    from PIL import Image, ImageOps
+
+    if path.lower().endswith(".pdf"):
+        with open(path, "rb") as f:
+            return pdf_images(f.read())
+    images = []
+    try:
+        with Image.open(path) as img:
+            for frame in range(getattr(img, "n_frames", 1)):
+                img.seek(frame)
+                img.load()
+                images.append(ImageOps.exif_transpose(img.copy()))
+    except (OSError, SyntaxError) as e:
+        raise IncompleteFile(str(e))
+    return images
+
+
+def chart_image(image):
+    """Page in a mode the chart tools read: grayscale or RGB"""
+    if image.mode in ("L", "RGB"):
+        return image
+    return image.convert("L" if image.mode in ("1", "I;16", "I") else "RGB")
+
+
+def name_id(path, known_ids):
+    """Student ID from a file named after a known student (`known_ids` by id_key), or None"""
+    match = re.match(r"(\d{4,})(?:\D|$)", os.path.basename(path))
+    if match and id_key(match.group(1)) in known_ids:
+        return match.group(1)
+    return None
+
+
+def read_file(path, work_dir, quiz_number, known_ids=frozenset()):
+    """Split, straighten and identify a file's pages, saving each to `work_dir`
+
+    Returns (file digest, [(page path, page digest, page hash, student id or None)]).
+    Pages after a cover sheet take its student; before any, the file name's
+    when that is one of `known_ids`.
+    Cover sheets themselves aren't returned, so a student's answers start at page 1.
+    """
+    from core.coversheet import identify
+    from core.phash import check_page
+
+    digest = file_digest(path)
+    student_id = name_id(path, known_ids)
+    pages = []
+    for number, image in enumerate(file_images(path), start=1):
+        image = chart_image(image)
+        cover_id, _ = identify(image, quiz_number)
+        if cover_id:
+            student_id = cover_id
+            continue
+        page_digest = hashlib.sha1(image.tobytes()).hexdigest()
+        page_hash, _ = check_page(image)
+        page_path = os.path.join(work_dir, f"{digest[:16]} {number}.png")
+        save_chart(image, page_path + ".tmp")
+        os.replace(page_path + ".tmp", page_path)
+        pages.append((page_path, page_digest, page_hash, student_id))
+    return digest, pages
+
+
+class Ingester:
+    def __init__(self, paths, inbox=None, workers=None):
+        self.paths = paths
+        self.inbox = inbox or paths.inbox
+        self.work_dir = os.path.join(self.inbox, ".work")
+        self.workers = workers
+        self.state_path = os.path.join(paths.charts_dir, "ingested.json")
+        self.state = self.load_state()  # {"files": {digest: [chart names]}, "pages": {digest: chart name}}
+        self.attendance = AttendanceStore(paths.attendance)
+        self.attempts = {}  # Inbox file -> failed reads since it settled
+
+    def load_state(self):
+        try:
+            with open(self.state_path, encoding="utf-8") as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            state = {}
+        state.setdefault("files", {})
+        state.setdefault("pages", {})
+        return state
+
+    def save_state(self):
+        tmp_path = self.state_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.state, f, indent=1)
+        os.replace(tmp_path, self.state_path)
+
+    def known_ids(self):
+        """IDs (by id_key) a file may be named after: the master sheet, students CSV and attendance"""
+        known = {id_key(student_id) for student_id in self.attendance}
+        try:
+            known.update(load_master())
+        except Exception:
+            pass  # No master sheet here; the quiz's own lists still count
+        students = read_students(self.paths.students_csv)
+        known.update(id_key(student_id) for student_id in students["id"])
+        return frozenset(known)
+
+    def settled(self):
+        """Inbox files not written to for the last few seconds"""
+        if not os.path.isdir(self.inbox):
+            return []
+        now = time.time()
+        ready = []
+        for name in sorted(os.listdir(self.inbox)):
+            path = os.path.join(self.inbox, name)
+            if not name.lower().endswith(EXTENSIONS) or not os.path.isfile(path):
+                continue
+            stat = os.stat(path)
+            if now - stat.st_mtime >= SETTLE_SECONDS:
+                ready.append(path)
+        return ready
+
+    def move(self, path, folder, reason=None):
+        destination_dir = os.path.join(self.inbox, folder)
+        os.makedirs(destination_dir, exist_ok=True)
+        destination = os.path.join(destination_dir, os.path.basename(path))
+        if os.path.exists(destination):
+            stem, extension = os.path.splitext(destination)
+            destination = f"{stem} {time.strftime('%Y%m%d-%H%M%S')}{extension}"
+        shutil.move(path, destination)
+        if reason:
+            with open(destination + ".txt", "w", encoding="utf-8") as f:
+                f.write(reason + "\n")
+        self.attempts.pop(path, None)
+
+    def ingest_once(self):
+        """Read every settled inbox file: (files done, pages filed, duplicate pages, files set aside)"""
+        self.paths.ensure(charts=True)
+        self.attendance.ensure()
+        os.makedirs(self.work_dir, exist_ok=True)
+        files = self.settled()
+        if not files:
+            return 0, 0, 0, 0
+
+        done = filed = duplicates = set_aside = 0
+        page_index = PageIndex(self.paths)
+        hash_index = HashIndex(self.paths)
+        store = PageStore.open(self.paths)
+        with ProcessPoolExecutor(max_workers=self.workers) as pool:
+            known_ids = self.known_ids()
+            futures = [(path, pool.submit(read_file, path, self.work_dir, self.paths.quiz_number, known_ids))
+                       for path in files]
+            for path, future in futures:
+                try:
+                    digest, pages = future.result()
+                except IncompleteFile as e:
+                    # Usually still being copied in; try again next pass
+                    if time.time() - os.path.getmtime(path) > STALE_SECONDS:
+                        self.move(path, "failed", f"File is incomplete: {e}")
+                        set_aside += 1
+                    continue
+                except Exception as e:
+                    self.attempts[path] = self.attempts.get(path, 0) + 1
+                    if self.attempts[path] >= MAX_ATTEMPTS:
+                        self.move(path, "failed", f"Could not read: {e}")
+                        set_aside += 1
+                    continue
+
+                if digest in self.state["files"]:
+                    # The same file dropped again
+                    duplicates += len(pages)
+                elif any(student_id is None for _, _, _, student_id in pages):
+                    self.move(path, "unidentified",
+                              "No cover sheet before some pages and no known student ID in the file name. "
+                              "Rename the file to the student's ID and put it back in the inbox.")
+                    set_aside += 1
+                    self.discard(pages)
+                    continue
+                else:
+                    names = []
+                    for page_path, page_digest, page_hash, student_id in pages:
+                        name = self.file_page(page_path, page_digest, page_hash, student_id,
+                                              page_index, hash_index, store)
+                        if name is None:
+                            duplicates += 1
+                        else:
+                            filed += 1
+                            names.append(name)
+                    self.state["files"][digest] = names
+                    self.save_state()
+                self.discard(pages)
+                self.move(path, "done")
+                done += 1
+        hash_index.save()
+        return done, filed, duplicates, set_aside
+
+    def file_page(self, page_path, page_digest, page_hash, student_id, page_index, hash_index, store):
+        """Move one read page into charts, returning its chart name (None if already filed)"""
+        previous = self.state["pages"].get(page_digest)
+        if previous and os.path.exists(os.path.join(self.paths.charts_dir, previous)):
+            return None
+        new_student = self.attendance.add(student_id)
+        destination = page_index.add_page(student_id, replace_first=new_student)
+        os.replace(page_path, destination)
+        name = os.path.basename(destination)
+        # A page filed over an older one mustn't be hashed from that page's original
+        raw_path = os.path.join(self.paths.raw_charts_dir, name)
+        if os.path.exists(raw_path):
+            os.remove(raw_path)
+        hash_index.add(name, page_hash, save=False)
+        if store is not None:
+            store.add(destination)
+        self.state["pages"][page_digest] = name
+        self.save_state()
+        return name
+
+    @staticmethod
+    def discard(pages):
+        for page_path, _, _, _ in pages:
+            if os.path.exists(page_path):
+                os.remove(page_path)
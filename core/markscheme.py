@@ -0,0 +1,79 @@
+class Criterion:
+    """One markscheme line item, e.g. `5,Correct start/end*` in section `Q1`"""
+
+    def __init__(self, section, name, max_mark, bonus=False):
+        self.section = section
+        self.name = name
+        self.max_mark = max_mark
+        self.bonus = bonus
+        self.key = f"{section}_{name}"  # Column name in the grading CSV
+
+    def __repr__(self):
+        return f"Criterion({self.key!r}, max={self.max_mark}{', bonus' if self.bonus else ''})"
+
+
+class Markscheme:
+    """Parsed `section:max,criterion;max,criterion*` markscheme"""
+
+    def __init__(self, lines):
+        self.lines = [line.strip() for line in lines if line.strip()]
+        self.sections = []   # (section name, [Criterion]) in file order
+        self.criteria = []
+        for line in self.lines:
+            if ":" not in line:
+                continue
+            section_name, criteria_str = line.split(":", 1)
+            section = []
+            for pair in criteria_str.split(";"):
+                if not pair:
+                    continue
+                max_mark, name = pair.split(",", 1)
+                bonus = name.endswith("*")
+                if bonus:
+                    name = name[:-1]  # Remove the *
+                section.append(Criterion(section_name, name, float(max_mark), bonus))
+            self.sections.append((section_name, section))
+            self.criteria.extend(section)
+
+        self.by_key = {criterion.key: criterion for criterion in self.criteria}
+        self.bonus_keys = {criterion.key for criterion in self.criteria if criterion.bonus}
+
+    @classmethod
+    def load(cls, path):
+        with open(path, 'r') as f:
+            return cls(f)
+
+    @property
+    def columns(self):
+        return [criterion.key for criterion in self.criteria]
+
+    def max_mark(self, key):
+        criterion = self.by_key.get(key)
+        return criterion.max_mark if criterion else None
+
+    def totals(self, marks):
+        """(total, total max, bonus) for a mapping of criterion key -> mark or None"""
+        total_marks = 0
+        total_max_marks = 0
+        bonus_marks = 0
+        for key, mark in marks.items():
+            criterion = self.by_key.get(key)
+            if criterion is None or mark is None:
+                continue
+            if criterion.bonus:
+                bonus_marks += mark
+            elif criterion.max_mark:
+                total_marks += mark
+                total_max_marks += criterion.max_mark
+        return total_marks, total_max_marks, bonus_marks
+
+
+def grade_text(total_marks, total_max_marks, bonus_marks):
+    """`12/20 (60.0%) + 1 bonus`, or None when nothing has been marked"""
+    if total_max_marks <= 0:
+        return None
+    percentage = (total_marks / total_max_marks) * 100
+    text = f"{total_marks:.0f}/{total_max_marks:.0f} ({percentage:.1f}%)"
+    if bonus_marks > 0:
+        text += f" + {bonus_marks:.0f} bonus"
+    return text
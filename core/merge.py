@@ -0,0 +1,143 @@
+"""Merging scanning stations' spools into the shared quiz directory.
+
+A station started with `QUIZ_STATION=<name>` scans into
+`their data/stations/<name>/quiz N`. `StationMerger` moves new attendance
+IDs and pages from every station into `their data/quiz N`. IDs are
+deduplicated and pages are hard-linked into place, falling back to a copy
+only when the spool is on another filesystem. Stations save and clean up
+pages by swapping in a new file, never by rewriting one, so a re-scan
+breaks the link instead of changing the shared page mid-write, and the
+next pass merges the new page. `charts/merged.json` remembers what has
+been merged, so each pass only looks at new or changed pages and merging
+can run continuously next to the scanners.
+"""
+import hashlib
+import json
+import os
+import shutil
+import time
+
+from core.attendance import AttendanceStore
+from core.pages import PageIndex
+from core.paths import STATIONS_DIR, QuizPaths
+
+SETTLE_SECONDS = 2.0  # Leave pages this recently written for the next pass
+
+
+def find_stations(quiz_number, stations_dir=STATIONS_DIR):
+    """{station name: QuizPaths} for every station with a spool for the quiz"""
+    if not os.path.isdir(stations_dir):
+        return {}
+    stations = {}
+    for name in sorted(os.listdir(stations_dir)):
+        paths = QuizPaths(quiz_number, os.path.join(stations_dir, name))
+        if os.path.isdir(paths.quiz_dir):
+            stations[name] = paths
+    return stations
+
+
+def file_digest(path):
+    digest = hashlib.sha1()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def place(source, destination):
+    """Put `source` at `destination` without a partial file ever being visible there"""
+    tmp_path = destination + ".merge"
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+    try:
+        os.link(source, tmp_path)
+        linked = True
+    except OSError:
+        shutil.copy2(source, tmp_path)  # Different filesystem, or no hard links
+        linked = False
+    os.replace(tmp_path, destination)
+    return linked
+
+
+class StationMerger:
+    def __init__(self, paths, stations):
+        self.paths = paths
+        self.stations = {}
+        self.state_path = os.path.join(paths.charts_dir, "merged.json")
+        self.state = self.load_state()  # station -> {spool page name: [size, mtime, merged name]}
+        self.attendance = AttendanceStore(paths.attendance)
+        # Kept between passes so each station's attendance is only read from where it left off
+        self.station_attendance = {}
+        self.add_stations(stations)
+
+    def add_stations(self, stations):
+        """Merge stations not seen before from now on; returns their names"""
+        added = [name for name in stations if name not in self.stations]
+        for name in added:
+            self.stations[name] = stations[name]
+            self.station_attendance[name] = AttendanceStore(stations[name].attendance)
+        return added
+
+    def load_state(self):
+        try:
+            with open(self.state_path, encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def save_state(self):
+        tmp_path = self.state_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.state, f, indent=1)
+        os.replace(tmp_path, self.state_path)
+
+    def merge_once(self):
+        """One pass over every station: (new IDs, pages placed, copies, duplicates skipped)"""
+        self.paths.ensure(charts=True)
+        self.attendance.ensure()
+        page_index = PageIndex(self.paths)
+        new_ids = pages = copies = duplicates = 0
+        now = time.time()
+
+        for name, station in self.stations.items():
+            for student_id in self.station_attendance[name].refresh():
+                new_ids += self.attendance.add(student_id)
+
+            merged = self.state.setdefault(name, {})
+            spool_index = PageIndex(station)
+            for student_id in spool_index.manifest:
+                for source in spool_index.pages(student_id):
+                    source_name = os.path.basename(source)
+                    stat = os.stat(source)
+                    if now - stat.st_mtime < SETTLE_SECONDS:
+                        continue
+                    previous = merged.get(source_name)
+                    if previous and previous[:2] == [stat.st_size, stat.st_mtime]:
+                        continue
+
+                    if previous and previous[2]:
+                        # Re-saved or cleaned up since the last pass: replace the merged page
+                        destination = os.path.join(self.paths.charts_dir, previous[2])
+                    else:
+                        existing = page_index.pages(student_id)
+                        if existing and self.is_duplicate(source, stat.st_size, existing):
+                            merged[source_name] = [stat.st_size, stat.st_mtime, ""]
+                            duplicates += 1
+                            continue
+                        destination = page_index.add_page(student_id)
+
+                    copies += not place(source, destination)
+                    merged[source_name] = [stat.st_size, stat.st_mtime, os.path.basename(destination)]
+                    pages += 1
+
+        self.save_state()
+        return new_ids, pages, copies, duplicates
+
+    @staticmethod
+    def is_duplicate(source, size, existing):
+        """True if the same page (byte for byte) is already merged for this student"""
+        same_size = [path for path in existing if os.path.getsize(path) == size]
+        if not same_size:
+            return False
+        digest = file_digest(source)
+        return any(file_digest(path) == digest for path in same_size)
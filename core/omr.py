@@ -0,0 +1,160 @@
+"""Optical mark recognition for multiple-choice sections.
+
+Bubble grids are described per quiz in `quiz-N omr.json`, keyed by
+markscheme section:
+
+    {"Q1": {"box": [0.12, 0.30, 0.48, 0.62], "page": 1,
+            "options": "ABCD", "answers": "BADCCABD"}}
+
+`box` is the grid's outline as page fractions (as in regions.json), with one
+row per question and one column per option. Question n is marked against
+the section's nth criterion, scoring its full mark when the darkest bubble is
+the right answer. Each student's grid is reduced to a questions x options
+array of fill levels. All students are then marked together as NumPy array
+operations. Answers that are blank, double-marked or too close to call are
+flagged for review rather than trusted.
+"""
+import json
+import warnings
+from concurrent.futures import ProcessPoolExecutor
+
+from core.pagestore import open_page
+
+CELL = 16  # Pixels each bubble is resampled to
+MIN_FILL = 0.25  # Darkness (0-1) above the row's emptiest bubble that counts as filled
+MIN_MARGIN = 0.15  # Lead the darkest bubble needs over the next one
+
+
+def spec_problem(spec):
+    """Why a grid spec can't be marked, or None if it can"""
+    if len(spec.get("box", ())) != 4:
+        return "box needs 4 page fractions"
+    if not spec.get("answers") or not spec.get("options"):
+        return "answers and options are required"
+    if len(spec["options"]) < 2:
+        return "a grid needs at least 2 options"
+    unknown = set(spec["answers"]) - set(spec["options"])
+    if unknown:
+        return f"answers {''.join(sorted(map(str, unknown)))} are not among the options"
+    return None
+
+
+def load_specs(path):
+    """Grid specs by section; ones that can't be marked are left out with a warning"""
+    try:
+        with open(path, encoding="utf-8") as f:
+            specs = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    usable = {}
+    for section, spec in specs.items():
+        problem = spec_problem(spec) if isinstance(spec, dict) else "not an object"
+        if problem:
+            warnings.warn(f"Skipping OMR grid {section} in {path}: {problem}", stacklevel=2)
+        else:
+            usable[section] = spec
+    return usable
+
+
+def grid_fills(image, box, questions, options):
+    """questions x options array of bubble darkness above each row's emptiest bubble"""
+    import numpy as np
+    from PIL import Image
+
+    width, height = image.size
+    left, top, right, bottom = box
+    grid = image.crop((int(left * width), int(top * height), int(right * width), int(bottom * height)))
+    grid = grid.convert("L").resize((options * CELL, questions * CELL), Image.Resampling.BOX)
+    cells = np.asarray(grid, dtype=np.float32).reshape(questions, CELL, options, CELL).transpose(0, 2, 1, 3)
+    # Only the middle of each cell, away from the printed bubble outline
+    margin = CELL // 4
+    darkness = 1.0 - cells[:, :, margin:-margin, margin:-margin].mean(axis=(2, 3)) / 255.0
+    return darkness - darkness.min(axis=1, keepdims=True)
+
+
+def read_sheet(student_id, pages, specs):
+    """(student id, {section: fills}) for one student's pages"""
+    fills = {}
+    opened = {}
+    for section, spec in specs.items():
+        page = spec.get("page", 1)
+        if len(pages) < page:
+            continue
+        if page not in opened:
+            opened[page] = open_page(pages[page - 1])
+        fills[section] = grid_fills(opened[page], spec["box"], len(spec["answers"]), len(spec["options"]))
+    return student_id, fills
+
+
+def read_sheets(sheets, specs, workers=None):
+    """Fill arrays for every (student id, pages) pair, read in a process pool"""
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(read_sheet, student_id, pages, specs) for student_id, pages in sheets]
+        return dict(future.result() for future in futures)
+
+
+def decide(fills, answers, options, min_fill=MIN_FILL, min_margin=MIN_MARGIN):
+    """Mark a students x questions x options stack of fills in one go
+
+    Returns (correct, flagged) boolean arrays of shape students x questions.
+    """
+    import numpy as np
+
+    ranked = np.sort(fills, axis=2)
+    best, runner_up = ranked[:, :, -1], ranked[:, :, -2]
+    chosen = fills.argmax(axis=2)
+    key = np.array([options.index(answer) for answer in answers])
+    correct = (chosen == key) & (best >= min_fill)
+    flagged = (best < min_fill) | (best - runner_up < min_margin)
+    return correct, flagged
+
+
+def auto_mark(sheet_fills, specs, markscheme, min_fill=MIN_FILL, min_margin=MIN_MARGIN):
+    """{student id: ({criterion key: mark}, [flagged criterion keys])} for every student read"""
+    import numpy as np
+
+    results = {student_id: ({}, []) for student_id in sheet_fills}
+    sections = dict(markscheme.sections)
+    for section, spec in specs.items():
+        criteria = sections.get(section, [])[:len(spec["answers"])]
+        students = [student_id for student_id, fills in sheet_fills.items() if section in fills]
+        if not criteria or not students:
+            continue
+        stack = np.stack([sheet_fills[student_id][section][:len(criteria)] for student_id in students])
+        correct, flagged = decide(stack, spec["answers"][:len(criteria)], spec["options"], min_fill, min_margin)
+        max_marks = np.array([criterion.max_mark for criterion in criteria])
+        marks = np.where(correct, max_marks, 0.0)
+        for row, student_id in enumerate(students):
+            student_marks, student_flags = results[student_id]
+            for column, criterion in enumerate(criteria):
+                student_marks[criterion.key] = float(marks[row, column])
+                if flagged[row, column]:
+                    student_flags.append(criterion.key)
+    return results
+
+
+def apply_marks(grading, markscheme, results, overwrite=False):
+    """Propose OMR marks in a GradingStore, returning (students updated, answers flagged)
+
+    Marks a grader has already entered are kept unless `overwrite`. Flagged
+    criteria go in the `review` column for grade.py to highlight.
+    """
+    from core.markscheme import grade_text
+
+    updated = flagged_count = 0
+    for student_id, (marks, flagged) in results.items():
+        if student_id not in grading:
+            continue
+        changed = False
+        for key, mark in marks.items():
+            if overwrite or grading.get(student_id, key) is None:
+                changed |= grading.set(student_id, key, mark)
+        review = set(str(grading.get(student_id, 'review') or "").split(";")) - {""}
+        review = (review - set(marks)) | set(flagged)
+        changed |= grading.set(student_id, 'review', ";".join(sorted(review)) or None)
+        if changed:
+            grade = grade_text(*markscheme.totals(grading.marks(student_id, markscheme.columns)))
+            grading.set(student_id, 'overall_grade', grade)
+            updated += 1
+        flagged_count += len(flagged)
+    return updated, flagged_count
@@ -0,0 +1,130 @@
+"""Multi-page submissions.
+
+Page 1 keeps the original `quiz-N <id>.png` name so single-page quizzes are
+unchanged; further pages are `quiz-N <id> p2.png`, `p3`, ... The per-quiz
+manifest `charts/pages.json` lists each student's pages in order so readers
+don't need to scan the directory. Scanning stations, the merger and ingest
+all add to it, so every change re-reads the manifest and writes it back
+under a lock file, and readers reload it when it changes on disk.
+"""
+import glob
+import json
+import os
+import re
+
+from core.filelock import FileLock
+
+
+class PageIndex:
+    def __init__(self, paths):
+        self.paths = paths
+        self.manifest_path = os.path.join(paths.charts_dir, "pages.json")
+        self.lock = FileLock(self.manifest_path)
+        self.signature = None  # (mtime, size) of the manifest as last loaded
+        self.manifest = {}
+        self.refresh()
+
+    def load(self):
+        try:
+            with open(self.manifest_path, encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def refresh(self):
+        """Reload the manifest if another process has changed it"""
+        try:
+            stat = os.stat(self.manifest_path)
+            signature = (stat.st_mtime_ns, stat.st_size, stat.st_ino)
+        except OSError:
+            signature = None
+        if signature != self.signature:
+            self.signature = signature
+            self.manifest = self.load()
+
+    def update(self, change):
+        """Apply `change(manifest)` to the latest manifest and write it, under the lock"""
+        os.makedirs(self.paths.charts_dir, exist_ok=True)
+        with self.lock:
+            self.signature = None
+            self.refresh()
+            result = change(self.manifest)
+            self.save()
+        return result
+
+    def save(self):
+        os.makedirs(self.paths.charts_dir, exist_ok=True)
+        tmp_path = self.manifest_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.manifest, f, indent=1)
+        os.replace(tmp_path, self.manifest_path)
+        stat = os.stat(self.manifest_path)
+        self.signature = (stat.st_mtime_ns, stat.st_size, stat.st_ino)
+
+    def page_path(self, student_id, page):
+        if page == 1:
+            return self.paths.chart(student_id)
+        return os.path.join(self.paths.charts_dir, f"quiz-{self.paths.quiz_number} {student_id} p{page}.png")
+
+    def discover(self, student_id):
+        """Pages on disk for a student not (yet) in the manifest"""
+        pages = []
+        first = self.paths.chart(student_id)
+        if os.path.exists(first):
+            pages.append(first)
+        pattern = os.path.join(self.paths.charts_dir, glob.escape(
+            f"quiz-{self.paths.quiz_number} {student_id} p") + "*.png")
+        numbered = []
+        for path in glob.glob(pattern):
+            match = re.search(r" p(\d+)\.png$", path)
+            if match:
+                numbered.append((int(match.group(1)), path))
+        pages.extend(path for _, path in sorted(numbered))
+        return pages
+
+    def pages(self, student_id):
+        """Existing page files for a student, in page order"""
+        self.refresh()
+        names = self.manifest.get(str(student_id))
+        if names is None:
+            return self.discover(student_id)
+        return [
+            path for path in (os.path.join(self.paths.charts_dir, name) for name in names)
+            if os.path.exists(path)
+        ]
+
+    def count(self, student_id):
+        return len(self.pages(student_id))
+
+    def add_page(self, student_id, replace_first=False):
+        """Path the next page should be saved to, recorded in the manifest
+
+        With `replace_first` the student's pages are reset and page 1 is
+        overwritten, matching the old single-image behaviour.
+        """
+        def change(manifest):
+            existing = [] if replace_first else self.pages(student_id)
+            path = self.page_path(student_id, len(existing) + 1)
+            manifest[str(student_id)] = [os.path.basename(page) for page in existing] + [os.path.basename(path)]
+            return path
+
+        return self.update(change)
+
+    def rename(self, old_id, new_id):
+        """Move every page of a student to a new ID"""
+        def change(manifest):
+            moved = []
+            for page, path in enumerate(self.pages(old_id), start=1):
+                new_path = self.page_path(new_id, page)
+                os.replace(path, new_path)
+                moved.append(os.path.basename(new_path))
+                # The original kept by clean-up follows its chart
+                raw_path = os.path.join(self.paths.raw_charts_dir, os.path.basename(path))
+                if os.path.exists(raw_path):
+                    os.replace(raw_path, os.path.join(self.paths.raw_charts_dir, moved[-1]))
+            manifest.pop(str(old_id), None)
+            if moved:
+                manifest[str(new_id)] = moved
+            return moved
+
+        return self.update(change)
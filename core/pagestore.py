@@ -0,0 +1,197 @@
+"""Memory-mapped store of downscaled grayscale pages for fast navigation.
+
+`charts/pages.store` holds one fixed-size slot per page: raw 8-bit grayscale
+pixels, `width` bytes per row, with the page fitted into the top-left corner.
+`charts/pages.store.json` records each page's slot, size and the chart's
+mtime, so a chart edited since the store was written is read from its PNG
+instead. Writers (scan.py, ingest, a rebuild) hold a lock file while they
+update it. Readers map the file read-only, so several grading processes on one
+machine share the same pages in the OS cache, and showing a page is a slice
+of the map rather than a PNG decode.
+"""
+import json
+import mmap
+import os
+import threading
+from types import SimpleNamespace
+
+from core.filelock import FileLock
+from core.images import fit_size
+
+DEFAULT_WIDTH = 1240  # 150 dpi across an A4 page
+
+
+def slot_height(width):
+    return round(width * 2 ** 0.5)  # A4 portrait
+
+
+def fit_page(image, width, height):
+    """Grayscale copy of a page fitted into a width x height slot"""
+    from PIL import Image
+
+    size = fit_size(image.width, image.height, width, height)
+    if image.mode in ("RGB", "L"):
+        image.draft(image.mode, size)
+    return image.convert("L").resize(size, Image.Resampling.LANCZOS, reducing_gap=2.0)
+
+
+def fit_file(path, width, height):
+    """(path, mtime, size, pixels) for a chart, padded out to the slot width"""
+    from PIL import Image
+
+    mtime = os.path.getmtime(path)
+    with Image.open(path) as img:
+        page = fit_page(img, width, height)
+    return path, mtime, page.size, slot_bytes(page, width)
+
+
+def slot_bytes(page, width):
+    from PIL import Image
+
+    if page.width == width:
+        return page.tobytes()
+    padded = Image.new("L", (width, page.height), 255)
+    padded.paste(page, (0, 0))
+    return padded.tobytes()
+
+
+class PageStore:
+    def __init__(self, paths):
+        self.path = os.path.join(paths.charts_dir, "pages.store")
+        self.index_path = self.path + ".json"
+        self.width = DEFAULT_WIDTH
+        self.height = slot_height(DEFAULT_WIDTH)
+        self.pages = {}  # chart filename -> [slot, width, height, mtime]
+        self.index_mtime = None
+        self.map = None
+        self.lock = threading.Lock()
+        self.file_lock = FileLock(self.path)  # Other processes writing the same store
+
+    @classmethod
+    def open(cls, paths):
+        """The quiz's store, or None if it has never been built"""
+        store = cls(paths)
+        return store if store.reload() else None
+
+    @property
+    def slot_size(self):
+        return self.width * self.height
+
+    def reload(self):
+        """Re-read the index if another process has changed it"""
+        try:
+            mtime = os.path.getmtime(self.index_path)
+        except OSError:
+            return False
+        if mtime != self.index_mtime:
+            with open(self.index_path, encoding="utf-8") as f:
+                index = json.load(f)
+            self.width, self.height = index["width"], index["height"]
+            self.pages = index["pages"]
+            self.index_mtime = mtime
+            self.map = None  # A rebuild may have replaced the file under the old map
+        return True
+
+    def save_index(self):
+        tmp_path = self.index_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"width": self.width, "height": self.height, "pages": self.pages}, f)
+        os.replace(tmp_path, self.index_path)
+        self.index_mtime = os.path.getmtime(self.index_path)
+
+    def mapped(self, end):
+        """Read-only map covering at least `end` bytes, remapped after the file grows"""
+        if self.map is None or len(self.map) < end:
+            # The old map is left to the garbage collector: images may still view it
+            with open(self.path, "rb") as f:
+                self.map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        return self.map if len(self.map) >= end else None
+
+    def image(self, path):
+        """Stored page for a chart path as an Image over the map, or None if missing or stale"""
+        from PIL import Image
+
+        try:
+            if not self.reload():
+                return None
+            entry = self.pages.get(os.path.basename(path))
+            if entry is None or entry[3] != os.path.getmtime(path):
+                return None
+            slot, width, height = entry[:3]
+            start = slot * self.slot_size
+            data = self.mapped(start + self.width * height)
+        except (OSError, ValueError):
+            return None
+        if data is None:
+            return None
+        view = memoryview(data)[start:start + self.width * height]
+        return Image.frombuffer("L", (width, height), view, "raw", "L", self.width, 1)
+
+    def add(self, path, image=None):
+        """Write (or overwrite) a chart's slot, e.g. straight after it is saved"""
+        from PIL import Image
+
+        name = os.path.basename(path)
+        mtime = os.path.getmtime(path)
+        if image is None:
+            with Image.open(path) as img:
+                page = fit_page(img, self.width, self.height)
+        else:
+            page = fit_page(image, self.width, self.height)
+
+        with self.lock, self.file_lock:
+            self.index_mtime = None  # Always take the latest index while holding the lock
+            self.reload()
+            entry = self.pages.get(name)
+            slot = entry[0] if entry else len(self.pages)
+            with open(self.path, "r+b" if os.path.exists(self.path) else "wb") as f:
+                f.seek(slot * self.slot_size)
+                f.write(slot_bytes(page, self.width))
+            self.pages[name] = [slot, page.width, page.height, mtime]
+            self.save_index()
+
+    @classmethod
+    def build(cls, paths, charts, width=DEFAULT_WIDTH, workers=None):
+        """Rebuild the store from scratch in a process pool, yielding each chart as it lands"""
+        from concurrent.futures import ProcessPoolExecutor
+
+        store = cls(paths)
+        store.width, store.height = width, slot_height(width)
+        tmp_path = store.path + ".tmp"
+        with open(tmp_path, "wb") as f, ProcessPoolExecutor(max_workers=workers) as pool:
+            for slot, (path, mtime, size, pixels) in enumerate(pool.map(
+                fit_file, charts, [store.width] * len(charts), [store.height] * len(charts), chunksize=4
+            )):
+                f.seek(slot * store.slot_size)
+                f.write(pixels)
+                store.pages[os.path.basename(path)] = [slot, size[0], size[1], mtime]
+                yield path
+        # Readers fall back to PNGs until the new index is in place. Replacing
+        # the store fails on Windows while a grader still has the old one mapped.
+        with store.file_lock:
+            if os.path.exists(store.index_path):
+                os.remove(store.index_path)
+            os.replace(tmp_path, store.path)
+            store.save_index()
+
+
+_stores = {}  # charts directory -> PageStore or None, per process
+
+
+def open_page(path):
+    """A chart from its quiz's page store when that is up to date, else from its PNG
+
+    For worker processes that read many pages of one quiz: the store is
+    opened once per process.
+    """
+    from PIL import Image
+
+    charts_dir = os.path.dirname(path)
+    if charts_dir not in _stores:
+        _stores[charts_dir] = PageStore.open(SimpleNamespace(charts_dir=charts_dir))
+    store = _stores[charts_dir]
+    image = store.image(path) if store is not None else None
+    if image is None:
+        image = Image.open(path)
+        image.load()
+    return image
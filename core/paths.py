@@ -0,0 +1,50 @@
+import os
+
+BASE_DIR = "their data"
+MASTER_SHEET = os.path.join("sheets", "students.xlsx")
+STATIONS_DIR = os.path.join(BASE_DIR, "stations")
+
+
+def station_base(station):
+    """Data directory a scanning station writes to; the shared one when `station` is empty"""
+    return os.path.join(STATIONS_DIR, station) if station else BASE_DIR
+
+
+class QuizPaths:
+    """Where every file for one quiz lives under `their data/quiz N`"""
+
+    def __init__(self, quiz_number, base_dir=BASE_DIR, second_marker=False):
+        self.quiz_number = quiz_number
+        self.base_dir = base_dir
+        self.second_marker = second_marker
+        self.quiz_dir = os.path.join(base_dir, f"quiz {quiz_number}")
+        self.feedback_dir = os.path.join(self.quiz_dir, "feedback")
+        self.charts_dir = os.path.join(self.quiz_dir, "charts")
+        self.raw_charts_dir = os.path.join(self.charts_dir, "raw")  # Originals of cleaned-up charts
+        self.inbox = os.path.join(self.quiz_dir, "inbox")
+        self.students_csv = self.feedback_file("students.csv")
+        self.first_grading_csv = self.feedback_file("grading.csv")
+        self.second_grading_csv = self.feedback_file("grading second.csv")
+        # The layer this marker reads and writes (see core.doublemark)
+        self.grading_csv = self.second_grading_csv if second_marker else self.first_grading_csv
+        self.edit_log = self.feedback_file("edits.jsonl")
+        self.moderation = self.feedback_file("moderation.txt")
+        self.markscheme = self.feedback_file("markscheme.txt")
+        self.attendance = self.feedback_file("attendance.txt")
+        self.regions = self.feedback_file("regions.json")
+        self.omr = self.feedback_file("omr.json")
+        self.scan_settings = self.feedback_file("scan.json")
+        self.export_dir = os.path.join(self.feedback_dir, "out")
+
+    def feedback_file(self, suffix):
+        return os.path.join(self.feedback_dir, f"quiz-{self.quiz_number} {suffix}")
+
+    def chart(self, student_id):
+        return os.path.join(self.charts_dir, f"quiz-{self.quiz_number} {student_id}.png")
+
+    def ensure(self, charts=False):
+        """Create the feedback (and optionally charts) directories"""
+        os.makedirs(self.feedback_dir, exist_ok=True)
+        if charts:
+            os.makedirs(self.charts_dir, exist_ok=True)
+        return self
@@ -0,0 +1,158 @@
+"""Perceptual hashes for spotting blank and duplicated pages.
+
+Each page gets a 256-bit difference hash (dHash) of its grayscale thumbnail.
+Hashes for a quiz are kept in `charts/hashes.json` and indexed in a BK-tree,
+so near-duplicates (small Hamming distance) are found without comparing
+against every page.
+
+Hashes are always taken from the page as scanned. Clean-up changes a page's
+crop and angle, and so its hash, so a cleaned chart is hashed from the
+original kept in `charts/raw`.
+"""
+import json
+import os
+
+HASH_SIZE = 16
+DUPLICATE_DISTANCE = 12  # of 256 bits
+
+
+def small_gray(image, target=400):
+    """Grayscale copy about `target` pixels across, made by fast integer box reduction"""
+    factor = max(1, min(image.size) // target)
+    if image.mode in ("1", "P"):
+        image = image.convert("L")  # reduce() needs whole-byte pixels
+    small = image.reduce(factor) if factor > 1 else image
+    return small.convert("L") if small.mode != "L" else small
+
+
+def dhash(image, hash_size=HASH_SIZE):
+    """Difference hash: one bit per horizontally adjacent pixel pair"""
+    import numpy as np
+    from PIL import Image
+
+    values = np.asarray(small_gray(image).resize((hash_size + 1, hash_size), Image.Resampling.BOX),
+                        dtype=np.int16)
+    bits = (values[:, 1:] > values[:, :-1]).ravel()
+    return int("".join("1" if bit else "0" for bit in bits), 2)
+
+
+def is_blank(image, ink_fraction=0.001):
+    """True when a page has (almost) no dark marks on it"""
+    import numpy as np
+
+    values = np.asarray(small_gray(image), dtype=np.int16)
+    ink = values < np.median(values) - 30
+    return ink.mean() < ink_fraction
+
+
+def distance(a, b):
+    return bin(a ^ b).count("1")
+
+
+class BKTree:
+    """Burkhard-Keller tree over Hamming distance"""
+
+    def __init__(self):
+        self.root = None  # [hash, keys, {distance: child}]
+
+    def add(self, value, key):
+        if self.root is None:
+            self.root = [value, [key], {}]
+            return
+        node = self.root
+        while True:
+            d = distance(value, node[0])
+            if d == 0:
+                node[1].append(key)
+                return
+            child = node[2].get(d)
+            if child is None:
+                node[2][d] = [value, [key], {}]
+                return
+            node = child
+
+    def search(self, value, radius):
+        """(distance, key) for every stored hash within `radius`, closest first"""
+        found = []
+        stack = [self.root] if self.root is not None else []
+        while stack:
+            node = stack.pop()
+            d = distance(value, node[0])
+            if d <= radius:
+                found.extend((d, key) for key in node[1])
+            # Triangle inequality: only children in [d - r, d + r] can match
+            for child_distance, child in node[2].items():
+                if d - radius <= child_distance <= d + radius:
+                    stack.append(child)
+        return sorted(found)
+
+
+class HashIndex:
+    """Per-quiz page hashes with a BK-tree for near-duplicate lookups"""
+
+    def __init__(self, paths, load=True):
+        self.path = os.path.join(paths.charts_dir, "hashes.json")
+        self.hashes = {}
+        self.tree = BKTree()
+        self.signature = None  # (mtime, size) of the file as last read or written
+        if load:
+            self.refresh()
+
+    def file_signature(self):
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def refresh(self):
+        """Rebuild from the file only if something else (e.g. a batch re-hash) rewrote it"""
+        signature = self.file_signature()
+        if signature == self.signature:
+            return
+        self.signature = signature
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                stored = json.load(f)
+        except (OSError, ValueError):
+            stored = {}
+        self.hashes = {}
+        self.tree = BKTree()
+        for name, value in stored.items():
+            self.hashes[name] = int(value, 16)
+            self.tree.add(self.hashes[name], name)
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({name: f"{value:064x}" for name, value in self.hashes.items()}, f, indent=1)
+        os.replace(tmp_path, self.path)
+        self.signature = self.file_signature()
+
+    def duplicates(self, value, radius=DUPLICATE_DISTANCE, exclude=()):
+        """Chart filenames whose hash is within `radius` bits of `value`"""
+        return [
+            (d, name) for d, name in self.tree.search(value, radius)
+            if name not in exclude and distance(value, self.hashes[name]) == d
+        ]
+
+    def add(self, name, value, save=True):
+        # A re-saved page keeps its old tree node; lookups check the current hash
+        self.hashes[name] = value
+        self.tree.add(value, name)
+        if save:
+            self.save()
+
+
+def check_page(image):
+    """(hash, blank) for a page, cheap enough to run on every scan"""
+    small = small_gray(image)
+    return dhash(small), is_blank(small)
+
+
+def hash_file(path):
+    from PIL import Image
+
+    with Image.open(path) as img:
+        return (path,) + check_page(img)
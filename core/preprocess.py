@@ -0,0 +1,196 @@
+"""Post-scan clean-up: deskew, crop margins, grayscale/bi-level and contrast.
+
+Charts straight off the scanner are full-colour, slightly rotated and mostly
+margin. Cleaning them makes the PNGs several times smaller and faster to
+decode. Work runs in a process pool, either for each live scan or as a batch
+over a quiz's charts directory:
+
+    python -m core preprocess QUIZ [--mode gray|bilevel|color] [--workers N]
+"""
+import os
+import shutil
+import tempfile
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+DEFAULTS = {
+    "mode": "gray",        # "gray", "bilevel" or "color"
+    "deskew": True,
+    "crop": True,
+    "autocontrast": True,
+    "max_angle": 3.0,      # degrees either way
+    "margin": 0.02,        # kept around the content, as a fraction of the page
+}
+CLEANED = "quiz-cleaned"  # PNG text chunk marking a chart this module has already cleaned
+
+
+def otsu_threshold(values):
+    """Otsu's threshold for an array of 8-bit grey values"""
+    import numpy as np
+
+    hist = np.bincount(values.ravel(), minlength=256).astype(np.float64)
+    total = hist.sum()
+    levels = np.arange(256)
+    weight_dark = np.cumsum(hist)
+    weight_light = total - weight_dark
+    mean_dark = np.cumsum(hist * levels)
+    mean_total = mean_dark[-1]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        between = (mean_total * weight_dark / total - mean_dark) ** 2 / (weight_dark * weight_light)
+    return int(np.nanargmax(between))
+
+
+def estimate_skew(gray, max_angle=3.0):
+    """Angle (degrees) that best lines text rows up, found on a thumbnail"""
+    import numpy as np
+    from PIL import Image
+
+    small = gray.copy()
+    small.thumbnail((800, 800))
+    values = np.asarray(small)
+    ink = Image.fromarray(((values < otsu_threshold(values)) * 255).astype(np.uint8))
+
+    def score(angle):
+        rows = np.asarray(ink.rotate(angle, resample=Image.Resampling.NEAREST)).sum(axis=1, dtype=np.float64)
+        return float(np.sum(np.diff(rows) ** 2))
+
+    # Coarse sweep, then refine around the best angle
+    best = max(np.arange(-max_angle, max_angle + 0.01, 0.5), key=score)
+    best = max(np.arange(best - 0.5, best + 0.51, 0.1), key=score)
+    return round(float(best), 2)
+
+
+def content_box(gray, margin=0.02):
+    """Bounding box of the ink on the page plus a margin, in full-size pixels"""
+    import numpy as np
+
+    small = gray.copy()
+    small.thumbnail((800, 800))
+    values = np.asarray(small)
+    ink = values < min(otsu_threshold(values), 200)
+
+    # Ignore the outermost 1% where scanner lids leave dark edges
+    edge_y, edge_x = max(1, ink.shape[0] // 100), max(1, ink.shape[1] // 100)
+    ink[:edge_y, :] = ink[-edge_y:, :] = False
+    ink[:, :edge_x] = ink[:, -edge_x:] = False
+
+    rows = np.flatnonzero(ink.any(axis=1))
+    cols = np.flatnonzero(ink.any(axis=0))
+    if not len(rows) or not len(cols):
+        return None
+
+    scale_x = gray.width / small.width
+    scale_y = gray.height / small.height
+    pad_x, pad_y = margin * gray.width, margin * gray.height
+    return (
+        max(0, int(cols[0] * scale_x - pad_x)),
+        max(0, int(rows[0] * scale_y - pad_y)),
+        min(gray.width, int((cols[-1] + 1) * scale_x + pad_x)),
+        min(gray.height, int((rows[-1] + 1) * scale_y + pad_y)),
+    )
+
+
+def preprocess(image, **options):
+    """Return a cleaned copy of a scanned page"""
+    import numpy as np
+    from PIL import Image, ImageOps
+
+    options = {**DEFAULTS, **options}
+    gray = image.convert("L")
+
+    if options["deskew"]:
+        angle = estimate_skew(gray, options["max_angle"])
+        if abs(angle) >= 0.1:
+            gray = gray.rotate(angle, resample=Image.Resampling.BICUBIC, expand=True, fillcolor=255)
+            if options["mode"] == "color":
+                image = image.convert("RGB").rotate(
+                    angle, resample=Image.Resampling.BICUBIC, expand=True, fillcolor="white"
+                )
+
+    if options["crop"]:
+        box = content_box(gray, options["margin"])
+        if box is not None:
+            gray = gray.crop(box)
+            if options["mode"] == "color":
+                image = image.crop(box)
+
+    if options["mode"] == "color":
+        result = image.convert("RGB")
+        return ImageOps.autocontrast(result, cutoff=1) if options["autocontrast"] else result
+
+    if options["autocontrast"]:
+        gray = ImageOps.autocontrast(gray, cutoff=1)
+
+    if options["mode"] == "bilevel":
+        threshold = otsu_threshold(np.asarray(gray))
+        return gray.point(lambda value: 255 if value > threshold else 0, mode="1")
+    return gray
+
+
+def process_file(path, backup_dir=None, **options):
+    """Clean one chart in place; returns (path, bytes before, bytes after)
+
+    A chart that is already cleaned is left as it is, so a page queued twice
+    is only processed once.
+    """
+    from PIL import Image
+
+    from core.images import save_chart
+
+    before = os.path.getsize(path)
+    with Image.open(path) as img:
+        if CLEANED in img.info:
+            return path, before, before
+        cleaned = preprocess(img, **options)
+        cleaned.info["dpi"] = img.info.get("dpi", (300, 300))
+
+    # Keep the first original only, a second run must not back up a cleaned page
+    if backup_dir:
+        backup_path = os.path.join(backup_dir, os.path.basename(path))
+        if not os.path.exists(backup_path):
+            os.makedirs(backup_dir, exist_ok=True)
+            shutil.copy2(path, backup_path)
+
+    # Write beside the original and swap, so readers never see half a file. The live
+    # pool and a batch run can clean the same page at once, so each has its own temp file.
+    fd, tmp_path = tempfile.mkstemp(suffix=".tmp", dir=os.path.dirname(path) or ".")
+    os.close(fd)
+    try:
+        save_chart(cleaned, tmp_path, text={CLEANED: options.get("mode", DEFAULTS["mode"])})
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return path, before, os.path.getsize(path)
+
+
+def process_many(paths, workers=None, backup_dir=None, **options):
+    """Clean many charts in a process pool, yielding results as they finish"""
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(process_file, path, backup_dir, **options): path for path in paths}
+        for future in as_completed(futures):
+            try:
+                yield future.result()
+            except Exception as e:
+                yield futures[future], e, None
+
+
+class LivePreprocessor:
+    """Background clean-up of charts as they are saved by scan.py"""
+
+    def __init__(self, workers=1, **options):
+        self.workers = workers
+        self.options = options
+        self.pool = None
+
+    def submit(self, path, callback=None, **options):
+        if self.pool is None:
+            self.pool = ProcessPoolExecutor(max_workers=self.workers)
+        future = self.pool.submit(process_file, path, **{**self.options, **options})
+        if callback is not None:
+            future.add_done_callback(callback)
+        return future
+
+    def shutdown(self):
+        if self.pool is not None:
+            self.pool.shutdown(wait=True)
+            self.pool = None
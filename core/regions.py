@@ -0,0 +1,29 @@
+"""Named page regions per quiz (`quiz-N regions.json`), e.g. where question 3 sits.
+
+Boxes are stored as page fractions `[left, top, right, bottom]` so they apply to
+scans of any resolution, followed by the page number for regions past page 1.
+Loaded regions are always `(left, top, right, bottom, page)`.
+"""
+import json
+import os
+
+
+def load_regions(path):
+    try:
+        with open(path, encoding="utf-8") as f:
+            regions = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    return {
+        name: tuple(box[:4]) + (int(box[4]) if len(box) == 5 else 1,)
+        for name, box in regions.items() if len(box) in (4, 5)
+    }
+
+
+def save_regions(path, regions):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({
+            name: [round(v, 4) for v in box[:4]] + ([box[4]] if len(box) == 5 and box[4] != 1 else [])
+            for name, box in regions.items()
+        }, f, indent=2)
@@ -0,0 +1,111 @@
+"""Student lists: the master roster sheet and each quiz's students CSV."""
+import os
+
+from core.csvfile import CsvFile, atomic_write
+from core.paths import MASTER_SHEET
+
+STUDENT_COLUMNS = ["id", "name", "grade", "validated"]
+
+
+def id_key(value):
+    """Normalise an ID the way the master sheet stores it ("123" -> "123.0")"""
+    try:
+        return str(float(value))
+    except (TypeError, ValueError):
+        return str(value).strip()
+
+
+def id_order(value):
+    """Sort key putting numeric IDs in numeric order, before any non-numeric ones"""
+    try:
+        return 0, float(value), ""
+    except (TypeError, ValueError):
+        return 1, 0.0, str(value)
+
+
+def load_master(path=MASTER_SHEET):
+    """Map of normalised student number -> name from the master spreadsheet"""
+    import pandas as pd
+
+    master_sheet = pd.read_excel(path, sheet_name="quizzes")
+    return dict(zip(master_sheet['number'].map(id_key), master_sheet['name']))
+
+
+def read_students(source, required=False):
+    """Read a quiz's students CSV; an unreadable file gives an empty table unless required
+
+    Pass a CsvFile rather than a path to save changes back through it later.
+    """
+    import pandas as pd
+
+    csv_file = source if isinstance(source, CsvFile) else CsvFile(source)
+    try:
+        return csv_file.read()
+    except (OSError, ValueError):
+        if required:
+            raise
+        return pd.DataFrame(columns=STUDENT_COLUMNS)
+
+
+def create_students(path, columns=STUDENT_COLUMNS):
+    """Write an empty students CSV if there is none yet; returns True if created"""
+    import pandas as pd
+
+    if os.path.exists(path):
+        return False
+    atomic_write(path, pd.DataFrame(columns=columns))
+    return True
+
+
+def write_records(csv_file, records):
+    """Save a list of student dicts through a CsvFile, returning the records as saved"""
+    import pandas as pd
+
+    if not records:
+        return records
+    return csv_file.write(pd.DataFrame(records)).to_dict('records')
+
+
+def add_attendance(students, attendance_ids):
+    """Append unvalidated rows for attendance IDs not yet in the students table"""
+    import pandas as pd
+
+    existing_ids = set(students['id'].astype(str))
+    new_ids = sorted(set(attendance_ids) - existing_ids)
+    if not new_ids:
+        return students
+
+    new_students = pd.DataFrame({
+        "id": new_ids,
+        "name": "",
+        "grade": "",
+        "validated": False
+    })
+    return pd.concat([students, new_students], ignore_index=True)
+
+
+def apply_master_names(students, master):
+    """Overwrite names for every student found in the master roster"""
+    names = students['id'].map(lambda student_id: master.get(id_key(student_id)))
+    found = names.notna()
+    if found.any():
+        students['name'] = students['name'].astype(object)
+        students.loc[found, 'name'] = names[found]
+    return students
+
+
+def update_student(path, student_id, **values):
+    """Set columns for one student in a students/grading CSV; returns False if not found"""
+    csv_file = CsvFile(path)
+    student_df = csv_file.read()
+    csv_file.key = 'id' if 'id' in student_df.columns else 'student_id'
+    mask = student_df[csv_file.key] == student_id
+    if not mask.any():
+        return False
+
+    for column, value in values.items():
+        if column in student_df.columns and student_df[column].dtype != object:
+            student_df[column] = student_df[column].astype(object)
+        student_df.loc[mask, column] = value
+    csv_file.write(student_df)
+    return True
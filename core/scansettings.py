@@ -0,0 +1,88 @@
+"""Per-quiz scanner settings: resolution, colour depth and preview mode.
+
+Stored in `feedback/quiz-N scan.json`. A quiz of handwritten charts rarely
+needs more than 200 dpi grayscale, which scans several times faster and
+saves pages a fraction of the size of the scanner's full-resolution colour.
+With `preview` on, `scan.py` first takes a quick low-resolution scan to
+check the page is straight, and only captures the full page when it is saved.
+"""
+import json
+import os
+
+# Name -> (dpi, PIL mode); None keeps the scanner's own (highest) settings
+PROFILES = {
+    "Scanner maximum": (None, None),
+    "300 dpi colour": (300, "RGB"),
+    "300 dpi gray": (300, "L"),
+    "200 dpi gray": (200, "L"),
+    "150 dpi gray": (150, "L"),
+    "200 dpi black & white": (200, "1"),
+}
+DEFAULT_PROFILE = "Scanner maximum"
+PREVIEW_DPI = 75
+A4_INCHES = (8.27, 11.69)
+
+DEFAULTS = {"profile": DEFAULT_PROFILE, "preview": False}
+
+
+def load(path):
+    try:
+        with open(path, encoding="utf-8") as f:
+            settings = {**DEFAULTS, **json.load(f)}
+    except (OSError, ValueError):
+        settings = dict(DEFAULTS)
+    if settings["profile"] not in PROFILES:
+        settings["profile"] = DEFAULT_PROFILE
+    return settings
+
+
+def save(path, settings):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(settings, f, indent=1)
+    os.replace(tmp_path, path)
+
+
+def cleanup_mode(profile):
+    """Scan clean-up mode that keeps a profile's colour depth"""
+    mode = PROFILES.get(profile, (None, None))[1]
+    return {"RGB": "color", "1": "bilevel"}.get(mode, "gray")
+
+
+def conform(image, dpi, mode):
+    """Bring a scan down to the target dpi and mode if the scanner returned more"""
+    from PIL import Image
+
+    if dpi is not None:
+        width = round(A4_INCHES[0] * dpi)
+        if image.width > width * 1.05:
+            height = round(image.height * width / image.width)
+            factor = image.width // width
+            if factor > 1:
+                image = image.reduce(factor)
+            if image.width != width:
+                image = image.resize((width, height), Image.Resampling.LANCZOS)
+    if mode == "1":
+        image = image.convert("L").point(lambda value: 255 if value > 160 else 0, mode="1")
+    elif mode is not None and image.mode != mode:
+        image = image.convert(mode)
+    if dpi is not None:
+        image.info["dpi"] = (dpi, dpi)
+    return image
+
+
+def capture(scan_side, device, dpi=None, mode=None):
+    """Scan one page at `dpi` and `mode` (None: the scanner's maximum)
+
+    The settings go to wia_scan as a scan profile. Versions of wia_scan that
+    don't take one scan at their default, and the page is then reduced here.
+    """
+    if dpi is None:
+        return scan_side(device=device)
+    profile = {"dpi": dpi, "mode": "RGB" if mode == "RGB" else "L", "brightness": 0, "contrast": 0}
+    try:
+        image = scan_side(device=device, scan_profile=profile)
+    except TypeError:
+        image = scan_side(device=device)
+    return conform(image, dpi, mode)
@@ -0,0 +1,150 @@
+"""Lightweight timing telemetry shared by the grading tools.
+
+Records are JSON lines written to a small rotating log. Summarise them with:
+
+    python -m core.telemetry [--log PATH] [--since HOURS]
+"""
+import argparse
+import functools
+import getpass
+import json
+import logging
+import math
+import os
+import time
+from logging.handlers import RotatingFileHandler
+
+LOG_PATH = os.environ.get("QUIZ_TELEMETRY_LOG", os.path.join("their data", "telemetry.log"))
+ENABLED = os.environ.get("QUIZ_TELEMETRY", "1") != "0"
+GRADER = os.environ.get("QUIZ_GRADER") or getpass.getuser()
+
+_logger = None
+
+
+def get_logger():
+    global _logger
+    if _logger is None:
+        _logger = logging.getLogger("quiz.telemetry")
+        _logger.setLevel(logging.INFO)
+        _logger.propagate = False
+        try:
+            os.makedirs(os.path.dirname(LOG_PATH) or ".", exist_ok=True)
+            handler = RotatingFileHandler(LOG_PATH, maxBytes=2_000_000, backupCount=3, encoding="utf-8")
+            handler.setFormatter(logging.Formatter("%(message)s"))
+            _logger.addHandler(handler)
+        except OSError:
+            _logger.addHandler(logging.NullHandler())
+    return _logger
+
+
+def record(name, seconds, **fields):
+    """Append one timing record; never lets telemetry break the caller"""
+    if not ENABLED:
+        return
+    try:
+        entry = {"ts": round(time.time(), 3), "name": name, "ms": round(seconds * 1000, 3), "grader": GRADER}
+        entry.update(fields)
+        get_logger().info(json.dumps(entry, default=str))
+    except Exception:
+        pass
+
+
+def timed(name):
+    """Decorator timing each call of a hot path under `name`"""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                record(name, time.perf_counter() - start)
+        return wrapper
+    return decorator
+
+
+class Timer:
+    """Context manager for timing a block: `with Timer("scan.display"): ...`"""
+
+    def __init__(self, name, **fields):
+        self.name = name
+        self.fields = fields
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        record(self.name, time.perf_counter() - self.start, **self.fields)
+        return False
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    rank = max(0, min(len(ordered) - 1, math.ceil(pct / 100 * len(ordered)) - 1))
+    return ordered[rank]
+
+
+def read_records(log_path=LOG_PATH, since=None):
+    # Oldest rotated file first so records come out in time order
+    paths = [f"{log_path}.{n}" for n in range(3, 0, -1)] + [log_path]
+    for path in paths:
+        if not os.path.exists(path):
+            continue
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue
+                if since is None or entry.get("ts", 0) >= since:
+                    yield entry
+
+
+def summarise(records):
+    """Return (latency rows, per-grader throughput rows) for a set of records"""
+    durations = {}
+    grading = {}
+    for entry in records:
+        durations.setdefault(entry["name"], []).append(entry["ms"])
+        if entry["name"] == "grade.time_to_grade":
+            grading.setdefault(entry.get("grader", "?"), []).append(entry["ms"] / 1000)
+
+    latency = [
+        (name, len(values), percentile(values, 50), percentile(values, 95))
+        for name, values in sorted(durations.items())
+    ]
+    throughput = [
+        (grader, len(seconds), 3600 * len(seconds) / sum(seconds) if sum(seconds) else 0.0)
+        for grader, seconds in sorted(grading.items())
+    ]
+    return latency, throughput
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Summarise grading session telemetry")
+    parser.add_argument("--log", default=LOG_PATH, help="telemetry log to read")
+    parser.add_argument("--since", type=float, help="only include the last N hours")
+    args = parser.parse_args()
+
+    since = time.time() - args.since * 3600 if args.since else None
+    latency, throughput = summarise(read_records(args.log, since))
+
+    if not latency:
+        print(f"No telemetry records in {args.log}")
+        return
+
+    print(f"{'operation':<32} {'count':>7} {'p50 ms':>10} {'p95 ms':>10}")
+    for name, count, p50, p95 in latency:
+        print(f"{name:<32} {count:>7} {p50:>10.1f} {p95:>10.1f}")
+
+    if throughput:
+        print(f"\n{'grader':<20} {'scripts':>8} {'scripts/hour':>13}")
+        for grader, count, rate in throughput:
+            print(f"{grader:<20} {count:>8} {rate:>13.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""Tiled, multi-resolution rendering of large page images.
+
+Instead of resampling the whole page for every zoom step, the page is kept as
+a small pyramid of 2x box-reduced levels and only the display tiles that are
+actually visible are cut from the nearest level and resized. Rendered tiles
+live in a bounded LRU cache, so memory does not grow with the zoom factor.
+"""
+import math
+from collections import OrderedDict
+
+TILE_SIZE = 512
+
+
+class TiledImage:
+    def __init__(self, image, tile_size=TILE_SIZE, max_tiles=48, min_side=256):
+        self.tile_size = tile_size
+        self.max_tiles = max_tiles
+        self.size = image.size
+        self.levels = [image]
+        # Box reduction is cheap and gives clean downscales for the coarse levels
+        while max(self.levels[-1].size) > min_side * 2:
+            self.levels.append(self.levels[-1].reduce(2))
+        self.tiles = OrderedDict()
+
+    def display_size(self, zoom):
+        return max(1, int(self.size[0] * zoom)), max(1, int(self.size[1] * zoom))
+
+    def level_for(self, zoom):
+        """Coarsest level that still has at least `zoom` resolution"""
+        if zoom >= 1:
+            return 0
+        return min(len(self.levels) - 1, int(math.floor(math.log2(1 / zoom))))
+
+    def grid(self, zoom):
+        width, height = self.display_size(zoom)
+        return math.ceil(width / self.tile_size), math.ceil(height / self.tile_size)
+
+    def visible(self, zoom, left, top, right, bottom):
+        """(col, row) of every tile overlapping the display-space box"""
+        cols, rows = self.grid(zoom)
+        first_col = max(0, int(left // self.tile_size))
+        first_row = max(0, int(top // self.tile_size))
+        last_col = min(cols - 1, int(right // self.tile_size))
+        last_row = min(rows - 1, int(bottom // self.tile_size))
+        return [
+            (col, row)
+            for row in range(first_row, last_row + 1)
+            for col in range(first_col, last_col + 1)
+        ]
+
+    def tile(self, zoom, col, row, fast=False):
+        """Render (or fetch) one display tile; `fast` trades quality for speed"""
+        from PIL import Image
+
+        # A high quality tile is always acceptable, a fast one only when asked for
+        keys = [(round(zoom, 4), col, row, False)]
+        if fast:
+            keys.append((round(zoom, 4), col, row, True))
+        for key in keys:
+            if key in self.tiles:
+                self.tiles.move_to_end(key)
+                return self.tiles[key]
+
+        width, height = self.display_size(zoom)
+        left, top = col * self.tile_size, row * self.tile_size
+        right, bottom = min(width, left + self.tile_size), min(height, top + self.tile_size)
+
+        # Map the display box back onto the chosen pyramid level
+        level = self.levels[self.level_for(zoom)]
+        scale_x = level.width / width
+        scale_y = level.height / height
+        box = (left * scale_x, top * scale_y, right * scale_x, bottom * scale_y)
+        resample = Image.Resampling.BILINEAR if fast else Image.Resampling.LANCZOS
+        tile = level.resize((right - left, bottom - top), resample, box=box)
+
+        self.tiles[keys[-1]] = tile
+        while len(self.tiles) > self.max_tiles:
+            self.tiles.popitem(last=False)
+        return tile
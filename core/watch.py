@@ -0,0 +1,123 @@
+"""Watching a quiz directory for changes made by other tools and stations.
+
+`QuizWatcher` turns file changes into small events that a GUI can apply
+without reloading everything:
+
+    ("attendance", [new IDs])  lines appended to the attendance list
+    ("chart", path)            a chart page was saved or replaced
+    ("students", path)         students.csv changed
+    ("grading", path)          grading.csv changed
+
+It uses watchdog (inotify, FSEvents or ReadDirectoryChangesW) when it is
+installed and otherwise polls. Events are queued from a background thread;
+GUIs drain them with `poll()` from the Tk event loop. A tool's own writes
+are hidden by calling `ignore(path)` straight after saving.
+"""
+import os
+import queue
+import threading
+
+from core.attendance import AttendanceStore
+
+
+class QuizWatcher:
+    def __init__(self, paths, interval=1.0):
+        self.paths = paths
+        self.interval = interval
+        self.events = queue.Queue()
+        self.attendance = AttendanceStore(paths.attendance)
+        self.seen = {}  # path -> (mtime, size) last reported or ignored
+        self.lock = threading.Lock()
+        self.stop_event = threading.Event()
+        self.observer = None
+        self.thread = None
+
+    def start(self):
+        """Begin watching; existing files are taken as already seen"""
+        self.attendance.refresh()
+        for path in self.snapshot():
+            self.seen[os.path.normpath(path)] = self.stat(path)
+        try:
+            self.observer = self.start_watchdog()
+        except (ImportError, OSError):
+            self.thread = threading.Thread(target=self.poll_loop, daemon=True)
+            self.thread.start()
+        return self
+
+    def stop(self):
+        self.stop_event.set()
+        if self.observer is not None:
+            self.observer.stop()
+            self.observer = None
+
+    def start_watchdog(self):
+        from watchdog.events import FileSystemEventHandler
+        from watchdog.observers import Observer
+
+        watcher = self
+
+        class Handler(FileSystemEventHandler):
+            def on_any_event(self, event):
+                if not event.is_directory:
+                    watcher.changed(getattr(event, "dest_path", "") or event.src_path)
+
+        observer = Observer()
+        observer.schedule(Handler(), self.paths.quiz_dir, recursive=True)
+        observer.start()
+        return observer
+
+    def poll_loop(self):
+        while not self.stop_event.wait(self.interval):
+            for path in self.snapshot():
+                self.changed(path)
+
+    def snapshot(self):
+        """Every file the watcher cares about"""
+        paths = [self.paths.attendance, self.paths.students_csv, self.paths.grading_csv]
+        try:
+            with os.scandir(self.paths.charts_dir) as entries:
+                paths.extend(entry.path for entry in entries if entry.name.endswith(".png"))
+        except OSError:
+            pass
+        return paths
+
+    @staticmethod
+    def stat(path):
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        return stat.st_mtime, stat.st_size
+
+    def ignore(self, path):
+        """Don't report the file's current state, e.g. after the tool itself saved it"""
+        with self.lock:
+            self.seen[os.path.normpath(path)] = self.stat(path)
+
+    def changed(self, path):
+        path = os.path.normpath(path)
+        state = self.stat(path)
+        with self.lock:
+            if state is None or self.seen.get(path) == state:
+                return
+            self.seen[path] = state
+
+            if path == os.path.normpath(self.paths.attendance):
+                new_ids = self.attendance.refresh()
+                if new_ids:
+                    self.events.put(("attendance", new_ids))
+            elif path == os.path.normpath(self.paths.students_csv):
+                self.events.put(("students", path))
+            elif path == os.path.normpath(self.paths.grading_csv):
+                self.events.put(("grading", path))
+            elif os.path.dirname(path) == os.path.normpath(self.paths.charts_dir) and path.endswith(".png"):
+                self.events.put(("chart", path))
+
+    def poll(self):
+        """Events queued since the last call, oldest first"""
+        events = []
+        while True:
+            try:
+                events.append(self.events.get_nowait())
+            except queue.Empty:
+                return events
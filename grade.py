@@ -1,15 +1,31 @@
 import tkinter as tk
 from tkinter import ttk, messagebox, simpledialog
-from PIL import Image, ImageTk
-import pandas as pd
 import os
-import numpy as np
+import time
+
+from core import roster, telemetry
+from core.analysis import ItemAnalysis, concerns, sparkline
+from core.annotations import mark_label, sidecar_path
+from core.comments import CommentBank
+from core.doublemark import compare, read_layer
+from core.drift import DriftMonitor, EditLog, read_sample
+from core.crops import LiveCropper, crop_file, crop_jobs, crop_path, is_fresh
+from core.grading import GradingStore
+from core.images import ChartCache
+from core.markscheme import Markscheme, grade_text
+from core.pages import PageIndex
+from core.pagestore import PageStore
+from core.paths import QuizPaths
+from core.watch import QuizWatcher
+from viewer import AnnotationLayer, PageBar, RegionBar, TiledViewer
 
 
 class QuizMarker:
     def __init__(self, root):
         self.root = root
-        self.root.title("Quiz Marker")
+        # A second marker for moderation writes to their own grading layer
+        self.second_marker = os.environ.get("QUIZ_SECOND_MARKER", "").strip() not in ("", "0")
+        self.root.title("Quiz Marker (second marker)" if self.second_marker else "Quiz Marker")
         self.root.attributes('-fullscreen', True)
         self.root.configure(bg="#f0f2f5")
 
@@ -27,16 +43,39 @@ class QuizMarker:
 
         # Variables
         self.quiz_number = None
+        self.paths = None
+        self.page_index = None
         self.student_data = None
+        self.student_ids = []  # IDs in student list order
         self.markscheme = None
-        self.grading_data = None
+        self.grading = None
+        self.analysis = None  # Item analysis of the criteria, updated as marks are saved
+        self.edit_log = None  # Every save, with its time and grader, for drift checks
+        self.drift = None
         self.current_student = None
-        self.current_image = None
-        self.bonus_criteria = set()  # Track which criteria are bonus
+        self.chart_cache = ChartCache()
+        self.comment_bank = CommentBank()
+        self.save_job = None  # Pending debounced save
+        self.criteria_order = []  # Criteria in markscheme order
+        self.criteria_by_key = {}
+        self.rapid_criteria = []  # Criteria in the rapid grid: all, or one question's
+        self.question_section = None  # Section being marked across the cohort, if any
+        self.cropper = LiveCropper()
+        self.rapid_mode = False
+        self.rapid_rows = []  # Pre-allocated (label, entry) pool for rapid marking
+        self.rapid_text = None  # Focused rapid entry's text as of the last key
+        self.script_started = None
+        self.script_times = []  # Seconds spent per script in rapid mode
+        self.watcher = None
+        self.watch_job = None
+        self.reconcile = None  # While reconciling: student ID (text) -> {criterion key: (first, second)}
+        self.second_labels = {}  # Criterion key -> label showing the second marker's mark
 
         # Setup UI
         self.setup_ui()
         self.root.bind("<Escape>", lambda e: self.root.attributes('-fullscreen', False))
+        self.root.bind("<Prior>", lambda e: self.page_bar.previous())
+        self.root.bind("<Next>", lambda e: self.page_bar.next())
 
     def setup_ui(self):
         # Main container
@@ -49,7 +88,7 @@ class QuizMarker:
 
         tk.Label(
             header_frame,
-            text="Quiz Marker",
+            text="Quiz Marker (second marker)" if self.second_marker else "Quiz Marker",
             font=self.title_font,
             bg="#f0f2f5",
             fg="#333333"
@@ -88,6 +127,35 @@ class QuizMarker:
         )
         self.load_btn.pack(side=tk.LEFT)
 
+        self.rapid_btn = tk.Button(
+            header_frame,
+            text="Rapid Mode",
+            command=self.toggle_rapid_mode,
+            bg="#2196F3",
+            fg="white",
+            **button_style
+        )
+        self.rapid_btn.pack(side=tk.RIGHT, padx=10)
+
+        # Students the two markers disagree on, for moderation
+        self.reconcile_btn = tk.Button(
+            header_frame,
+            text="Reconcile",
+            command=self.toggle_reconcile,
+            bg="#9C27B0",
+            fg="white",
+            **button_style
+        )
+        if not self.second_marker:
+            self.reconcile_btn.pack(side=tk.RIGHT, padx=10)
+
+        # Mark one question for every student instead of script by script
+        self.mark_by = ttk.Combobox(header_frame, state="readonly", font=self.custom_font, width=16,
+                                    values=["Whole script"])
+        self.mark_by.set("Whole script")
+        self.mark_by.bind("<<ComboboxSelected>>", self.set_mark_by)
+        self.mark_by.pack(side=tk.RIGHT, padx=10)
+
         # Fullscreen toggle
         tk.Button(
             header_frame,
@@ -114,7 +182,18 @@ class QuizMarker:
         self.flowchart_frame = tk.Frame(self.paned_window, bg="#e0e0e0")
         self.paned_window.add(self.flowchart_frame, minsize=300, width=int(self.root.winfo_screenwidth() / 3))
 
+        # Zoomable chart: wheel to zoom, drag to pan, double-click to fit
         self.canvas = tk.Canvas(self.flowchart_frame, bg="white")
+        self.viewer = TiledViewer(self.canvas)
+        self.viewer.bind_mouse()
+        self.region_bar = RegionBar(self.flowchart_frame, self.viewer, self.custom_font)
+        self.page_bar = PageBar(self.flowchart_frame, self.viewer, self.chart_cache, self.custom_font)
+        self.region_bar.page_bar = self.page_bar
+
+        # Ticks, crosses and marks drawn over the chart, saved beside it
+        self.annotation_layer = AnnotationLayer(self.flowchart_frame, self.viewer, self.custom_font)
+        self.annotation_layer.page_bar = self.page_bar
+        self.annotation_layer.mark_text = self.mark_text
         self.canvas.pack(expand=True, fill=tk.BOTH)
 
         # Middle pane - Marking scheme (1/3 width)
@@ -134,6 +213,10 @@ class QuizMarker:
         )
 
         self.marking_canvas.create_window((0, 0), window=self.scrollable_frame, anchor="nw")
+
+        # Compact grid for rapid marking, kept across quiz loads
+        self.rapid_frame = tk.Frame(self.scrollable_frame, bg="#f0f2f5")
+        self.rapid_frame.grid_columnconfigure(0, weight=1)
         self.marking_canvas.configure(yscrollcommand=self.scrollbar.set)
 
         self.marking_canvas.pack(side="left", fill="both", expand=True)
@@ -216,36 +299,50 @@ class QuizMarker:
             messagebox.showerror("Error", "Please enter a valid quiz number")
             return
 
-        self.quiz_number = quiz_num
-        base_dir = "their data"
-        quiz_dir = os.path.join(base_dir, f"quiz {self.quiz_number}")
-        feedback_dir = os.path.join(quiz_dir, "feedback")
-        students_csv = os.path.join(feedback_dir, f"quiz-{self.quiz_number} students.csv")
-        markscheme_path = os.path.join(feedback_dir, f"quiz-{self.quiz_number} markscheme.txt")
-        grading_path = os.path.join(feedback_dir, f"quiz-{self.quiz_number} grading.csv")
+        # Land any pending edit in the quiz it was made in before switching
+        if self.save_job is not None:
+            self.update_grading_data()
+        self.current_student = None
 
-        # Create directories if needed
-        os.makedirs(feedback_dir, exist_ok=True)
+        self.quiz_number = quiz_num
+        self.paths = QuizPaths(self.quiz_number, second_marker=self.second_marker).ensure()
+        self.reconcile = None
+        self.reconcile_btn.config(text="Reconcile")
 
         # Load markscheme first
         try:
-            with open(markscheme_path, 'r') as f:
-                self.markscheme = [line.strip() for line in f if line.strip()]
+            self.markscheme = Markscheme.load(self.paths.markscheme)
         except Exception as e:
             messagebox.showerror("Error", f"Could not load markscheme: {str(e)}")
             return
 
         # Then load student data
         try:
-            self.student_data = pd.read_csv(students_csv)
+            self.student_data = roster.read_students(self.paths.students_csv, required=True)
             # Only show validated students
             validated_students = self.student_data[self.student_data['validated'] == True]
+            # A second marker only gets the moderation sample, when one has been drawn
+            sample = read_sample(self.paths.moderation) if self.second_marker else None
+            if sample is not None:
+                validated_students = validated_students[validated_students['id'].astype(str).isin(sample)]
         except Exception as e:
             messagebox.showerror("Error", f"Could not load student data: {str(e)}")
             return
 
         # Initialize grading data (now that markscheme is loaded)
-        self.init_grading_data(grading_path)
+        self.grading = GradingStore.open(self.paths.grading_csv, self.markscheme, list(validated_students['id']))
+        self.analysis = ItemAnalysis.from_store(self.markscheme, self.grading)
+        self.edit_log = EditLog(self.paths.edit_log)
+        self.drift = DriftMonitor(self.markscheme)
+        self.drift.feed(self.edit_log.read_new())
+
+        # Zoom presets and page manifest for this quiz
+        self.region_bar.load(self.paths.regions)
+        self.page_index = PageIndex(self.paths)
+        self.chart_cache.store = PageStore.open(self.paths)
+
+        # Build the comment bank from feedback across all quizzes
+        self.comment_bank = CommentBank.from_quizzes(self.paths.base_dir)
 
         # Load student list
         self.load_student_list(validated_students)
@@ -256,39 +353,103 @@ class QuizMarker:
         # Update stats
         self.update_stats()
 
+        # Pick up newly validated students, new pages and other graders' saves
+        if self.watcher is not None:
+            self.watcher.stop()
+        self.watcher = QuizWatcher(self.paths).start()
+        if self.watch_job is None:
+            self.watch_job = self.root.after(500, self.apply_watch_events)
+
         self.status_bar.config(text=f"Quiz {self.quiz_number} loaded")
 
     def load_student_list(self, students_df):
         self.student_list.delete(0, tk.END)
+        self.student_ids = []
+        self.append_students(students_df)
 
-        for _, row in students_df.iterrows():
-            display_text = f"{row['id']} | {row['name']}"
-            self.student_list.insert(tk.END, display_text)
-
-            # Check grading data to determine if student is graded
-            student_id = row['id']
-            graded = False
+    def append_students(self, students_df):
+        graded_ids = self.grading.graded_ids() if self.grading is not None else set()
 
-            # Look up in grading data (if available)
-            if self.grading_data is not None:
-                student_grading = self.grading_data[self.grading_data['student_id'] == student_id]
-                if not student_grading.empty:
-                    graded = student_grading['graded'].values[0] == True
+        for student_id, name in zip(students_df['id'], students_df['name']):
+            self.student_ids.append(student_id)
+            display_text = f"{student_id} | {name}"
+            self.student_list.insert(tk.END, display_text)
 
             # Color graded entries green
-            if graded:
+            if student_id in graded_ids:
                 self.student_list.itemconfig(tk.END, {'bg': '#599e66'})  # green
             else:
                 self.student_list.itemconfig(tk.END, {'bg': 'white'})  # Ensure non-graded are white
 
+    def apply_watch_events(self):
+        """Apply changes made by validation, scanning or other graders since the last check"""
+        self.watch_job = self.root.after(500, self.apply_watch_events)
+        if self.watcher is None:
+            return
+
+        for kind, value in self.watcher.poll():
+            if kind == "students":
+                self.add_validated_students()
+            elif kind == "grading":
+                if self.save_job is not None:
+                    # Let our own pending edit land first
+                    self.watcher.events.put((kind, value))
+                    continue
+                self.reload_grading()
+            elif kind == "chart":
+                self.page_index = PageIndex(self.paths)
+                if self.current_student is not None and value in self.page_index.pages(self.current_student):
+                    self.load_student_chart(self.current_student)
+
+    @telemetry.timed("grade.add_validated_students")
+    def add_validated_students(self):
+        """Append students validated since the list was loaded"""
+        self.student_data = roster.read_students(self.paths.students_csv, required=True)
+        validated = self.student_data[self.student_data['validated'] == True]
+        known = set(self.student_ids)
+        new_students = validated[~validated['id'].isin(known)]
+        if new_students.empty:
+            return
+
+        if self.second_marker and read_sample(self.paths.moderation) is not None:
+            return  # Only the moderation sample is second marked
+        if self.grading.add_students(list(new_students['id'])):
+            self.save_grading()
+        if self.reconcile is None:
+            self.append_students(new_students)
+        self.status_bar.config(text=f"{len(new_students)} newly validated student(s) added")
+
+    @telemetry.timed("grade.reload_grading")
+    def reload_grading(self):
+        """Re-read grading.csv after another grader saved it"""
+        self.grading = GradingStore.open(self.paths.grading_csv, self.markscheme, self.student_ids)
+        self.analysis = ItemAnalysis.from_store(self.markscheme, self.grading)
+        self.drift.feed(self.edit_log.read_new())
+        self.watcher.ignore(self.paths.grading_csv)
+        graded_ids = self.grading.graded_ids()
+        for idx, student_id in enumerate(self.student_ids):
+            self.student_list.itemconfig(idx, {'bg': '#599e66' if student_id in graded_ids else 'white'})
+        if self.current_student is not None:
+            self.fill_criteria_entries()
+        self.update_stats()
+
+    def save_grading(self):
+        self.grading.save()
+        if self.watcher is not None:
+            self.watcher.ignore(self.paths.grading_csv)
+
     def process_markscheme(self):
-        # Clear existing widgets
+        # Clear existing widgets (the rapid marking pool is reused)
         for widget in self.scrollable_frame.winfo_children():
-            widget.destroy()
+            if widget is not self.rapid_frame:
+                widget.destroy()
 
         self.section_widgets = {}
         self.criteria_entries = {}
-        self.bonus_criteria = set()  # Reset bonus criteria
+        self.section_entries = {}
+        self.criteria_order = []
+        self.criteria_by_key = {}
+        self.second_labels = {}
 
         # Create feedback text box
         tk.Label(
@@ -305,7 +466,23 @@ class QuizMarker:
             wrap=tk.WORD
         )
         self.feedback_text.pack(fill=tk.X, padx=5, pady=(0, 10))
-        self.feedback_text.bind("<KeyRelease>", self.update_grading_data)
+        self.feedback_text.bind("<KeyRelease>", self.on_feedback_key)
+        self.feedback_text.bind("<Tab>", lambda e: self.insert_suggestion(0))
+        for n in range(1, 6):
+            self.feedback_text.bind(f"<Control-Key-{n}>", lambda e, i=n - 1: self.insert_suggestion(i))
+
+        # Comment bank completions (hidden until there is something to suggest)
+        self.suggestion_list = tk.Listbox(
+            self.scrollable_frame,
+            height=5,
+            font=self.custom_font,
+            bg="white",
+            fg="#555555",
+            activestyle="none"
+        )
+        self.suggestion_list.bind("<Double-Button-1>", lambda e: self.insert_suggestion(
+            self.suggestion_list.nearest(e.y)))
+        self.suggestions = []
 
         # Add grade display
         self.grade_display = tk.Label(
@@ -317,13 +494,7 @@ class QuizMarker:
         self.grade_display.pack(anchor="w", pady=(0, 20))
 
         # Process each section in markscheme
-        for line in self.markscheme:
-            if ":" not in line:
-                continue
-
-            section_name, criteria_str = line.split(":", 1)
-            criteria_pairs = [c.split(",") for c in criteria_str.split(";") if c]
-
+        for section_name, section_criteria in self.markscheme.sections:
             # Create main section frame
             section_frame = tk.Frame(self.scrollable_frame, bg="#f0f2f5")
             section_frame.pack(fill=tk.X, pady=(10, 0))
@@ -346,29 +517,25 @@ class QuizMarker:
 
             # Store widgets for later access
             self.section_widgets[section_name] = {
+                'container': section_frame,
                 'button': toggle_btn,
                 'frame': criteria_frame,
                 'visible': False
             }
 
             # Add criteria entries to the nested frame
-            for max_mark, criteria in criteria_pairs:
-                is_bonus = criteria.endswith("*")
-                if is_bonus:
-                    criteria = criteria[:-1]  # Remove the *
-                    self.bonus_criteria.add(f"{section_name}_{criteria}")
-
+            for criterion in section_criteria:
                 crit_frame = tk.Frame(criteria_frame, bg="#f0f2f5")
                 crit_frame.pack(fill=tk.X, padx=5, pady=2)
 
                 tk.Label(
                     crit_frame,
-                    text=f"{criteria} (max {max_mark}){' [BONUS]' if is_bonus else ''}:",
+                    text=f"{criterion.name} (max {criterion.max_mark:g}){' [BONUS]' if criterion.bonus else ''}:",
                     font=self.custom_font,
                     bg="#f0f2f5",
                     width=60,
                     anchor="w",
-                    fg="#FF9800" if is_bonus else "black"
+                    fg="#FF9800" if criterion.bonus else "black"
                 ).pack(side=tk.LEFT)
 
                 entry = tk.Entry(
@@ -378,13 +545,44 @@ class QuizMarker:
                 )
                 entry.pack(side=tk.LEFT, padx=5)
                 entry.bind("<KeyRelease>", self.update_grading_data)
+                entry.bind("<FocusIn>", lambda e, c=criterion: self.focus_criterion(c))
+
+                # The second marker's mark, shown while reconciling
+                second_label = tk.Label(crit_frame, font=self.custom_font, bg="#f0f2f5", fg="#9C27B0")
+                second_label.pack(side=tk.LEFT, padx=5)
+                self.second_labels[criterion.key] = second_label
 
                 # Store entry for later access
-                self.criteria_entries[f"{section_name}_{criteria}"] = entry
+                self.criteria_entries[criterion.key] = entry
+                self.criteria_order.append(criterion)
+                self.criteria_by_key[criterion.key] = criterion
 
             # Hide criteria by default
             criteria_frame.pack_forget()
 
+        self.section_entries = self.criteria_entries
+        self.question_section = None
+        self.rapid_criteria = self.criteria_order
+        self.mark_by.config(values=["Whole script"] + [name for name, _ in self.markscheme.sections])
+        self.mark_by.set("Whole script")
+        self.build_rapid_grid()
+        if self.rapid_mode:
+            self.show_rapid_grid()
+
+    def focus_criterion(self, criterion):
+        """New annotations belong to the criterion being marked"""
+        if criterion is None:
+            self.annotation_layer.set_criterion(None)
+        else:
+            self.annotation_layer.set_criterion(criterion.key, f"{criterion.section} / {criterion.name}")
+
+    def mark_text(self, key):
+        """Text of a mark annotation: the current student's mark for `key`"""
+        criterion = self.criteria_by_key.get(key)
+        if criterion is None or not self.current_student or self.current_student not in self.grading:
+            return ""
+        return mark_label(self.grading.marks(self.current_student, [key])[key], criterion.max_mark)
+
     def toggle_section(self, section_name):
         widget = self.section_widgets[section_name]
         if widget['visible']:
@@ -396,418 +594,545 @@ class QuizMarker:
             widget['button'].config(text=f"▲ {section_name}")
             widget['visible'] = True
 
-    def init_grading_data(self, grading_path):
-        if os.path.exists(grading_path):
-            self.grading_data = pd.read_csv(grading_path)
+            # Jump the chart to this question if a region is saved for it
+            self.region_bar.show(section_name)
+
+    def toggle_rapid_mode(self):
+        if not self.criteria_order:
+            self.status_bar.config(text="Load a quiz before switching to rapid mode")
+            return
+
+        if self.question_section is not None:
+            self.status_bar.config(text="Switch 'Mark by' back to Whole script to leave rapid mode")
+            return
+
+        self.rapid_mode = not self.rapid_mode
+        if self.rapid_mode:
+            self.show_rapid_grid()
+            self.rapid_btn.config(text="Section Mode")
         else:
-            # Create new grading dataframe
-            columns = ['student_id']
-
-            # Add columns for each criteria
-            if self.markscheme is not None:
-                for line in self.markscheme:
-                    if ":" not in line:
-                        continue
-                    section_name, criteria_str = line.split(":", 1)
-                    criteria_pairs = [c.split(",") for c in criteria_str.split(";") if c]
-                    for _, criteria in criteria_pairs:
-                        if criteria.endswith("*"):
-                            criteria = criteria[:-1]  # Remove the *
-                        columns.append(f"{section_name}_{criteria}")
-
-            # Add feedback and graded columns
-            columns.extend(['feedback', 'graded', 'overall_grade'])
-
-            # Initialize with all validated students
-            validated_students = self.student_data[self.student_data['validated'] == True]
-            self.grading_data = pd.DataFrame(columns=columns)
-
-            # Create list of new rows
-            new_rows = []
-            for _, student in validated_students.iterrows():
-                new_row = {'student_id': student['id'], 'graded': False}
-                new_rows.append(new_row)
-
-            # Concatenate all new rows at once
-            if new_rows:
-                self.grading_data = pd.concat(
-                    [self.grading_data, pd.DataFrame(new_rows)],
-                    ignore_index=True
+            self.rapid_frame.pack_forget()
+            for widget in self.section_widgets.values():
+                widget['container'].pack(fill=tk.X, pady=(10, 0))
+            self.criteria_entries = self.section_entries
+            self.rapid_btn.config(text="Rapid Mode")
+
+        # Show the current student's marks in whichever entries are now active
+        if self.current_student:
+            self.fill_criteria_entries()
+
+    def toggle_reconcile(self):
+        """Show only the students the two markers disagree on, with the second marks alongside"""
+        if self.grading is None:
+            self.status_bar.config(text="Load a quiz before reconciling double marking")
+            return
+        if self.save_job is not None:
+            self.update_grading_data()
+        validated = self.student_data[self.student_data['validated'] == True]
+
+        if self.reconcile is not None:
+            self.reconcile = None
+            self.reconcile_btn.config(text="Reconcile")
+            self.load_student_list(validated)
+            self.status_bar.config(text="Showing all students")
+            return
+
+        second = read_layer(self.paths.second_grading_csv)
+        if not second:
+            self.status_bar.config(text="No second marking yet (run grade.py with QUIZ_SECOND_MARKER=1)")
+            return
+        report = compare(read_layer(self.paths.first_grading_csv), second, self.markscheme)
+        self.reconcile = report["disagreements"]
+        self.reconcile_btn.config(text="All Students")
+        self.load_student_list(validated[validated['id'].astype(str).isin(self.reconcile)])
+
+        # Have the first few scripts decoded before the grader gets to them
+        for student_id in self.student_ids[:self.chart_cache.max_pages - 1]:
+            pages = self.page_index.pages(student_id)
+            if pages:
+                self.chart_cache.prefetch(pages[0])
+        self.status_bar.config(
+            text=f"{len(self.reconcile)} of {report['students']} double-marked students have marks that differ"
+        )
+
+    def build_rapid_grid(self):
+        """Point pooled rows at the current markscheme, growing the pool only if needed"""
+        while len(self.rapid_rows) < len(self.rapid_criteria):
+            row = len(self.rapid_rows)
+            label = tk.Label(self.rapid_frame, font=self.custom_font, bg="#f0f2f5", anchor="w")
+            entry = tk.Entry(self.rapid_frame, font=self.custom_font, width=4, justify=tk.CENTER)
+            entry.bind("<KeyRelease>", lambda e, r=row: self.on_rapid_key(e, r))
+            entry.bind("<Tab>", lambda e, r=row: self.rapid_advance(r))
+            entry.bind("<Return>", lambda e, r=row: self.rapid_advance(r))
+            entry.bind("<Shift-Tab>", lambda e, r=row: self.rapid_focus(r - 1))
+            entry.bind("<ISO_Left_Tab>", lambda e, r=row: self.rapid_focus(r - 1))
+            entry.bind("<FocusIn>", lambda e, r=row: self.on_rapid_focus(r))
+            self.rapid_rows.append((label, entry))
+
+        self.rapid_entries = {}
+        for row, (label, entry) in enumerate(self.rapid_rows):
+            if row < len(self.rapid_criteria):
+                criterion = self.rapid_criteria[row]
+                label.config(
+                    text=f"{criterion.section} / {criterion.name} /{criterion.max_mark:g}",
+                    fg="#FF9800" if criterion.bonus else "black"
                 )
+                label.grid(row=row, column=0, sticky="w", padx=5)
+                entry.grid(row=row, column=1, padx=5, pady=1)
+                self.rapid_entries[criterion.key] = entry
+            else:
+                label.grid_remove()
+                entry.grid_remove()
+
+    def show_rapid_grid(self):
+        for widget in self.section_widgets.values():
+            widget['container'].pack_forget()
+        self.rapid_frame.pack(after=self.grade_display, fill=tk.X, padx=5)
+        self.criteria_entries = self.rapid_entries
+        self.rapid_focus(0)
+
+    def rapid_focus(self, row):
+        if 0 <= row < len(self.rapid_criteria):
+            entry = self.rapid_rows[row][1]
+            entry.focus_set()
+            entry.select_range(0, tk.END)
+        return "break"
+
+    def on_rapid_focus(self, row):
+        self.rapid_text = self.rapid_rows[row][1].get()
+        self.focus_criterion(self.rapid_criteria[row] if row < len(self.rapid_criteria) else None)
+
+    def on_rapid_key(self, event, row):
+        # Any edit is saved, including a mark cleared with BackSpace or Delete
+        text = self.rapid_rows[row][1].get()
+        if text == self.rapid_text:
+            return
+        self.rapid_text = text
+        self.schedule_save()
+
+        # Single-digit criteria advance as soon as the mark is typed
+        if event.char.isdigit() and self.rapid_criteria[row].max_mark < 10:
+            self.rapid_advance(row)
+
+    def rapid_advance(self, row):
+        if row + 1 < len(self.rapid_criteria):
+            return self.rapid_focus(row + 1)
+
+        # Last criterion: save and move on to the next student
+        self.update_grading_data()
+        if self.script_started is not None:
+            self.script_times.append(time.perf_counter() - self.script_started)
+            average = sum(self.script_times) / len(self.script_times)
+            self.status_bar.config(
+                text=f"Last script: {self.script_times[-1]:.1f}s | "
+                     f"Average: {average:.1f}s over {len(self.script_times)} scripts"
+            )
+
+        selection = self.student_list.curselection()
+        next_idx = selection[0] + 1 if selection else 0
+        if next_idx < self.student_list.size():
+            self.student_list.selection_clear(0, tk.END)
+            self.student_list.selection_set(next_idx)
+            self.student_list.see(next_idx)
+            self.load_student_data(None)
+            self.rapid_focus(0)
+        return "break"
+
+    def set_mark_by(self, event=None):
+        """Switch between whole-script marking and marking one question across the cohort"""
+        if not self.criteria_order:
+            self.mark_by.set("Whole script")
+            return
+        choice = self.mark_by.get()
+        section = None if choice == "Whole script" else choice
+        if section == self.question_section:
+            return
+
+        # Land any pending edit before the entries are repointed
+        if self.save_job is not None:
+            self.update_grading_data()
 
-            # Save empty grading file
-            self.grading_data.to_csv(grading_path, index=False)
+        self.question_section = section
+        if section is None:
+            self.rapid_criteria = self.criteria_order
+            self.build_rapid_grid()
+            self.rapid_mode = True
+            self.toggle_rapid_mode()  # Back to section mode
+        else:
+            self.rapid_criteria = [c for c in self.criteria_order if c.section == section]
+            self.build_rapid_grid()
+            self.rapid_mode = True
+            self.show_rapid_grid()
+            self.rapid_btn.config(text="Section Mode")
+            self.start_cropping(section)
+
+        if self.current_student:
+            self.fill_criteria_entries()
+            self.load_student_chart(self.current_student)
+            self.viewer.fit()
+
+    def start_cropping(self, section):
+        """Crop this question out of every student's scan in the background"""
+        if section not in self.region_bar.regions:
+            self.status_bar.config(text=f"No region saved for {section}: showing whole pages. "
+                                        f"Zoom to the question and use + Region to add one.")
+            return
+        jobs = crop_jobs(self.paths, self.page_index, {section: self.region_bar.regions[section]},
+                         self.student_ids)
+        self.cropper.submit(jobs)
+        self.status_bar.config(text=f"Marking {section} for every student ({len(jobs)} crops to prepare)")
+
+    def question_crop(self, student_id):
+        """This student's crop for the current question, made now if the pool hasn't got to it"""
+        box = self.region_bar.regions.get(self.question_section)
+        if box is None:
+            return None
+        pages = self.page_index.pages(student_id)
+        if len(pages) < box[4]:
+            return None
+        crop = crop_path(self.paths, self.question_section, student_id)
+        if not is_fresh(crop, pages[box[4] - 1], self.paths.regions):
+            # Wait for the pool if it's already cutting this crop, so it isn't cut twice at once
+            future = self.cropper.claim(crop)
+            if future is not None:
+                future.result()
+            else:
+                crop_file(pages[box[4] - 1], box, crop)
+        return crop
+
+    def on_closing(self):
+        if self.save_job is not None:
+            self.update_grading_data()
+        self.cropper.shutdown()
+        if self.watcher is not None:
+            self.watcher.stop()
+        self.root.destroy()
+
+    def schedule_save(self):
+        # Debounce saves so a burst of typing only writes the CSVs once
+        if self.save_job is not None:
+            self.root.after_cancel(self.save_job)
+        self.save_job = self.root.after(500, self.update_grading_data)
+
+    def on_feedback_key(self, event):
+        # Completion keys are handled by their own bindings
+        if event.keysym in ("Tab", "Escape") or event.state & 0x4:
+            if event.keysym == "Escape":
+                self.hide_suggestions()
+            return
+
+        self.show_suggestions()
+        self.schedule_save()
+
+    def current_fragment(self):
+        return self.feedback_text.get("insert linestart", "insert")
+
+    def show_suggestions(self):
+        self.suggestions = self.comment_bank.search(self.current_fragment())
+        if not self.suggestions:
+            self.hide_suggestions()
+            return
+
+        self.suggestion_list.delete(0, tk.END)
+        for n, comment in enumerate(self.suggestions, start=1):
+            label = "Tab" if n == 1 else f"Ctrl+{n}"
+            self.suggestion_list.insert(tk.END, f"[{label}] {comment}")
+        self.suggestion_list.config(height=len(self.suggestions))
+        if not self.suggestion_list.winfo_ismapped():
+            self.suggestion_list.pack(after=self.feedback_text, fill=tk.X, padx=5, pady=(0, 10))
+
+    def hide_suggestions(self):
+        self.suggestions = []
+        if self.suggestion_list.winfo_ismapped():
+            self.suggestion_list.pack_forget()
+
+    def insert_suggestion(self, index):
+        if index >= len(self.suggestions):
+            return "break"
+
+        # Replace what has been typed on the current line with the canned comment
+        self.feedback_text.delete("insert linestart", "insert lineend")
+        self.feedback_text.insert("insert linestart", self.suggestions[index])
+        self.hide_suggestions()
+        self.update_grading_data()
+        return "break"
+
+    def bank_current_feedback(self):
+        """Add the current student's saved feedback to the comment bank"""
+        if self.grading is None or not self.current_student:
+            return
+        self.comment_bank.add_feedback(self.grading.get(self.current_student, 'feedback'))
 
     def load_student_data(self, event):
         selection = self.student_list.curselection()
         if not selection:
             return
 
+        # Flush any pending edit for the previous student before switching
+        if self.save_job is not None:
+            self.update_grading_data()
+        self.bank_current_feedback()
+        self.hide_suggestions()
+
         selected_idx = selection[0]
-        student_id = self.student_data.iloc[selected_idx]['id']
+        student_id = self.student_ids[selected_idx]
         self.current_student = student_id
 
         # Load student's chart
         self.load_student_chart(student_id)
 
-        # Load student's grading data
-        student_grading = self.grading_data[self.grading_data['student_id'] == student_id]
-
-        # Clear feedback and grade display
+        # Clear feedback and fill in criteria marks
         self.feedback_text.delete(1.0, tk.END)
-        self.grade_display.config(text="Overall Grade: -")
-
-        if not student_grading.empty:
-            # Initialize totals
-            total_marks = 0
-            total_max_marks = 0
-            bonus_marks = 0
-
-            # Fill in criteria marks
-            for criteria, entry in self.criteria_entries.items():
-                mark = student_grading[criteria].values[0]
-                if pd.notna(mark):
-                    entry.delete(0, tk.END)
-                    entry.insert(0, str(int(mark)))  # Ensure integer display
-
-                    # Calculate marks
-                    if criteria in self.bonus_criteria:
-                        bonus_marks += float(mark)
-                    else:
-                        section, crit = criteria.split("_", 1)
-                        max_mark = self.get_max_mark(section, crit)
-                        if max_mark:
-                            total_marks += float(mark)
-                            total_max_marks += float(max_mark)
-                else:
-                    entry.delete(0, tk.END)
-
-            # Fill in feedback
-            feedback = student_grading['feedback'].values[0]
-            if pd.notna(feedback):
-                self.feedback_text.insert(1.0, feedback)
-
-            # Calculate and display overall grade
-            if total_max_marks > 0:
-                percentage = (total_marks / total_max_marks) * 100
-                grade_text = f"Overall Grade: {total_marks:.0f}/{total_max_marks:.0f} ({percentage:.1f}%)"
-                if bonus_marks > 0:
-                    grade_text += f" + {bonus_marks:.0f} bonus"
-                self.grade_display.config(text=grade_text)
+        self.fill_criteria_entries()
+
+        # Fill in feedback
+        feedback = self.grading.get(student_id, 'feedback')
+        if feedback is not None:
+            self.feedback_text.insert(1.0, feedback)
+
+        # Start timing this script for rapid mode
+        self.script_started = time.perf_counter()
 
         # Set button states
-        is_graded = not student_grading.empty and student_grading['graded'].values[0] == True
+        is_graded = self.grading.is_graded(student_id)
         self.confirm_btn.config(state=tk.NORMAL if not is_graded else tk.DISABLED)
         self.unconfirm_btn.config(state=tk.NORMAL if is_graded else tk.DISABLED)
 
+    def fill_criteria_entries(self):
+        """Show the current student's marks, only touching entries whose value changed"""
+        marks = self.grading.marks(self.current_student, [c.key for c in self.criteria_order])
+        review = self.review_flags(self.current_student)
+        disagreements = self.reconcile.get(str(self.current_student), {}) if self.reconcile is not None else {}
+
+        for key, entry in self.criteria_entries.items():
+            mark = marks[key]
+            text = str(int(mark)) if mark is not None else ""  # Ensure integer display
+            if entry.get() != text:
+                entry.delete(0, tk.END)
+                entry.insert(0, text)
+            # Marks the second marker disagrees with, then auto-marks the bubble reader wasn't sure of
+            background = "#E1BEE7" if key in disagreements else "#FFF59D" if key in review else "white"
+            if entry.cget("bg") != background:
+                entry.config(bg=background)
+
+        for key, label in self.second_labels.items():
+            text = f"2nd: {disagreements[key][1]:g}" if key in disagreements else ""
+            if label.cget("text") != text:
+                label.config(text=text)
+        if disagreements:
+            self.status_bar.config(text="Second marker: " + ", ".join(
+                f"{self.criteria_by_key[key].name} {second:g}" for key, (_, second) in disagreements.items()
+                if key in self.criteria_by_key))
+
+        # Calculate and display overall grade
+        grade = grade_text(*self.markscheme.totals(marks))
+        self.grade_display.config(text=f"Overall Grade: {grade or '-'}")
+
+    def review_flags(self, student_id):
+        """Criterion keys `python -m core omr` flagged for a human to check"""
+        return set(str(self.grading.get(student_id, 'review') or "").split(";")) - {""}
+
+    @telemetry.timed("grade.load_student_chart")
     def load_student_chart(self, student_id):
-        chart_path = os.path.join(
-            "their data",
-            f"quiz {self.quiz_number}",
-            "charts",
-            f"quiz-{self.quiz_number} {student_id}.png"
-        )
-
-        self.canvas.delete("all")
-
-        # Get current canvas dimensions
-        canvas_width = self.canvas.winfo_width()
-        canvas_height = self.canvas.winfo_height()
-
-        if os.path.exists(chart_path):
-            try:
-                img = Image.open(chart_path)
-
-                # Maintain aspect ratio
-                img_ratio = img.width / img.height
-                new_width = min(canvas_width, img.width)
-                new_height = int(new_width / img_ratio)
-
-                if new_height > canvas_height:
-                    new_height = canvas_height
-                    new_width = int(new_height * img_ratio)
+        self.canvas.delete("message")
 
-                # High quality resize
-                img = img.resize((new_width, new_height), Image.Resampling.LANCZOS)
-                self.current_image = ImageTk.PhotoImage(img)
-
-                # Display image
-                self.canvas.create_image(
-                    canvas_width // 2,
-                    canvas_height // 2,
-                    image=self.current_image,
-                    anchor=tk.CENTER
-                )
-
-            except Exception as e:
-                self.canvas.create_text(
-                    canvas_width // 2,
-                    canvas_height // 2,
-                    text=f"Error loading chart: {str(e)}",
-                    font=self.custom_font,
-                    fill="black"
-                )
+        try:
+            crop = self.question_crop(student_id) if self.question_section is not None else None
+        except Exception as e:
+            self.annotation_layer.load(None)
+            self.page_bar.show([])
+            self.show_chart_message(f"Error cropping chart: {str(e)}")
+            return
+        pages = [crop] if crop else self.page_index.pages(student_id)
+        if crop:
+            # Annotate the question's page through the crop
+            box = self.region_bar.regions[self.question_section]
+            self.annotation_layer.load(sidecar_path(self.paths, student_id), page=box[4], frame_box=box)
         else:
-            self.canvas.create_text(
-                canvas_width // 2,
-                canvas_height // 2,
-                text="No chart found for this student",
-                font=self.custom_font,
-                fill="black"
-            )
-
-    def get_max_mark(self, section_name, criteria_name):
-        for line in self.markscheme:
-            if line.startswith(section_name + ":"):
-                criteria_str = line.split(":", 1)[1]
-                criteria_pairs = [c.split(",") for c in criteria_str.split(";") if c]
-                for max_mark, crit in criteria_pairs:
-                    if crit.endswith("*"):
-                        crit = crit[:-1]  # Remove the *
-                    if crit == criteria_name:
-                        return float(max_mark)
-        return None
+            self.annotation_layer.load(sidecar_path(self.paths, student_id) if pages else None)
+        if not pages:
+            self.page_bar.show([])
+            self.show_chart_message("No chart found for this student")
+            return
 
-    def update_grading_data(self, event=None):
-        if not self.current_student:
+        try:
+            self.page_bar.show(pages)
+        except Exception as e:
+            self.show_chart_message(f"Error loading chart: {str(e)}")
             return
 
-        # Find student in grading data
-        student_idx = self.grading_data[self.grading_data['student_id'] == self.current_student].index
+        # Decode the next student's first page (or crop) while this one is being marked
+        next_idx = self.student_ids.index(student_id) + 1
+        if next_idx < len(self.student_ids):
+            next_id = self.student_ids[next_idx]
+            if crop:
+                self.chart_cache.prefetch(crop_path(self.paths, self.question_section, next_id))
+            else:
+                self.chart_cache.prefetch(self.paths.chart(next_id))
+
+    def show_chart_message(self, text):
+        self.viewer.set_image(None)
+        self.canvas.create_text(
+            self.canvas.winfo_width() // 2,
+            self.canvas.winfo_height() // 2,
+            text=text,
+            font=self.custom_font,
+            fill="black",
+            tags="message"
+        )
+
+    @telemetry.timed("grade.update_grading_data")
+    def update_grading_data(self, event=None):
+        if self.save_job is not None:
+            self.root.after_cancel(self.save_job)
+            self.save_job = None
 
-        if len(student_idx) == 0:
+        if not self.current_student or self.current_student not in self.grading:
             return
 
-        student_idx = student_idx[0]
-
-        # Initialize totals
-        total_marks = 0
-        total_max_marks = 0
-        bonus_marks = 0
+        # Update criteria marks (only values that changed are written); criteria
+        # not on screen, e.g. in question mode, keep their stored marks
+        marks = self.grading.marks(self.current_student, [c.key for c in self.criteria_order])
         changed = False
-
-        # Update criteria marks and calculate totals
+        edited = {}  # Marks this save changes, for the edit log
+        review = self.review_flags(self.current_student)
         for criteria, entry in self.criteria_entries.items():
             mark = entry.get()
-            current_value = self.grading_data.at[student_idx, criteria]
-
-            # Only update if the value has changed
-            if mark and mark.isdigit():
-                mark_int = int(mark)
-                if current_value != mark_int:
-                    self.grading_data.at[student_idx, criteria] = mark_int
-                    changed = True
-
-                # Calculate marks differently for bonus criteria
-                if criteria in self.bonus_criteria:
-                    bonus_marks += mark_int
-                else:
-                    section, crit = criteria.split("_", 1)
-                    max_mark = self.get_max_mark(section, crit)
-                    if max_mark:
-                        total_marks += mark_int
-                        total_max_marks += float(max_mark)
-            elif pd.notna(current_value):
-                self.grading_data.at[student_idx, criteria] = None
+            marks[criteria] = int(mark) if mark and mark.isdigit() else None
+            if self.grading.set(self.current_student, criteria, marks[criteria]):
                 changed = True
+                edited[criteria] = marks[criteria]
+                if criteria in review:
+                    # A grader has looked at it now
+                    review.discard(criteria)
+                    entry.config(bg="white")
+                    self.grading.set(self.current_student, 'review', ";".join(sorted(review)) or None)
 
         # Update feedback if changed
         feedback = self.feedback_text.get(1.0, tk.END).strip()
-        current_feedback = self.grading_data.at[student_idx, 'feedback']
-        if feedback != current_feedback:
-            self.grading_data.at[student_idx, 'feedback'] = feedback
-            changed = True
+        changed |= self.grading.set(self.current_student, 'feedback', feedback or None)
 
         # Only save if something changed
         if changed:
+            total_marks, total_max_marks, bonus_marks = self.markscheme.totals(marks)
+
+            # Who marked it, for comparing double marking
+            self.grading.set(self.current_student, 'grader', telemetry.GRADER)
+
             # Update overall grade if calculated
-            if total_max_marks > 0:
-                percentage = (total_marks / total_max_marks) * 100
-                grade_text = f"{total_marks:.0f}/{total_max_marks:.0f} ({percentage:.1f}%)"
-                if bonus_marks > 0:
-                    grade_text += f" + {bonus_marks:.0f} bonus"
-                self.grade_display.config(text=f"Overall Grade: {grade_text}")
-                self.grading_data.at[student_idx, 'overall_grade'] = grade_text
+            grade = grade_text(total_marks, total_max_marks, bonus_marks)
+            if grade:
+                self.grade_display.config(text=f"Overall Grade: {grade}")
+                self.grading.set(self.current_student, 'overall_grade', grade)
 
             # Save changes to grading CSV
-            grading_path = os.path.join(
-                "their data",
-                f"quiz {self.quiz_number}",
-                "feedback",
-                f"quiz-{self.quiz_number} grading.csv"
-            )
-            self.grading_data.to_csv(grading_path, index=False)
+            self.save_grading()
 
             # Update student CSV with the total marks
             self.update_student_csv(total_marks, bonus_marks)
 
+            # Mark annotations show the new marks
+            self.annotation_layer.update_marks()
+            self.analysis.update(self.current_student, marks)
+
+            # Log the edit and check this grader's marks for drift
+            if edited:
+                self.edit_log.append(self.current_student, edited, "second" if self.second_marker else "first")
+                self.drift.feed(self.edit_log.read_new())
+
             # Update stats
             self.update_stats()
 
     def update_student_csv(self, total_marks, bonus_marks):
         """Update the student CSV with the total marks and feedback"""
-        if not self.current_student or not self.quiz_number:
-            return
-
-        # Path to student CSV
-        students_csv = os.path.join(
-            "their data",
-            f"quiz {self.quiz_number}",
-            "feedback",
-            f"quiz-{self.quiz_number} students.csv"
-        )
+        if not self.current_student or not self.quiz_number or self.second_marker:
+            return  # Only the first marker's marks go on the roster
 
         try:
-            # Load student data
-            student_df = pd.read_csv(students_csv)
-
-            # Find the student
-            mask = student_df['id'] == self.current_student
-            if not mask.any():
-                return
-
-            # Update the row
-            student_df.loc[mask, 'grade'] = total_marks
-            student_df.loc[mask, 'bonus'] = bonus_marks
-            student_df.loc[mask, 'total'] = total_marks + bonus_marks
-
-            # Save back to CSV
-            student_df.to_csv(students_csv, index=False)
+            roster.update_student(
+                self.paths.students_csv,
+                self.current_student,
+                grade=total_marks,
+                bonus=bonus_marks,
+                total=total_marks + bonus_marks
+            )
+            self.watcher.ignore(self.paths.students_csv)
         except Exception as e:
             messagebox.showerror("Error", f"Could not update student CSV: {str(e)}")
 
     def confirm_graded(self):
-        if not self.current_student:
-            return
-
-        # Find student in grading data
-        student_idx = self.grading_data[self.grading_data['student_id'] == self.current_student].index
-
-        if len(student_idx) == 0:
-            return
-
-        student_idx = student_idx[0]
-
-        # Mark as graded
-        self.grading_data.at[student_idx, 'graded'] = True
-
-        # Save changes
-        self.update_grading_data()
-
-        # Update student list color
-        selection = self.student_list.curselection()
-        if selection:
-            self.student_list.itemconfig(selection[0], {'bg': '#599e66'})
-
-        # Update button states
-        self.confirm_btn.config(state=tk.DISABLED)
-        self.unconfirm_btn.config(state=tk.NORMAL)
-
-        # Update student CSV graded status
-        self.update_student_graded_status(True)
-
-        # Update stats
-        self.update_stats()
+        self.set_graded(True)
 
     def unconfirm_graded(self):
-        if not self.current_student:
-            return
-
-        # Find student in grading data
-        student_idx = self.grading_data[self.grading_data['student_id'] == self.current_student].index
+        self.set_graded(False)
 
-        if len(student_idx) == 0:
+    def set_graded(self, graded):
+        if not self.current_student or self.current_student not in self.grading:
             return
 
-        student_idx = student_idx[0]
-
-        # Mark as not graded
-        self.grading_data.at[student_idx, 'graded'] = False
+        # Mark as (not) graded; confirming also accepts any flagged auto-marks
+        self.grading.set(self.current_student, 'graded', graded)
+        if graded:
+            self.grading.set(self.current_student, 'review', None)
+
+        # Human time spent on this script since it was opened
+        if graded and self.script_started is not None:
+            telemetry.record(
+                "grade.time_to_grade",
+                time.perf_counter() - self.script_started,
+                quiz=self.quiz_number,
+                student=self.current_student
+            )
 
-        # Save changes
+        # Save any pending edits, then the graded flag itself
         self.update_grading_data()
+        self.save_grading()
+        if graded:
+            self.bank_current_feedback()
 
         # Update student list color
         selection = self.student_list.curselection()
         if selection:
-            self.student_list.itemconfig(selection[0], {'bg': 'white'})
+            self.student_list.itemconfig(selection[0], {'bg': '#599e66' if graded else 'white'})
 
         # Update button states
-        self.confirm_btn.config(state=tk.NORMAL)
-        self.unconfirm_btn.config(state=tk.DISABLED)
-
-        # Update grading CSV graded status
-        self.update_student_graded_status(False)
+        self.confirm_btn.config(state=tk.DISABLED if graded else tk.NORMAL)
+        self.unconfirm_btn.config(state=tk.NORMAL if graded else tk.DISABLED)
 
         # Update stats
         self.update_stats()
 
-    def update_student_graded_status(self, graded):
-        """Update the graded status in the student CSV"""
-        if not self.current_student or not self.quiz_number:
-            return
-
-        # Path to student CSV
-        students_csv = os.path.join(
-            "their data",
-            f"quiz {self.quiz_number}",
-            "feedback",
-            f"quiz-{self.quiz_number} grading.csv"
-        )
-
-        try:
-            # Load student data
-            student_df = pd.read_csv(students_csv)
-
-            # Find the student
-            mask = student_df['student_id'] == self.current_student
-            if not mask.any():
-                return
-
-            # Update the graded status
-            student_df.loc[mask, 'graded'] = graded
-
-            # Save back to CSV
-            student_df.to_csv(students_csv, index=False)
-        except Exception as e:
-            messagebox.showerror("Error", f"Could not update grading CSV: {str(e)}")
-
+    @telemetry.timed("grade.update_stats")
     def update_stats(self):
-        if self.grading_data is None:
+        if self.grading is None:
             return
 
         # Calculate stats
-        graded_count = self.grading_data['graded'].sum()
-        total_students = len(self.grading_data)
+        graded_count, total_students, groups = self.grading.summary(self.markscheme.bonus_keys)
         percent_graded = (graded_count / total_students) * 100 if total_students > 0 else 0
-
-        # Calculate average marks per criteria
         stats_text = f"Graded: {graded_count}/{total_students} ({percent_graded:.1f}%)"
 
-        # Add section averages if available
-        if len(self.grading_data) > 0:
-            numeric_cols = [col for col in self.grading_data.columns
-                            if col not in ['student_id', 'feedback', 'graded', 'overall_grade']
-                            and pd.api.types.is_numeric_dtype(self.grading_data[col])]
-
-            if numeric_cols:
-                # Separate regular and bonus criteria
-                regular_cols = [col for col in numeric_cols if col not in self.bonus_criteria]
-                bonus_cols = [col for col in numeric_cols if col in self.bonus_criteria]
-
-                # Calculate regular averages
-                if regular_cols:
-                    avg_regular = self.grading_data[regular_cols].mean().mean().round(1)
-                    max_regular = self.grading_data[regular_cols].max().max().round(1)
-                    min_regular = self.grading_data[regular_cols].min().min().round(1)
-                    stats_text += f"\nRegular: Avg {avg_regular} | Max {max_regular} | Min {min_regular}"
-
-                # Calculate bonus averages
-                if bonus_cols:
-                    avg_bonus = self.grading_data[bonus_cols].mean().mean().round(1)
-                    max_bonus = self.grading_data[bonus_cols].max().max().round(1)
-                    min_bonus = self.grading_data[bonus_cols].min().min().round(1)
-                    stats_text += f"\nBonus: Avg {avg_bonus} | Max {max_bonus} | Min {min_bonus}"
+        # Add regular and bonus criteria averages if available
+        for label, (avg, max_mark, min_mark) in groups.items():
+            stats_text += f"\n{label}: Avg {avg} | Max {max_mark} | Min {min_mark}"
+
+        # Item analysis once enough scripts are fully marked to say anything
+        results = self.analysis.results() if self.analysis is not None else None
+        if results and results["complete"] >= 4:
+            totals = results["totals"]
+            stats_text += f"\nTotals: {sparkline(totals['histogram'])} (sd {totals['sd'] or 0:.1f})"
+            alphas = [f"{name} {section['alpha']:.2f}" for name, section in results["sections"].items()
+                      if section["alpha"] is not None]
+            if alphas:
+                stats_text += f"\nAlpha: {' | '.join(alphas)}"
+            for key, reason in concerns(results)[:3]:
+                stats_text += f"\nCheck {key}: {reason}"
+
+        # Criteria this grader has lately been marking differently from earlier in the session
+        drifting = self.drift.drifting(telemetry.GRADER) if self.drift is not None else {}
+        for (_, key), (_, shift) in sorted(drifting.items(), key=lambda item: -abs(item[1][0]))[:3]:
+            direction = "higher" if shift > 0 else "lower"
+            stats_text += f"\nDrift {key}: last marks {abs(shift):.0%} of max {direction} than earlier"
 
         self.stats_label.config(text=stats_text)
 
@@ -815,4 +1140,5 @@ class QuizMarker:
 if __name__ == "__main__":
     root = tk.Tk()
     app = QuizMarker(root)
+    root.protocol("WM_DELETE_WINDOW", app.on_closing)
     root.mainloop()
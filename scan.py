@@ -1,14 +1,26 @@
 import tkinter as tk
 from tkinter import filedialog, simpledialog, messagebox
-from PIL import Image, ImageTk, ImageOps
 import os
-from wia_scan import *
+
+from core import scansettings, telemetry
+from core.attendance import AttendanceStore
+from core.coversheet import identify
+from core.images import replace_chart
+from core.pages import PageIndex
+from core.pagestore import PageStore
+from core.phash import HashIndex, check_page
+from core.preprocess import LivePreprocessor
+from core.paths import QuizPaths, station_base
+from viewer import TiledViewer
 
 
 class HighResScannerApp:
     def __init__(self, root):
         self.root = root
-        self.root.title("Quiz Scanner")
+        # With QUIZ_STATION set, scans go to this station's spool for `python -m core merge`
+        self.station = os.environ.get("QUIZ_STATION", "").strip()
+        self.base_dir = station_base(self.station)
+        self.root.title(f"Quiz Scanner - station {self.station}" if self.station else "Quiz Scanner")
         self.root.geometry("1200x1000")
         self.root.configure(bg="#f0f2f5")
 
@@ -28,9 +40,14 @@ class HighResScannerApp:
         self.original_image = None
         self.quiz_number = None
         self.student_id = None
+        self.cover_id = None  # ID from the last cover sheet, offered for the pages after it
         self.scale_factor = 1.0
-        self.scanned_students = set()
+        self.attendance = None
+        self.hash_index = None  # Page hashes of the current quiz, kept in memory between scans
         self.total_scanned = 0
+        self.preprocessor = LivePreprocessor(workers=2)
+        self.scan_settings = dict(scansettings.DEFAULTS)  # Loaded per quiz
+        self.preview_only = False  # The page on screen is a low-resolution preview
 
         # Setup UI
         self.setup_ui()
@@ -130,6 +147,36 @@ class HighResScannerApp:
         )
         self.save_button.pack(side=tk.LEFT, padx=10)
 
+        # Deskew, crop and grayscale saved charts in a background process
+        self.cleanup_var = tk.BooleanVar(value=True)
+        tk.Checkbutton(
+            button_frame,
+            text="Clean up scans",
+            variable=self.cleanup_var,
+            font=self.custom_font,
+            bg="#f0f2f5"
+        ).pack(side=tk.LEFT, padx=10)
+
+        # Resolution and colour depth, remembered per quiz
+        self.profile_var = tk.StringVar(value=scansettings.DEFAULT_PROFILE)
+        tk.OptionMenu(
+            button_frame,
+            self.profile_var,
+            *scansettings.PROFILES,
+            command=self.set_scan_profile
+        ).pack(side=tk.LEFT, padx=10)
+
+        # Quick low-resolution scan to line the page up; Save captures the real one
+        self.preview_var = tk.BooleanVar(value=False)
+        tk.Checkbutton(
+            button_frame,
+            text="Preview first",
+            variable=self.preview_var,
+            command=self.toggle_preview,
+            font=self.custom_font,
+            bg="#f0f2f5"
+        ).pack(side=tk.LEFT, padx=10)
+
         # Preview frame with scrollbars
         self.preview_frame = tk.Frame(main_frame, bg="#e0e0e0")
         self.preview_frame.pack(expand=True, fill=tk.BOTH)
@@ -143,17 +190,20 @@ class HighResScannerApp:
             scrollregion=(0, 0, 800, 1000)
         )
 
+        # Only the visible tiles of the page are rendered
+        self.viewer = TiledViewer(self.canvas, min_zoom=0.1, max_zoom=4.0)
+
         self.h_scroll = tk.Scrollbar(
             self.preview_frame,
             orient=tk.HORIZONTAL,
-            command=self.canvas.xview
+            command=self.viewer.xview
         )
         self.h_scroll.pack(side=tk.BOTTOM, fill=tk.X)
 
         self.v_scroll = tk.Scrollbar(
             self.preview_frame,
             orient=tk.VERTICAL,
-            command=self.canvas.yview
+            command=self.viewer.yview
         )
         self.v_scroll.pack(side=tk.RIGHT, fill=tk.Y)
 
@@ -192,6 +242,7 @@ class HighResScannerApp:
             if quiz_num is not None:
                 self.quiz_number = quiz_num
                 self.initialize_attendance_file()
+                self.load_scan_settings()
                 self.save_button.config(state=tk.NORMAL)
             else:
                 self.status_bar.config(text="Quiz number not set")
@@ -202,28 +253,11 @@ class HighResScannerApp:
     def initialize_attendance_file(self):
         """Find or create attendance file and load existing student IDs"""
         try:
-            # Set up directory structure
-            base_dir = "their data"
-            quiz_dir = os.path.join(base_dir, f"quiz {self.quiz_number}")
-            feedback_dir = os.path.join(quiz_dir, "feedback")
-            attendance_file = os.path.join(feedback_dir, f"quiz-{self.quiz_number} attendance.txt")
-
-            # Create directories if needed
-            os.makedirs(feedback_dir, exist_ok=True)
-
-            # Reset counters
-            self.scanned_students = set()
-            self.total_scanned = 0
-
-            # Load existing student IDs if file exists
-            if os.path.exists(attendance_file):
-                with open(attendance_file, 'r', encoding='utf-8') as f:
-                    self.scanned_students = {line.strip() for line in f if line.strip()}
-                    self.total_scanned = len(self.scanned_students)
-            else:
-                # Create empty file
-                with open(attendance_file, 'w', encoding='utf-8') as f:
-                    pass
+            # Set up directory structure; other stations may be adding to the same file
+            paths = QuizPaths(self.quiz_number, self.base_dir).ensure()
+            self.attendance = AttendanceStore(paths.attendance).ensure()
+            self.hash_index = HashIndex(paths)
+            self.total_scanned = len(self.attendance)
 
             self.update_status_count()
             self.status_bar.config(text=f"Quiz {self.quiz_number} ready | Students: {self.total_scanned}")
@@ -232,6 +266,23 @@ class HighResScannerApp:
             messagebox.showerror("Error", f"Could not initialize attendance file: {str(e)}")
             self.status_bar.config(text=f"Error initializing quiz {self.quiz_number}")
 
+    def load_scan_settings(self):
+        self.scan_settings = scansettings.load(QuizPaths(self.quiz_number, self.base_dir).scan_settings)
+        self.profile_var.set(self.scan_settings["profile"])
+        self.preview_var.set(self.scan_settings["preview"])
+
+    def save_scan_settings(self):
+        if self.quiz_number is not None:
+            scansettings.save(QuizPaths(self.quiz_number, self.base_dir).scan_settings, self.scan_settings)
+
+    def set_scan_profile(self, profile):
+        self.scan_settings["profile"] = profile
+        self.save_scan_settings()
+
+    def toggle_preview(self):
+        self.scan_settings["preview"] = bool(self.preview_var.get())
+        self.save_scan_settings()
+
     def update_status_count(self):
         """Update status bar with current counts"""
         quiz_text = f"Quiz: {self.quiz_number}" if self.quiz_number else "Quiz: Not set"
@@ -241,75 +292,53 @@ class HighResScannerApp:
         self.quiz_info_label.config(text=status_text)
         self.status_bar.config(text=status_text)
 
+    @telemetry.timed("scan.scan_image")
     def scan_image(self):
         if self.quiz_number is None:
             messagebox.showwarning("Warning", "Please set quiz number first")
             return
 
         try:
-            self.status_bar.config(text="Scanning at high resolution...")
+            preview = self.scan_settings["preview"]
+            self.status_bar.config(text="Scanning preview..." if preview else "Scanning at high resolution...")
             self.root.update()
 
-            device_manager = get_device_manager()
-            device = connect_device(device_manager, 'scanner-device-ID')
-
-            # Scan at highest possible resolution
-            self.original_image = scan_side(device=device)
+            if preview:
+                self.original_image = self.capture(scansettings.PREVIEW_DPI, "L")
+            else:
+                self.original_image = self.capture(*scansettings.PROFILES[self.scan_settings["profile"]])
+            self.preview_only = preview
             self.pillow_image = self.original_image.copy()
 
             # Initial display at fit-to-window size
             self.scale_factor = 1.0
             self.display_image()
 
-            self.status_bar.config(text=f"Scan completed | Students: {self.total_scanned}")
+            if preview:
+                self.status_bar.config(text="Preview | Save scans the page at full resolution")
+            else:
+                self.status_bar.config(text=f"Scan completed | Students: {self.total_scanned}")
 
         except Exception as e:
             self.status_bar.config(text=f"Error: {str(e)}")
 
+    def capture(self, dpi, mode):
+        """One page from the scanner at `dpi` and `mode` (None: its maximum)"""
+        # Imported here so the app starts (and runs headless) without the WIA stack
+        from wia_scan import get_device_manager, connect_device, scan_side
+
+        device_manager = get_device_manager()
+        device = connect_device(device_manager, 'scanner-device-ID')
+        return scansettings.capture(scan_side, device, dpi, mode)
+
     def display_image(self):
         if not self.pillow_image:
             return
 
         try:
-            # Calculate dimensions to fit canvas while maintaining aspect ratio
-            canvas_width = self.canvas.winfo_width() - 20
-            canvas_height = self.canvas.winfo_height() - 20
-
-            img_width, img_height = self.original_image.size
-
-            # Calculate scale to fit canvas
-            width_ratio = canvas_width / img_width
-            height_ratio = canvas_height / img_height
-            self.scale_factor = min(width_ratio, height_ratio, 1.0)
-
-            # Create high-quality resized version for display
-            display_width = int(img_width * self.scale_factor)
-            display_height = int(img_height * self.scale_factor)
-
-            # Use LANCZOS (high-quality downsampling)
-            display_image = self.original_image.resize(
-                (display_width, display_height),
-                Image.Resampling.LANCZOS
-            )
-
-            # Convert to PhotoImage
-            self.tk_image = ImageTk.PhotoImage(display_image)
-
-            # Update canvas
-            self.canvas.delete("all")
-            self.canvas.create_image(
-                canvas_width // 2,
-                canvas_height // 2,
-                image=self.tk_image,
-                anchor=tk.CENTER
-            )
-
-            # Update scroll region
-            self.canvas.config(scrollregion=(
-                0, 0,
-                max(canvas_width, display_width),
-                max(canvas_height, display_height)
-            ))
+            # Fit to the canvas; tiles are cut from a pyramid instead of resizing the scan
+            self.viewer.set_image(self.original_image)
+            self.scale_factor = self.viewer.zoom
 
         except Exception as e:
             self.status_bar.config(text=f"Display error: {str(e)}")
@@ -318,41 +347,17 @@ class HighResScannerApp:
         if not self.original_image:
             return
 
-        self.scale_factor *= factor
-        self.scale_factor = max(0.1, min(self.scale_factor, 4.0))
+        self.viewer.zoom_by(factor)
+        self.scale_factor = self.viewer.zoom
 
-        # Create high-quality resized version
-        img_width, img_height = self.original_image.size
-        display_width = int(img_width * self.scale_factor)
-        display_height = int(img_height * self.scale_factor)
-
-        display_image = self.original_image.resize(
-            (display_width, display_height),
-            Image.Resampling.LANCZOS
-        )
-
-        # Convert to PhotoImage
-        self.tk_image = ImageTk.PhotoImage(display_image)
-
-        # Update canvas
-        self.canvas.delete("all")
-        canvas_width = self.canvas.winfo_width()
-        canvas_height = self.canvas.winfo_height()
-
-        self.canvas.create_image(
-            canvas_width // 2,
-            canvas_height // 2,
-            image=self.tk_image,
-            anchor=tk.CENTER
-        )
-
-        # Update scroll region
-        self.canvas.config(scrollregion=(
-            0, 0,
-            max(canvas_width, display_width),
-            max(canvas_height, display_height)
-        ))
+    def on_closing(self):
+        # Let queued clean-ups finish before exiting
+        self.status_bar.config(text="Finishing scan clean-up...")
+        self.root.update()
+        self.preprocessor.shutdown()
+        self.root.destroy()
 
+    @telemetry.timed("scan.save_image")
     def save_image(self):
         if not self.original_image:
             self.status_bar.config(text="No image to save")
@@ -363,10 +368,46 @@ class HighResScannerApp:
             return
 
         try:
-            # Get student ID
+            if self.preview_only:
+                # The operator has accepted the preview: now take the real scan
+                self.status_bar.config(text="Scanning at full resolution...")
+                self.root.update()
+                with telemetry.Timer("scan.capture"):
+                    self.original_image = self.capture(*scansettings.PROFILES[self.scan_settings["profile"]])
+                self.preview_only = False
+                self.pillow_image = self.original_image.copy()
+                self.display_image()
+
+            # Catch blank pages (e.g. the back of a sheet) before asking for an ID
+            with telemetry.Timer("scan.check_page"):
+                page_hash, blank = check_page(self.original_image)
+            if blank and not messagebox.askyesno(
+                "Blank page",
+                "This scan looks blank. Save it anyway?"
+            ):
+                self.status_bar.config(text="Save cancelled - blank page")
+                return
+
+            # A cover sheet's barcode gives the ID without typing it
+            with telemetry.Timer("scan.identify"):
+                cover_id, cover_quiz = identify(self.original_image, self.quiz_number)
+            if cover_quiz is not None and cover_id is None:
+                messagebox.showwarning(
+                    "Wrong quiz",
+                    f"This cover sheet is for quiz {cover_quiz}, not quiz {self.quiz_number}."
+                )
+
+            if cover_id:
+                # The cover only names the student; it isn't filed, so their answers start at page 1
+                self.cover_id = self.student_id = cover_id
+                self.status_bar.config(text=f"Cover sheet for {cover_id}: scan their pages next")
+                return
+
+            # Get student ID (Enter keeps the last cover sheet's student)
             student_id = simpledialog.askstring(
                 "Student ID",
                 "Enter student ID:",
+                initialvalue=self.cover_id or "",
                 parent=self.root
             )
 
@@ -377,44 +418,75 @@ class HighResScannerApp:
             self.student_id = student_id
 
             # Set up directory structure
-            base_dir = "their data"
-            quiz_dir = os.path.join(base_dir, f"quiz {self.quiz_number}")
-            charts_dir = os.path.join(quiz_dir, "charts")
-            feedback_dir = os.path.join(quiz_dir, "feedback")
-            attendance_file = os.path.join(feedback_dir, f"quiz-{self.quiz_number} attendance.txt")
-
-            # Create directories if needed
-            os.makedirs(charts_dir, exist_ok=True)
-            os.makedirs(feedback_dir, exist_ok=True)
-
-            # Only proceed if student ID is new
-            if student_id not in self.scanned_students:
-                self.scanned_students.add(student_id)
-                self.total_scanned += 1
-
-                # Record attendance
-                with open(attendance_file, 'a', encoding='utf-8') as f:
-                    f.write(f"{student_id}\n")
+            paths = QuizPaths(self.quiz_number, self.base_dir).ensure(charts=True)
+
+            page_index = PageIndex(paths)
+            replace_first = True
+
+            # Only ask when the ID is already known; the locked add below has the final say
+            known = student_id in self.attendance
+            if known:
+                # A repeat ID is usually the next page of the same script
+                pages = page_index.count(student_id)
+                answer = messagebox.askyesnocancel(
+                    "Student already scanned",
+                    f"Student {student_id} already has {pages} page(s).\n\n"
+                    f"Yes: add this scan as page {pages + 1}\n"
+                    f"No: replace the existing scan\n"
+                    f"Cancel: don't save"
+                )
+                if answer is None:
+                    self.status_bar.config(text="Save cancelled")
+                    return
+                replace_first = not answer
+
+            # The same sheet scanned twice (or under two IDs) is almost always a mistake
+            page = 1 if replace_first else page_index.count(student_id) + 1
+            file_name = os.path.basename(page_index.page_path(student_id, page))
+            self.hash_index.refresh()
+            matches = self.hash_index.duplicates(page_hash, exclude={file_name})
+            if matches and not messagebox.askyesno(
+                "Possible duplicate",
+                f"This scan looks the same as {matches[0][1]}.\n\nSave it anyway?"
+            ):
+                self.status_bar.config(text="Save cancelled - duplicate page")
+                return
 
+            # Record attendance. If another station recorded this ID since we looked,
+            # its page 1 must not be overwritten: this scan becomes the next page.
+            if self.attendance.add(student_id):
+                replace_first = True
+                self.total_scanned = len(self.attendance)
                 self.update_status_count()
-            else:
-                messagebox.showinfo("Notice", f"Student {student_id} already scanned")
-                self.status_bar.config(text=f"Student {student_id} already scanned")
+            elif not known:
+                replace_first = False
 
             # Save image
-            filename = f"quiz-{self.quiz_number} {student_id}.png"
-            file_path = os.path.join(charts_dir, filename)
-            self.original_image.save(
-                file_path,
-                format="PNG",
-                compress_level=9,
-                dpi=(300, 300)
-            )
+            file_path = page_index.add_page(student_id, replace_first=replace_first)
+            file_name = os.path.basename(file_path)
+            replace_chart(self.original_image, file_path)
+            self.hash_index.add(file_name, page_hash)
+            # The chart is the scan itself again, so an original kept from an earlier clean-up is stale
+            raw_path = os.path.join(paths.raw_charts_dir, file_name)
+            if os.path.exists(raw_path):
+                os.remove(raw_path)
+
+            # Keep the quiz's page store (if one has been built) in step with the new page
+            store = PageStore.open(paths)
+            if self.cleanup_var.get():
+                callback = None
+                if store is not None:
+                    callback = lambda future: future.exception() or store.add(file_path)
+                mode = scansettings.cleanup_mode(self.scan_settings["profile"])
+                self.preprocessor.submit(file_path, callback, mode=mode, backup_dir=paths.raw_charts_dir)
+            elif store is not None:
+                store.add(file_path, self.original_image)
 
             messagebox.showinfo(
                 "Success",
                 f"Quiz saved:\n\n"
                 f"Student: {student_id}\n"
+                f"Pages: {page_index.count(student_id)}\n"
                 f"Total scanned: {self.total_scanned}\n"
                 f"Location: {file_path}"
             )
@@ -428,6 +500,7 @@ if __name__ == "__main__":
     root = tk.Tk()
     root.tk.call('tk', 'scaling', 2.0)  # Adjust for high DPI
     app = HighResScannerApp(root)
+    root.protocol("WM_DELETE_WINDOW", app.on_closing)
 
     try:
         root.iconbitmap("scanner_icon.ico")
@@ -1,11 +1,13 @@
-import os
-import pandas as pd
 import tkinter as tk
 from tkinter import ttk, messagebox, simpledialog, font
 import clipboard
 from PIL import Image, ImageTk, ImageFont, ImageDraw
 import ctypes
 
+from core import roster, telemetry
+from core.csvfile import CsvFile
+from core.paths import QuizPaths
+
 
 class CuteGradeTracker:
     def __init__(self, root):
@@ -41,6 +43,7 @@ class CuteGradeTracker:
         # Data storage
         self.current_quiz = None
         self.student_data = []
+        self.students_file = None
         self.quiz_number = None
 
     def load_fonts(self):
@@ -355,23 +358,17 @@ class CuteGradeTracker:
             ).pack(side="right", anchor="ne")
             self.load_students()
 
+    @telemetry.timed("upload.load_students")
     def load_students(self):
         if not self.quiz_number:
             return
 
-        filename = f"quiz-{self.quiz_number} students.csv"
-        directory = f"their data/quiz {self.quiz_number}/feedback"
-        filepath = os.path.join(directory, filename)
-
         # Create directory if it doesn't exist
-        os.makedirs(directory, exist_ok=True)
+        filepath = QuizPaths(self.quiz_number).ensure().students_csv
 
         try:
-            # Check if file exists
-            if not os.path.exists(filepath):
-                # Create a default empty file if it doesn't exist
-                default_data = pd.DataFrame(columns=['id', 'name', 'grade'])
-                default_data.to_csv(filepath, index=False)
+            # Create a default empty file if it doesn't exist
+            if roster.create_students(filepath, columns=['id', 'name', 'grade']):
                 messagebox.showinfo(
                     "New Quiz Created",
                     f"Created a new empty file for Quiz {self.quiz_number}.\n\nPlease add student data."
@@ -380,16 +377,15 @@ class CuteGradeTracker:
                 self.update_student_list()
                 return
 
-            df = pd.read_csv(filepath)
+            self.students_file = CsvFile(filepath)
+            df = roster.read_students(self.students_file, required=True)
 
             # Check if 'uploaded' column exists, if not create it
             if 'uploaded' not in df.columns:
                 df['uploaded'] = False
 
 
-            # Sort by ID in descending order
-            df = df.sort_values('id')
-
+            # Records stay in file order so saving never reorders the file
             self.student_data = df.to_dict('records')
             self.update_student_list()
 
@@ -403,8 +399,8 @@ class CuteGradeTracker:
         for item in self.tree.get_children():
             self.tree.delete(item)
 
-        # Add new items
-        for student in self.student_data:
+        # Add new items, sorted by ID for display only
+        for student in sorted(self.student_data, key=lambda student: roster.id_order(student['id'])):
             status_emoji = "🌸" if student.get('uploaded', False) else "🌱"
             status_text = f"{status_emoji} Uploaded" if student.get('uploaded',
                                                                     False) else f"{status_emoji} Not Uploaded"
@@ -504,18 +500,16 @@ class CuteGradeTracker:
         self.status_var.set("Marked selected students as not uploaded!")
         self.root.after(3000, lambda: self.status_var.set("Ready to track your grades!"))
 
+    @telemetry.timed("upload.save_current_data")
     def save_current_data(self):
         if not self.quiz_number:
             return
 
-        filename = f"quiz-{self.quiz_number} students.csv"
-        directory = f"their data/quiz {self.quiz_number}/feedback"
-        filepath = os.path.join(directory, filename)
+        if self.students_file is None:
+            return
 
-        df = pd.DataFrame(self.student_data)
-        # Maintain descending order when saving
-        df = df.sort_values('id', ascending=False)
-        df.to_csv(filepath, index=False)
+        # Only the cells changed here are applied if another tool saved meanwhile
+        self.student_data = roster.write_records(self.students_file, self.student_data)
 
     def on_closing(self):
         self.save_current_data()
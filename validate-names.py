@@ -1,9 +1,15 @@
 import tkinter as tk
 from tkinter import ttk, messagebox, simpledialog
-from PIL import Image, ImageTk
-import pandas as pd
-import os
-import shutil
+
+from core import roster, telemetry
+from core.attendance import AttendanceStore
+from core.csvfile import CsvFile
+from core.images import ChartCache
+from core.pages import PageIndex
+from core.pagestore import PageStore
+from core.paths import QuizPaths
+from core.watch import QuizWatcher
+from viewer import PageBar, RegionBar, TiledViewer
 
 
 class ValidateNames:
@@ -26,11 +32,17 @@ class ValidateNames:
 
         # Variables
         self.quiz_number = None
+        self.paths = None
+        self.page_index = None
+        self.chart_cache = ChartCache()
         self.student_csv_path = None
-        self.attendance_path = None
+        self.students_file = None
+        self.attendance = None
         self.charts_dir = None
         self.student_data = None
-        self.current_image = None
+        self.master = None  # Master sheet names, read once per quiz load
+        self.watcher = None
+        self.watch_job = None
         self.paned_window = None  # For resizable panes
         self.list_frame = None
         self.preview_frame = None
@@ -38,6 +50,8 @@ class ValidateNames:
         # Setup UI
         self.setup_ui()
         self.root.bind("<Escape>", lambda e: self.root.attributes('-fullscreen', False))
+        self.root.bind("<Prior>", lambda e: self.page_bar.previous())
+        self.root.bind("<Next>", lambda e: self.page_bar.next())
 
     def setup_ui(self):
         # Main container
@@ -183,23 +197,29 @@ class ValidateNames:
         self.preview_frame = tk.Frame(self.paned_window, bg="#e0e0e0")
         self.paned_window.add(self.preview_frame, minsize=400)
 
+        # Zoomable chart: wheel to zoom, drag to pan, double-click to fit
         self.canvas = tk.Canvas(
             self.preview_frame,
             bg="white"
         )
+        self.viewer = TiledViewer(self.canvas)
+        self.viewer.bind_mouse()
+        self.region_bar = RegionBar(self.preview_frame, self.viewer, self.custom_font, bg="#e0e0e0")
+        self.page_bar = PageBar(self.preview_frame, self.viewer, self.chart_cache, self.custom_font, bg="#e0e0e0")
+        self.region_bar.page_bar = self.page_bar
         self.canvas.pack(expand=True, fill=tk.BOTH)
 
         self.scroll_x = tk.Scrollbar(
             self.preview_frame,
             orient=tk.HORIZONTAL,
-            command=self.canvas.xview
+            command=self.viewer.xview
         )
         self.scroll_x.pack(side=tk.BOTTOM, fill=tk.X)
 
         self.scroll_y = tk.Scrollbar(
             self.preview_frame,
             orient=tk.VERTICAL,
-            command=self.canvas.yview
+            command=self.viewer.yview
         )
         self.scroll_y.pack(side=tk.RIGHT, fill=tk.Y)
 
@@ -232,86 +252,115 @@ class ValidateNames:
             return
 
         self.quiz_number = quiz_num
-        base_dir = "their data"
-        quiz_dir = os.path.join(base_dir, f"quiz {self.quiz_number}")
-        feedback_dir = os.path.join(quiz_dir, "feedback")
-        self.student_csv_path = os.path.join(feedback_dir, f"quiz-{self.quiz_number} students.csv")
-        self.attendance_path = os.path.join(feedback_dir, f"quiz-{self.quiz_number} attendance.txt")
-        self.charts_dir = os.path.join(quiz_dir, "charts")
+        self.paths = QuizPaths(self.quiz_number).ensure()
+        self.student_csv_path = self.paths.students_csv
+        self.attendance = AttendanceStore(self.paths.attendance)
+        self.charts_dir = self.paths.charts_dir
 
-        # Create directories if needed
-        os.makedirs(feedback_dir, exist_ok=True)
+        # Zoom presets and page manifest for this quiz
+        self.region_bar.load(self.paths.regions)
+        self.page_index = PageIndex(self.paths)
+        self.chart_cache.store = PageStore.open(self.paths)
 
         # Initialize or load student CSV
-        if not os.path.exists(self.student_csv_path):
-            # Create new CSV with required columns
-            columns = ["id", "name", "grade", "validated"]
-            pd.DataFrame(columns=columns).to_csv(self.student_csv_path, index=False)
+        roster.create_students(self.student_csv_path)
+        self.students_file = CsvFile(self.student_csv_path)
 
         # Process attendance data
+        self.master = None
         self.process_attendance()
         self.refresh_student_data()
         self.refresh_btn.config(state=tk.NORMAL)
         self.status_bar.config(text=f"Quiz {self.quiz_number} loaded | Students: {len(self.student_data)}")
 
+        # Pick up scans and edits from the other tools as they happen
+        if self.watcher is not None:
+            self.watcher.stop()
+        self.watcher = QuizWatcher(self.paths).start()
+        if self.watch_job is None:
+            self.watch_job = self.root.after(500, self.apply_watch_events)
+
+    @telemetry.timed("validate.process_attendance")
     def process_attendance(self):
         # Read existing student data
-        try:
-            self.student_data = pd.read_csv(self.student_csv_path)
-        except:
-            self.student_data = pd.DataFrame(columns=["id", "name", "grade", "validated"])
+        self.student_data = roster.read_students(self.students_file)
 
-        # Read attendance file
-        if os.path.exists(self.attendance_path):
-            with open(self.attendance_path, 'r') as f:
-                attendance_ids = {line.strip() for line in f if line.strip()}
-        else:
-            attendance_ids = set()
-
-        # Get new IDs from attendance that aren't in student data
-        existing_ids = set(self.student_data['id'].astype(str))
-        new_ids = attendance_ids - existing_ids
-
-        if new_ids:
-            # Add new students with default values
-            new_students = pd.DataFrame({
-                "id": list(new_ids),
-                "name": "",
-                "grade": "",
-                "validated": False
-            })
-            self.student_data = pd.concat([self.student_data, new_students], ignore_index=True)
+        # Add new students from attendance with default values; only lines
+        # appended since the last refresh are read from the file
+        self.student_data = roster.add_attendance(self.student_data, self.attendance)
 
         # ALWAYS update names from master sheet (for all students)
         self.update_names_from_master()
 
         # Save updated CSV
-        self.student_data.to_csv(self.student_csv_path, index=False)
+        self.save_students()
+
+    def save_students(self):
+        """Save the table, returning True if other tools' changes had to be merged in"""
+        self.student_data = self.students_file.write(self.student_data)
+        if self.watcher is not None:
+            self.watcher.ignore(self.student_csv_path)
+        return self.students_file.merged
 
+    @telemetry.timed("validate.update_names_from_master")
     def update_names_from_master(self):
         try:
-            # Load master spreadsheet
-            master_sheet = pd.read_excel("sheets/students.xlsx", sheet_name="quizzes")
-
-            # Create mapping dictionary for faster lookup
-            id_to_info = {}
-            for _, row in master_sheet.iterrows():
-                student_id = str(row['number'])
-                id_to_info[student_id] = {
-                    'name': row['name']
-                }
-
-            # Update all student records
-            for idx, row in self.student_data.iterrows():
-                student_id = str(float(row['id']))
-                if student_id in id_to_info:
-                    # Always update name and grade from master sheet
-                    self.student_data.at[idx, 'name'] = id_to_info[student_id]['name']
-
-            self.student_data.to_csv(self.student_csv_path)
+            if self.master is None:
+                self.master = roster.load_master()
+            roster.apply_master_names(self.student_data, self.master)
+        except Exception as e:
+            messagebox.showerror("Error", f"Could not update from master sheet: {str(e)}")
+
+    def apply_watch_events(self):
+        """Apply changes made by scan.py, other stations or other tools since the last check"""
+        self.watch_job = self.root.after(500, self.apply_watch_events)
+        if self.watcher is None:
+            return
 
+        selection = self.student_list.curselection()
+        selected_id = self.student_data.iloc[selection[0]]['id'] if selection else None
+        for kind, value in self.watcher.poll():
+            if kind == "attendance":
+                self.add_scanned_students(value)
+            elif kind == "students":
+                # Changed by another tool, e.g. grades or upload marks
+                self.refresh_student_data()
+                if selection:
+                    self.student_list.selection_set(selection[0])
+            elif kind == "chart":
+                self.page_index = PageIndex(self.paths)
+                if selected_id is not None and value in self.page_index.pages(selected_id):
+                    self.show_student_chart(None)
+
+    @telemetry.timed("validate.add_scanned_students")
+    def add_scanned_students(self, student_ids):
+        """Append newly scanned students to the table and list without a full reload"""
+        before = len(self.student_data)
+        self.student_data = roster.add_attendance(self.student_data, student_ids)
+        if len(self.student_data) == before:
+            return
+
+        # Only the new rows need names from the (cached) master sheet
+        try:
+            if self.master is None:
+                self.master = roster.load_master()
         except Exception as e:
             messagebox.showerror("Error", f"Could not update from master sheet: {str(e)}")
+        self.student_data['name'] = self.student_data['name'].astype(object)
+        for idx in self.student_data.index[before:]:
+            name = (self.master or {}).get(roster.id_key(self.student_data.at[idx, 'id']))
+            if name is not None:
+                self.student_data.at[idx, 'name'] = name
+        if self.save_students():
+            # Rows may have moved; show the merged table instead
+            self.refresh_student_data()
+            return
+
+        for student_id, name in zip(self.student_data['id'][before:], self.student_data['name'][before:]):
+            self.student_list.insert(tk.END, f"{student_id} | {name}")
+        self.status_bar.config(
+            text=f"{len(self.student_data) - before} new scan(s) | Students: {len(self.student_data)}"
+        )
 
     def refresh_student_data(self):
         if not self.quiz_number:
@@ -319,23 +368,26 @@ class ValidateNames:
 
         try:
             # Reload student data
-            self.student_data = pd.read_csv(self.student_csv_path)
+            self.student_data = roster.read_students(self.students_file, required=True)
 
             # Update listbox
             self.student_list.delete(0, tk.END)
 
-            for _, row in self.student_data.iterrows():
-                display_text = f"{row['id']} | {row['name']}"
+            for student_id, name, validated in zip(
+                self.student_data['id'], self.student_data['name'], self.student_data['validated']
+            ):
+                display_text = f"{student_id} | {name}"
                 self.student_list.insert(tk.END, display_text)
 
                 # Color validated entries
-                if row['validated']:
+                if validated == True:
                     self.student_list.itemconfig(tk.END, {'bg': '#E8F5E9'})  # Pastel green
 
             self.status_bar.config(text=f"Data refreshed | Students: {len(self.student_data)}")
         except Exception as e:
             messagebox.showerror("Error", f"Could not refresh data: {str(e)}")
 
+    @telemetry.timed("validate.show_student_chart")
     def show_student_chart(self, event):
         selection = self.student_list.curselection()
         if not selection:
@@ -351,49 +403,23 @@ class ValidateNames:
         self.edit_id_btn.config(state=tk.NORMAL)
 
         # Load and display chart image
-        chart_path = os.path.join(self.charts_dir, f"quiz-{self.quiz_number} {student_id}.png")
-        if os.path.exists(chart_path):
+        pages = self.page_index.pages(student_id)
+        self.canvas.delete("message")
+        if pages:
             try:
-                img = Image.open(chart_path)
-
-                # Calculate display size (fit to canvas)
-                canvas_width = self.canvas.winfo_width()
-                canvas_height = self.canvas.winfo_height()
-
-                # Maintain aspect ratio
-                img_ratio = img.width / img.height
-                new_width = min(canvas_width, img.width)
-                new_height = int(new_width / img_ratio)
-
-                if new_height > canvas_height:
-                    new_height = canvas_height
-                    new_width = int(new_height * img_ratio)
-
-                # High quality resize
-                img = img.resize((new_width, new_height), Image.Resampling.LANCZOS)
-                self.current_image = ImageTk.PhotoImage(img)
-
-                # Clear canvas and display image
-                self.canvas.delete("all")
-                self.canvas.create_image(
-                    canvas_width // 2,
-                    canvas_height // 2,
-                    image=self.current_image,
-                    anchor=tk.CENTER
-                )
-
-                # Update scroll region
-                self.canvas.config(scrollregion=(0, 0, new_width, new_height))
-
+                # Decoded once and cached, so zooming never re-reads the PNG
+                self.page_bar.show(pages)
             except Exception as e:
                 messagebox.showerror("Error", f"Could not load chart: {str(e)}")
         else:
-            self.canvas.delete("all")
+            self.page_bar.show([])
+            self.viewer.set_image(None)
             self.canvas.create_text(
                 self.canvas.winfo_width() // 2,
                 self.canvas.winfo_height() // 2,
                 text="No chart found for this student",
-                font=self.custom_font
+                font=self.custom_font,
+                tags="message"
             )
 
     def validate_student(self):
@@ -403,7 +429,7 @@ class ValidateNames:
 
         selected_idx = selection[0]
         self.student_data.at[selected_idx, 'validated'] = True
-        self.student_data.to_csv(self.student_csv_path, index=False)
+        self.save_students()
         self.refresh_student_data()
 
         # Keep the selection after refresh
@@ -418,7 +444,7 @@ class ValidateNames:
 
         selected_idx = selection[0]
         self.student_data.at[selected_idx, 'validated'] = False
-        self.student_data.to_csv(self.student_csv_path, index=False)
+        self.save_students()
         self.refresh_student_data()
 
         # Keep the selection after refresh
@@ -451,25 +477,14 @@ class ValidateNames:
             # Update name from master sheet
             self.update_names_from_master()
 
-            # Rename chart file if exists
-            old_chart = os.path.join(self.charts_dir, f"quiz-{self.quiz_number} {old_id}.png")
-            new_chart = os.path.join(self.charts_dir, f"quiz-{self.quiz_number} {new_id}.png")
-
-            if os.path.exists(old_chart):
-                shutil.move(old_chart, new_chart)
+            # Rename every page of the chart
+            self.page_index.rename(old_id, new_id)
 
             # Update attendance file
-            if os.path.exists(self.attendance_path):
-                with open(self.attendance_path, 'r') as f:
-                    lines = [line.strip() for line in f if line.strip()]
-
-                if old_id in lines:
-                    lines[lines.index(old_id)] = new_id
-                    with open(self.attendance_path, 'w') as f:
-                        f.write("\n".join(lines) + "\n")
+            self.attendance.rename(old_id, new_id)
 
             # Save changes and refresh
-            self.student_data.to_csv(self.student_csv_path, index=False)
+            self.save_students()
             self.refresh_student_data()
 
             # Keep the selection after refresh
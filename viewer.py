@@ -0,0 +1,536 @@
+"""Tk canvas viewer for large page images, drawing only the visible tiles."""
+import tkinter as tk
+from tkinter import simpledialog
+from PIL import ImageTk
+
+from core.annotations import INK, SCALE, STAMP_SIZE, Annotations, stamp_lines
+from core.regions import load_regions, save_regions
+from core.tiles import TiledImage
+
+
+class TiledViewer:
+    def __init__(self, canvas, min_zoom=0.05, max_zoom=4.0, idle_ms=250):
+        self.canvas = canvas
+        self.min_zoom = min_zoom
+        self.max_zoom = max_zoom
+        self.idle_ms = idle_ms
+        self.image = None
+        self.zoom = 1.0
+        self.offset = (0, 0)
+        self.items = {}  # (col, row) -> (canvas item, PhotoImage, source tile)
+        self.idle_job = None
+        self.overlays = []  # Drawn over the page; told when the page, zoom or offset changes
+        self.layout = None  # (image, display size, offset) the overlays were last laid out for
+
+        self.canvas.bind("<Configure>", lambda e: self.refresh())
+
+    def set_image(self, image, keep_view=False):
+        """Show a new page (PIL image, TiledImage or None to clear)
+
+        With `keep_view` the zoom and visible region carry over from the
+        previous page, so a grader looking at one question stays on it.
+        """
+        region = self.current_region() if keep_view and self.image is not None else None
+        if image is not None and not isinstance(image, TiledImage):
+            image = TiledImage(image)
+        self.image = image
+        if region is not None and image is not None:
+            self.show_region(*region)
+        else:
+            self.fit()
+
+    def clear(self):
+        self.canvas.delete("tile")
+        self.items = {}
+
+    def fit_zoom(self):
+        width, height = self.image.size
+        return min(self.canvas.winfo_width() / width, self.canvas.winfo_height() / height, 1.0)
+
+    def fit(self):
+        if self.image is None:
+            self.clear()
+            self.update_overlays()
+            return
+        self.zoom = max(self.min_zoom, self.fit_zoom())
+        self.canvas.xview_moveto(0)
+        self.canvas.yview_moveto(0)
+        self.refresh()
+
+    def zoom_by(self, factor, x=None, y=None):
+        """Zoom keeping the page point under widget position (x, y) in place"""
+        if self.image is None:
+            return
+        if x is None:
+            x, y = self.canvas.winfo_width() / 2, self.canvas.winfo_height() / 2
+
+        # Page coordinates currently under the anchor point
+        page_x = (self.canvas.canvasx(x) - self.offset[0]) / self.zoom
+        page_y = (self.canvas.canvasy(y) - self.offset[1]) / self.zoom
+
+        self.zoom = max(self.min_zoom, min(self.zoom * factor, self.max_zoom))
+        self.clear()
+        self.update_region()
+
+        # Scroll so the same page point sits under the anchor again
+        width, height = self.scroll_size()
+        self.canvas.xview_moveto(max(0, page_x * self.zoom + self.offset[0] - x) / width)
+        self.canvas.yview_moveto(max(0, page_y * self.zoom + self.offset[1] - y) / height)
+        self.redraw()
+
+    def show_region(self, left, top, right, bottom):
+        """Zoom and scroll so a box given in page fractions fills the canvas"""
+        if self.image is None:
+            return
+        width, height = self.image.size
+        box_width = max(1.0, (right - left) * width)
+        box_height = max(1.0, (bottom - top) * height)
+        self.zoom = max(self.min_zoom, min(
+            self.canvas.winfo_width() / box_width, self.canvas.winfo_height() / box_height, self.max_zoom
+        ))
+        self.clear()
+        self.update_region()
+        scroll_width, scroll_height = self.scroll_size()
+        self.canvas.xview_moveto(left * width * self.zoom / scroll_width)
+        self.canvas.yview_moveto(top * height * self.zoom / scroll_height)
+        self.redraw()
+
+    def current_region(self):
+        """Visible part of the page as page fractions (left, top, right, bottom)"""
+        width, height = self.image.display_size(self.zoom)
+        left = max(0, self.canvas.canvasx(0) - self.offset[0])
+        top = max(0, self.canvas.canvasy(0) - self.offset[1])
+        right = min(width, left + self.canvas.winfo_width())
+        bottom = min(height, top + self.canvas.winfo_height())
+        return left / width, top / height, right / width, bottom / height
+
+    def bind_mouse(self):
+        """Mouse-wheel zoom at the cursor and drag to pan"""
+        self.canvas.bind("<MouseWheel>", lambda e: self.zoom_by(1.2 if e.delta > 0 else 1 / 1.2, e.x, e.y))
+        self.canvas.bind("<Button-4>", lambda e: self.zoom_by(1.2, e.x, e.y))
+        self.canvas.bind("<Button-5>", lambda e: self.zoom_by(1 / 1.2, e.x, e.y))
+        self.canvas.bind("<ButtonPress-1>", lambda e: self.canvas.scan_mark(e.x, e.y))
+        self.canvas.bind("<B1-Motion>", self.drag)
+        self.canvas.bind("<Double-Button-1>", lambda e: self.fit())
+
+    def drag(self, event):
+        self.canvas.scan_dragto(event.x, event.y, gain=1)
+        self.redraw()
+
+    def xview(self, *args):
+        self.canvas.xview(*args)
+        self.redraw()
+
+    def yview(self, *args):
+        self.canvas.yview(*args)
+        self.redraw()
+
+    def scroll_size(self):
+        width, height = self.image.display_size(self.zoom)
+        return max(self.canvas.winfo_width(), width), max(self.canvas.winfo_height(), height)
+
+    def update_region(self):
+        # Pages smaller than the canvas are centred
+        width, height = self.image.display_size(self.zoom)
+        offset = (
+            max(0, (self.canvas.winfo_width() - width) // 2),
+            max(0, (self.canvas.winfo_height() - height) // 2)
+        )
+        if offset != self.offset:
+            self.offset = offset
+            self.clear()
+        self.canvas.config(scrollregion=(0, 0) + self.scroll_size())
+
+    def refresh(self):
+        """Re-layout after a resize or new image"""
+        if self.image is None:
+            return
+        self.clear()
+        self.update_region()
+        self.redraw()
+
+    def redraw(self, fast=True):
+        """Draw the visible tiles; fast tiles are replaced by high quality ones when idle"""
+        if self.image is None:
+            return
+
+        left = self.canvas.canvasx(0) - self.offset[0]
+        top = self.canvas.canvasy(0) - self.offset[1]
+        wanted = self.image.visible(
+            self.zoom, left, top, left + self.canvas.winfo_width(), top + self.canvas.winfo_height()
+        )
+
+        # Drop tiles that scrolled out of view
+        for key in [key for key in self.items if key not in wanted]:
+            self.canvas.delete(self.items.pop(key)[0])
+
+        size = self.image.tile_size
+        added = False
+        for col, row in wanted:
+            tile = self.image.tile(self.zoom, col, row, fast=fast)
+            existing = self.items.get((col, row))
+            if existing is not None and existing[2] is tile:
+                continue  # Unchanged, nothing to repaint
+
+            photo = ImageTk.PhotoImage(tile)
+            if existing is not None:
+                item = existing[0]
+                self.canvas.itemconfig(item, image=photo)
+            else:
+                item = self.canvas.create_image(
+                    self.offset[0] + col * size,
+                    self.offset[1] + row * size,
+                    image=photo,
+                    anchor=tk.NW,
+                    tags="tile"
+                )
+                added = True
+            self.items[(col, row)] = (item, photo, tile)
+        if added:
+            self.canvas.tag_raise("overlay")  # New tiles stack above older items
+        self.update_overlays()
+
+        if self.idle_job is not None:
+            self.canvas.after_cancel(self.idle_job)
+            self.idle_job = None
+        if fast:
+            self.idle_job = self.canvas.after(self.idle_ms, lambda: self.redraw(fast=False))
+
+    def update_overlays(self):
+        layout = None
+        if self.image is not None:
+            layout = (self.image, self.image.display_size(self.zoom), self.offset)
+        if self.layout is not None and layout is not None and layout[0] is self.layout[0]:
+            if layout[1:] == self.layout[1:]:
+                return  # Scrolling moves overlay items along with the tiles
+        previous, self.layout = self.layout, layout
+        for overlay in self.overlays:
+            overlay.layout(previous, layout)
+
+    def page_to_canvas(self, x, y):
+        """Canvas position of a point given as page fractions"""
+        width, height = self.image.display_size(self.zoom)
+        return self.offset[0] + x * width, self.offset[1] + y * height
+
+    def canvas_to_page(self, x, y):
+        """Page fractions under widget position (x, y)"""
+        width, height = self.image.display_size(self.zoom)
+        return ((self.canvas.canvasx(x) - self.offset[0]) / width,
+                (self.canvas.canvasy(y) - self.offset[1]) / height)
+
+
+class RegionBar:
+    """Fit button plus one jump button per saved region of the current quiz"""
+
+    def __init__(self, parent, viewer, font, bg="#f0f2f5"):
+        self.viewer = viewer
+        self.font = font
+        self.bg = bg
+        self.path = None
+        self.regions = {}
+        self.page_bar = None  # Set when regions can be on later pages
+        self.frame = tk.Frame(parent, bg=bg)
+        self.frame.pack(fill=tk.X)
+
+    def load(self, path):
+        """Switch to the regions file of another quiz"""
+        self.path = path
+        self.regions = load_regions(path)
+        self.build()
+
+    def build(self):
+        for widget in self.frame.winfo_children():
+            widget.destroy()
+
+        button_style = {"font": self.font, "borderwidth": 0, "relief": tk.FLAT, "padx": 8, "pady": 2}
+        tk.Button(self.frame, text="Fit", command=self.viewer.fit, bg="#607D8B", fg="white",
+                  **button_style).pack(side=tk.LEFT, padx=2)
+        for name in self.regions:
+            tk.Button(self.frame, text=name, command=lambda n=name: self.show(n),
+                      bg="#2196F3", fg="white", **button_style).pack(side=tk.LEFT, padx=2)
+        tk.Button(self.frame, text="+ Region", command=self.save_current, bg="#8BC34A", fg="white",
+                  **button_style).pack(side=tk.RIGHT, padx=2)
+
+    def show(self, name):
+        """Jump to a named region if this quiz has one; returns True if it did"""
+        box = self.regions.get(name)
+        if box is None or self.viewer.image is None:
+            return False
+        if self.page_bar is not None and self.page_bar.pages and self.page_bar.page != box[4] - 1:
+            self.page_bar.go(box[4] - 1)
+        self.viewer.show_region(*box[:4])
+        return True
+
+    def save_current(self):
+        if self.path is None or self.viewer.image is None:
+            return
+        name = simpledialog.askstring("Save Region", "Name for the visible region (e.g. Q3):",
+                                      parent=self.frame)
+        if not name:
+            return
+        page = self.page_bar.page + 1 if self.page_bar is not None else 1
+        self.regions[name] = tuple(self.viewer.current_region()) + (page,)
+        save_regions(self.path, self.regions)
+        self.build()
+
+
+class PageBar:
+    """Page controls for multi-page submissions
+
+    Only the page on screen is decoded; the following page is prefetched in
+    the background so paging forward is instant.
+    """
+
+    def __init__(self, parent, viewer, cache, font, bg="#f0f2f5"):
+        self.viewer = viewer
+        self.cache = cache
+        self.pages = []
+        self.page = 0
+        self.frame = tk.Frame(parent, bg=bg)
+        self.frame.pack(fill=tk.X)
+
+        button_style = {"font": font, "borderwidth": 0, "relief": tk.FLAT, "padx": 8, "pady": 2,
+                        "bg": "#607D8B", "fg": "white"}
+        tk.Button(self.frame, text="◀", command=self.previous, **button_style).pack(side=tk.LEFT, padx=2)
+        self.label = tk.Label(self.frame, text="Page -", font=font, bg=bg)
+        self.label.pack(side=tk.LEFT, padx=5)
+        tk.Button(self.frame, text="▶", command=self.next, **button_style).pack(side=tk.LEFT, padx=2)
+
+    def show(self, pages, page=0):
+        """Show one student's pages (list of paths), starting at `page`"""
+        self.pages = pages
+        self.go(page)
+
+    def go(self, page):
+        if not self.pages:
+            self.label.config(text="Page -")
+            return
+        self.page = max(0, min(page, len(self.pages) - 1))
+        self.viewer.set_image(self.cache.tiled(self.pages[self.page]), keep_view=True)
+        self.label.config(text=f"Page {self.page + 1}/{len(self.pages)}")
+        if self.page + 1 < len(self.pages):
+            self.cache.prefetch(self.pages[self.page + 1])
+
+    def next(self):
+        self.go(self.page + 1)
+
+    def previous(self):
+        self.go(self.page - 1)
+
+
+class AnnotationLayer:
+    """Ticks, crosses, circles, pen strokes and marks drawn over the page
+
+    Items are canvas vectors above the page tiles, so the scan is never
+    redrawn for them. Scrolling moves them with the tiles, and a zoom
+    rescales the existing items in one canvas call; they are only rebuilt
+    when the page changes. Each edit is saved to the student's sidecar
+    (see `core.annotations`).
+    """
+
+    TOOLS = (("pan", "Pan"), ("tick", "✓"), ("cross", "✗"), ("circle", "○"), ("pen", "Pen"), ("mark", "Mark"))
+    TAGS = ("overlay", "annotation")
+
+    def __init__(self, parent, viewer, font, bg="#f0f2f5"):
+        self.viewer = viewer
+        self.canvas = viewer.canvas
+        self.font = font
+        self.annotations = None
+        self.page_bar = None  # Set to follow the page on screen
+        self.fixed_page = None  # Page shown when the viewer holds a crop of it
+        self.frame_box = (0.0, 0.0, 1.0, 1.0)  # Part of the page the viewer shows
+        self.criterion = None  # Criterion key new items belong to
+        self.mark_text = lambda criterion: ""
+        self.tool = "pan"
+        self.canvas_items = {}  # canvas item -> annotation item
+        self.text_items = {}  # canvas text item -> criterion key
+        self.stroke = None  # (page points, canvas points, canvas item) while drawing
+        viewer.overlays.append(self)
+
+        self.frame = tk.Frame(parent, bg=bg)
+        self.frame.pack(fill=tk.X)
+        button_style = {"font": font, "borderwidth": 0, "relief": tk.FLAT, "padx": 8, "pady": 2, "fg": "white"}
+        self.buttons = {}
+        for tool, text in self.TOOLS:
+            self.buttons[tool] = tk.Button(self.frame, text=text, command=lambda t=tool: self.set_tool(t),
+                                           bg="#607D8B", **button_style)
+            self.buttons[tool].pack(side=tk.LEFT, padx=2)
+        tk.Button(self.frame, text="Undo", command=self.undo, bg="#FF9800",
+                  **button_style).pack(side=tk.LEFT, padx=2)
+        self.criterion_label = tk.Label(self.frame, text="", font=font, bg=bg, fg="#555555")
+        self.criterion_label.pack(side=tk.LEFT, padx=5)
+        self.canvas.bind("<Button-3>", self.erase)
+        self.set_tool("pan")
+
+    @property
+    def page(self):
+        if self.fixed_page is not None:
+            return self.fixed_page
+        return self.page_bar.page + 1 if self.page_bar is not None else 1
+
+    def load(self, path, page=None, frame_box=None):
+        """Show the annotations in sidecar `path` (None: nothing to annotate)
+
+        `page` and `frame_box` are given when the viewer shows a crop of one
+        page: the box is the crop's place on the page, as page fractions.
+        """
+        self.annotations = Annotations.load(path) if path else None
+        self.fixed_page = page
+        self.frame_box = tuple(frame_box[:4]) if frame_box else (0.0, 0.0, 1.0, 1.0)
+        self.viewer.layout = None  # Rebuild even if the next page is the image already on screen
+
+    def set_criterion(self, key, label=""):
+        self.criterion = key
+        self.criterion_label.config(text=f"Marks: {label}" if label else "")
+
+    def set_tool(self, tool):
+        self.tool = tool
+        for name, button in self.buttons.items():
+            button.config(bg="#2196F3" if name == tool else "#607D8B")
+        if tool == "pan":
+            self.viewer.bind_mouse()
+            self.canvas.unbind("<ButtonRelease-1>")
+        else:
+            self.canvas.bind("<ButtonPress-1>", self.press)
+            self.canvas.bind("<B1-Motion>", self.motion)
+            self.canvas.bind("<ButtonRelease-1>", self.release)
+            self.canvas.unbind("<Double-Button-1>")
+
+    # Coordinates: stored items are page fractions times SCALE
+
+    def to_canvas(self, points):
+        left, top, right, bottom = self.frame_box
+        width, height = self.viewer.image.display_size(self.viewer.zoom)
+        scale_x = width / ((right - left) * SCALE)
+        scale_y = height / ((bottom - top) * SCALE)
+        origin_x = self.viewer.offset[0] - left * SCALE * scale_x
+        origin_y = self.viewer.offset[1] - top * SCALE * scale_y
+        return [origin_x + v * scale_x if n % 2 == 0 else origin_y + v * scale_y for n, v in enumerate(points)]
+
+    def to_page(self, x, y):
+        left, top, right, bottom = self.frame_box
+        view_x, view_y = self.viewer.canvas_to_page(x, y)
+        return left + view_x * (right - left), top + view_y * (bottom - top)
+
+    def layout(self, previous, current):
+        """Viewer hook: follow a zoom by rescaling, anything else by redrawing"""
+        if current is None:
+            self.canvas.delete("annotation")
+            self.canvas_items, self.text_items = {}, {}
+        elif previous is not None and previous[0] is current[0]:
+            (old_width, old_height), (old_x, old_y) = previous[1:]
+            (width, height), (x, y) = current[1:]
+            self.canvas.move("annotation", -old_x, -old_y)
+            self.canvas.scale("annotation", 0, 0, width / old_width, height / old_height)
+            self.canvas.move("annotation", x, y)
+        else:
+            self.draw()
+
+    def draw(self):
+        self.canvas.delete("annotation")
+        self.canvas_items, self.text_items = {}, {}
+        if self.viewer.image is None or self.annotations is None:
+            return
+        for item in self.annotations.items(self.page):
+            self.draw_item(item)
+
+    def draw_item(self, item):
+        kind, criterion, points = item
+        coords = self.to_canvas(points)
+        canvas = self.canvas
+        if kind == "pen":
+            ids = [canvas.create_line(*coords, fill=INK, width=3, capstyle=tk.ROUND, smooth=True, tags=self.TAGS)]
+        elif kind in ("tick", "cross"):
+            size = STAMP_SIZE * self.viewer.image.display_size(self.viewer.zoom)[0] / (
+                self.frame_box[2] - self.frame_box[0])
+            ids = [canvas.create_line(*line, fill=INK, width=4, capstyle=tk.ROUND, tags=self.TAGS)
+                   for line in stamp_lines(kind, coords[0], coords[1], size)]
+        elif kind == "circle":
+            ids = [canvas.create_oval(*coords, outline=INK, width=3, tags=self.TAGS)]
+        else:
+            ids = [canvas.create_text(*coords, text=self.mark_text(criterion), fill=INK, font=self.font,
+                                      tags=self.TAGS)]
+            self.text_items[ids[0]] = criterion
+        for canvas_item in ids:
+            self.canvas_items[canvas_item] = item
+
+    def update_marks(self):
+        """Re-read mark items' text after a criterion's mark changed"""
+        for canvas_item, criterion in self.text_items.items():
+            self.canvas.itemconfig(canvas_item, text=self.mark_text(criterion))
+
+    # Editing
+
+    def editable(self):
+        return self.viewer.image is not None and self.annotations is not None
+
+    def add(self, kind, points):
+        item = self.annotations.add(self.page, kind, points, self.criterion)
+        self.draw_item(item)
+        self.annotations.save()
+
+    def press(self, event):
+        if not self.editable():
+            return
+        x, y = self.to_page(event.x, event.y)
+        if self.tool in ("tick", "cross"):
+            self.add(self.tool, [x, y])
+        elif self.tool == "mark":
+            if self.criterion:
+                self.add("mark", [x, y])
+        else:
+            canvas_x, canvas_y = self.canvas.canvasx(event.x), self.canvas.canvasy(event.y)
+            if self.tool == "pen":
+                canvas_item = self.canvas.create_line(canvas_x, canvas_y, canvas_x, canvas_y, fill=INK, width=3,
+                                                      capstyle=tk.ROUND, tags="overlay")
+            else:
+                canvas_item = self.canvas.create_oval(canvas_x, canvas_y, canvas_x, canvas_y, outline=INK,
+                                                      width=3, tags="overlay")
+            self.stroke = ([x, y], [canvas_x, canvas_y], canvas_item)
+
+    def motion(self, event):
+        if self.stroke is None:
+            return
+        points, coords, canvas_item = self.stroke
+        canvas_x, canvas_y = self.canvas.canvasx(event.x), self.canvas.canvasy(event.y)
+        if self.tool == "circle":
+            points[2:] = self.to_page(event.x, event.y)
+            coords[2:] = [canvas_x, canvas_y]
+        elif abs(canvas_x - coords[-2]) + abs(canvas_y - coords[-1]) >= 3:
+            # Points closer than this add nothing visible, only size
+            points.extend(self.to_page(event.x, event.y))
+            coords.extend([canvas_x, canvas_y])
+        if len(coords) >= 4:
+            self.canvas.coords(canvas_item, *coords)
+
+    def release(self, event):
+        if self.stroke is None:
+            return
+        points, coords, canvas_item = self.stroke
+        self.stroke = None
+        self.canvas.delete(canvas_item)
+        if len(points) < 4:
+            points = points + points  # A dot
+        self.add(self.tool, points)
+
+    def erase(self, event):
+        """Right-click removes the annotation under the pointer"""
+        if not self.editable():
+            return
+        x, y = self.canvas.canvasx(event.x), self.canvas.canvasy(event.y)
+        hits = [i for i in self.canvas.find_overlapping(x - 4, y - 4, x + 4, y + 4) if i in self.canvas_items]
+        if not hits:
+            return
+        item = self.canvas_items[hits[-1]]
+        self.annotations.remove(self.page, item)
+        self.annotations.save()
+        self.draw()
+
+    def undo(self):
+        if self.annotations is None:
+            return
+        page = self.annotations.undo()
+        if page is not None:
+            self.annotations.save()
+            if page == self.page:
+                self.draw()